@@ -1,95 +1,16 @@
-import os
-import random
-from agents import Agent, Runner, OpenAIChatCompletionsModel, AsyncOpenAI
-from agents import set_tracing_disabled, function_tool
-from dotenv import load_dotenv
+from agents import Runner, set_tracing_disabled
 from agents import enable_verbose_stdout_logging
+from rag_core.assistant import get_agent
+from rag_core.settings import get_settings
 
 
-enable_verbose_stdout_logging()
+# Full SDK debug output is opt-in; stage timings are on the API's /metrics and [TRACE] lines
+if get_settings().agent_verbose_logging:
+    enable_verbose_stdout_logging()
 
-load_dotenv()
 set_tracing_disabled(disabled=True)
 
-
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment variables. Please add it to your .env file.")
-
-provider = AsyncOpenAI(
-    api_key=openai_api_key
-)
-
-model = OpenAIChatCompletionsModel(
-    model="gpt-4o-mini",  # You can change this to "gpt-4", "gpt-3.5-turbo", etc.
-    openai_client=provider
-)
-
-import cohere
-from qdrant_client import QdrantClient
-import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Initialize Cohere client
-cohere_client = cohere.Client(os.getenv("COHERE_API_KEY"))
-
-# Connect to Qdrant
-qdrant_client = QdrantClient(
-    url=os.getenv("QDRANT_URL"), 
-    api_key=os.getenv("QDRANT_API_KEY"),
-)
-
-def get_embedding(text):
-    """Get embedding vector from Cohere Embed v3"""
-    response = cohere_client.embed(
-        model=os.getenv("EMBED_MODEL", "embed-english-v3.0"),
-        input_type="search_query",  # Use search_query for queries
-        texts=[text],
-    )
-    return response.embeddings[0]  # Return the first embedding
-
-@function_tool
-def retrieve(query):
-    embedding = get_embedding(query)
-    result = qdrant_client.query_points(
-        collection_name=os.getenv("COLLECTION_NAME", "physical_ai_book"),
-        query=embedding,
-        limit=5
-    )
-    return [point.payload["text"] for point in result.points]
-
-
-agent = Agent(
-    name="Assistant for Physical AI & Humanoid Robotics",
-    instructions=
-"""
-You are a concise AI tutor for Physical AI and Humanoid Robotics. Answer questions using ONLY retrieved textbook content.
-
-**CRITICAL: Be CONCISE to minimize API costs:**
-- Keep responses brief and direct - avoid unnecessary words
-- Use bullet points instead of long paragraphs when possible
-- Get straight to the answer without lengthy introductions
-- Avoid repetition and redundant explanations
-- Limit responses to 2-4 sentences for simple questions, max 1-2 paragraphs for complex ones
-
-**Process:**
-1. Always use `retrieve` tool first
-2. Base answers STRICTLY on retrieved content only
-3. Synthesize key points concisely
-4. If information unavailable, briefly say: "Not found in textbook. Try rephrasing."
-
-**Style:**
-- Direct and factual
-- No fluff or filler words
-- Essential information only
-- Professional but brief
-""",
-    model=model,
-    tools=[retrieve]
-)    
+agent = get_agent()
 
 # Only run test when executing this file directly, not when imported
 if __name__ == "__main__":
@@ -0,0 +1,172 @@
+"""
+In-process answer cache for the /chat endpoint.
+
+Two tiers sit in front of the agent run:
+- exact: normalized question text -> answer
+- semantic: reuse the answer of a cached question whose query embedding is
+  within ANSWER_CACHE_SIMILARITY cosine similarity of the new one
+
+Answers are partitioned by chat scope (book/section), so a question asked
+about one book is never answered from another. Entries expire after
+ANSWER_CACHE_TTL seconds, the cache holds at most
+ANSWER_CACHE_MAX_ENTRIES answers (least recently used are evicted), and
+everything is dropped when the indexed collection's version changes.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from rag_core.settings import get_settings
+
+_UNSET = object()
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    embedding: np.ndarray  # unit-normalized, or None when no embedding was available
+    created_at: float
+    scope: str = ""
+
+
+class AnswerCache:
+    """Thread-safe TTL + LRU answer cache with an exact and a semantic tier"""
+
+    def __init__(self, max_entries=None, ttl=None, similarity=None):
+        settings = get_settings()
+        self.max_entries = settings.answer_cache_max_entries if max_entries is None else max_entries
+        self.ttl = settings.answer_cache_ttl if ttl is None else ttl
+        self.similarity = settings.answer_cache_similarity if similarity is None else similarity
+        self.version = _UNSET
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # (scope, normalized question) -> CachedAnswer
+        self._lock = threading.Lock()
+        self._matrix = None  # stacked embeddings for the semantic tier, rebuilt lazily
+        self._matrix_keys = []
+        self._matrix_scopes = None
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _expired(self, entry, now):
+        return now - entry.created_at > self.ttl
+
+    def _drop(self, key):
+        del self._entries[key]
+        self._matrix = None
+
+    def get_exact(self, normalized, scope=""):
+        if not self.enabled:
+            return None
+        key = (scope, normalized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.time()):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.answer
+
+    def get_semantic(self, embedding, scope=""):
+        """Return (answer, similarity) for the closest cached question in scope above the threshold"""
+        if not self.enabled or embedding is None:
+            return None
+        query = _unit(embedding)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix_keys = [key for key, entry in self._entries.items() if entry.embedding is not None]
+                self._matrix = (
+                    np.stack([self._entries[key].embedding for key in self._matrix_keys])
+                    if self._matrix_keys else np.empty((0, query.shape[0]), dtype=np.float32)
+                )
+                self._matrix_scopes = np.array([key[0] for key in self._matrix_keys], dtype=object)
+            if not self._matrix_keys:
+                return None
+            scores = np.where(self._matrix_scopes == scope, self._matrix @ query, -np.inf)
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            key = self._matrix_keys[best]
+            entry = self._entries[key]
+            if score < self.similarity:
+                return None
+            if self._expired(entry, time.time()):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            return entry.answer, score
+
+    def put(self, normalized, embedding, answer, scope=""):
+        if not self.enabled or not answer:
+            return
+        entry = CachedAnswer(
+            answer=answer,
+            embedding=_unit(embedding) if embedding is not None else None,
+            created_at=time.time(),
+            scope=scope,
+        )
+        key = (scope, normalized)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def record_miss(self):
+        self.misses += 1
+
+    def set_version(self, version):
+        """Drop every entry when the indexed collection has been re-ingested"""
+        with self._lock:
+            if version == self.version:
+                return False
+            changed = self.version is not _UNSET
+            self.version = version
+            if changed:
+                self._entries.clear()
+                self._matrix = None
+                self.invalidations += 1
+            return changed
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "index_version": None if self.version is _UNSET else self.version,
+        }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -1,216 +1,606 @@
 """
 FastAPI server for RAG chatbot backend with preprocessing for general questions
 """
-from fastapi import FastAPI, HTTPException
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from dataclasses import dataclass
+from typing import Optional
+import asyncio
+import hashlib
+import json
 import os
-import re
-from dotenv import load_dotenv
-from agents import Agent, Runner, OpenAIChatCompletionsModel, AsyncOpenAI
-from agents import set_tracing_disabled, function_tool
-import cohere
-from qdrant_client import QdrantClient
-
-# Load environment variables
-load_dotenv()
+from agents import Runner, set_tracing_disabled
+from openai.types.responses import ResponseTextDeltaEvent
+from rag_core import get_settings, get_async_qdrant_client, warm_up
+from rag_core.admission import AdmissionRejected, FairQueue
+from rag_core.batch import BatchQuestion, BatchReport, answer_batch, batch_result
+from rag_core.assistant import prepare_run
+from rag_core.resilience import SERVICES, get_upstream, upstream_error
+from rag_core.metrics import RequestTrace, TracingHooks, register_stats, request_trace, span
+from rag_core.sessions import SessionManager, create_session_store
+from rag_core.retrieval import ChatContext, embedding_flights, get_embedding, get_embeddings, packer, qdrant_semaphore, reranker, scope_filter
+from rag_core.singleflight import SingleFlight
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from embedding_cache import get_embedding_cache
+from answer_cache import AnswerCache, normalize_question
+from intent import classify as classify_intent, GENERAL_RESPONSE
+from tokens import get_encoding
+
 set_tracing_disabled(disabled=True)
 
-# Initialize OpenAI
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment variables.")
+settings = get_settings()
 
-provider = AsyncOpenAI(api_key=openai_api_key)
-model = OpenAIChatCompletionsModel(
-    model="gpt-4o-mini",
-    openai_client=provider
-)
+# CHAT_CONCURRENCY agent runs in flight (embedding and Qdrant limits live in rag_core.retrieval);
+# requests beyond that wait in a per-client fair queue (rag_core.admission)
+admission = FairQueue(settings.chat_concurrency, settings.chat_queue_size, settings.chat_queue_per_client)
 
-# Initialize Cohere and Qdrant
-cohere_client = cohere.Client(os.getenv("COHERE_API_KEY"))
-qdrant_client = QdrantClient(
-    url=os.getenv("QDRANT_URL"),
-    api_key=os.getenv("QDRANT_API_KEY"),
-)
+# Answer cache in front of the agent; cleared when ingestion bumps the collection's index_version
+answer_cache = AnswerCache()
 
-def get_embedding(text):
-    """Get embedding vector from Cohere Embed v3"""
-    response = cohere_client.embed(
-        model=os.getenv("EMBED_MODEL", "embed-english-v3.0"),
-        input_type="search_query",
-        texts=[text],
-    )
-    return response.embeddings[0]
-
-@function_tool
-def retrieve(query):
-    embedding = get_embedding(query)
-    result = qdrant_client.query_points(
-        collection_name=os.getenv("COLLECTION_NAME", "physical_ai_book"),
-        query=embedding,
-        limit=5
-    )
-    return [point.payload["text"] for point in result.points]
+# Identical questions (same scope and normalized text) asked while one is being
+# answered wait for that agent run instead of starting their own
+chat_flights = SingleFlight("chat")
+stream_flights = SingleFlight("chat_stream")
+
+# Multi-turn sessions: bounded, summarized history and standalone query rewriting
+sessions = SessionManager(create_session_store())
+
+# Cache and rerank counters are exported on /metrics next to the request metrics
+register_stats("answer_cache", answer_cache.stats)
+register_stats("embedding_cache", lambda: get_embedding_cache().stats())
+register_stats("rerank", reranker.stats)
+register_stats("context", packer.stats)
+register_stats("admission", admission.stats)
+register_stats("sessions", sessions.stats)
+for flights in (chat_flights, stream_flights, embedding_flights):
+    register_stats(f"singleflight_{flights.name}", flights.stats)
+for service in SERVICES:
+    register_stats(f"upstream_{service}", get_upstream(service).stats)
+_index_version_checked_at = 0.0
+
+async def refresh_index_version():
+    """Poll the collection metadata (at most once per interval) and drop stale answers"""
+    global _index_version_checked_at
+    now = time.monotonic()
+    if now - _index_version_checked_at < settings.index_version_check_interval:
+        return
+    _index_version_checked_at = now
+    try:
+        async with qdrant_semaphore:
+            info = await get_async_qdrant_client().get_collection(settings.collection_name)
+        version = (info.config.metadata or {}).get("index_version")
+    except Exception as e:
+        print(f"[WARNING] Could not read index version: {str(e)[:200]}")
+        return
+    if answer_cache.set_version(version):
+        print(f"[CACHE] Index version changed to {version}; answer cache cleared")
 
 def is_general_question(message: str) -> bool:
     """
     Detect if the question is a general question that doesn't require textbook content.
     This helps reduce unnecessary API calls for common questions.
     """
-    message_lower = message.lower().strip()
-
-    # Patterns for common general questions
-    general_patterns = [
-        r'who are you',
-        r'what are you',
-        r'how are you',
-        r'tell me about yourself',
-        r'introduce yourself',
-        r'what can you do',
-        r'what do you do',
-        r'what is your purpose',
-        r'what is your job',
-        r'how does this work',
-        r'what is this',
-        r'hello',
-        r'hi',
-        r'hey',
-        r'good morning',
-        r'good afternoon',
-        r'good evening',
-        r'greetings',
-        r'what is your name',
-        r'your name',
-        r'are you human',
-        r'are you real',
-        r'what are you made of',
-        r'what language are you',
-        r'created',
-        r'developed',
-        r'built',
-        r'made',
-        r'what\'?s up',
-        r'how\'?s it going',
-        r'how have you been'
-    ]
-
-    for pattern in general_patterns:
-        if re.search(pattern, message_lower):
-            return True
-
-    return False
+    return classify_intent(message) is not None
 
 def handle_general_question(message: str) -> str:
     """
     Handle general questions with predefined responses to save API costs.
     """
-    message_lower = message.lower().strip()
-
-    if 'who are you' in message_lower or 'what are you' in message_lower or 'introduce yourself' in message_lower or 'tell me about yourself' in message_lower:
-        return "I'm an AI tutor specializing in Physical AI and Humanoid Robotics. I can help you understand concepts from the textbook. What would you like to learn about Physical AI or Humanoid Robotics?"
-    elif 'how are you' in message_lower or 'how\'?s it going' in message_lower or 'how have you been' in message_lower:
-        return "I'm functioning well, thank you! I'm here to help you learn about Physical AI and Humanoid Robotics. Would you like to explore a concept from the textbook?"
-    elif 'what can you do' in message_lower or 'what do you do' in message_lower or 'purpose' in message_lower:
-        return "I can explain concepts about Physical AI and Humanoid Robotics based on the textbook. Ask me anything about these topics!"
-    elif any(greeting in message_lower for greeting in ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening', 'greetings', "what's up"]):
-        return "Hello! I'm an AI tutor for Physical AI and Humanoid Robotics. I can help you understand concepts from the textbook. What would you like to learn?"
-    else:
-        # For other general questions, provide a standard response
-        return "I'm an AI assistant specialized in Physical AI and Humanoid Robotics. I can only provide information from the textbook content. What would you like to know about Physical AI or Humanoid Robotics?"
-
-# Create agent with original focused instructions (only for textbook content)
-agent = Agent(
-    name="Assistant for Physical AI & Humanoid Robotics",
-    instructions="""
-You are a concise AI tutor for Physical AI and Humanoid Robotics. Answer questions using ONLY retrieved textbook content.
-
-**CRITICAL: Be CONCISE to minimize API costs:**
-- Keep responses brief and direct - avoid unnecessary words
-- Use bullet points instead of long paragraphs when possible
-- Get straight to the answer without lengthy introductions
-- Avoid repetition and redundant explanations
-- Limit responses to 2-4 sentences for simple questions, max 1-2 paragraphs for complex ones
-
-**Process:**
-1. Always use `retrieve` tool first
-2. Base answers STRICTLY on retrieved content only
-3. Synthesize key points concisely
-4. If information unavailable, briefly say: "Not found in textbook. Try rephrasing."
-
-**Style:**
-- Direct and factual
-- No fluff or filler words
-- Essential information only
-- Professional but brief
-""",
-    model=model,
-    tools=[retrieve]
-)
+    intent = classify_intent(message, min_confidence=0.0)
+    return intent.response if intent else GENERAL_RESPONSE
+
+def intent_headers(intent):
+    return {"X-Intent": intent.name, "X-Intent-Confidence": f"{intent.confidence:.2f}"}
+
+def client_key(http_request):
+    """Fair-queue identity: the API key when one is sent, otherwise the client IP"""
+    api_key = http_request.headers.get("x-api-key") or http_request.headers.get("authorization", "")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    # Only behind a proxy that sets X-Forwarded-For (TRUST_PROXY_HEADERS)
+    if settings.trust_proxy_headers:
+        forwarded = http_request.headers.get("x-forwarded-for", "").split(",")[0].strip()
+        if forwarded:
+            return "ip:" + forwarded
+    return "ip:" + (http_request.client.host if http_request.client else "unknown")
+
+async def admit(http_request):
+    """
+    Wait for an agent run slot. The queue wait is bounded by CHAT_QUEUE_TIMEOUT and
+    by the client's X-Request-Timeout minus a typical run; raises AdmissionRejected.
+    """
+    timeout = settings.chat_queue_timeout
+    try:
+        timeout = min(timeout, float(http_request.headers["x-request-timeout"]) - admission.avg_run_seconds)
+    except (KeyError, ValueError):
+        pass
+    with span("admission"):
+        return await admission.acquire(client_key(http_request), max(0.0, timeout))
+
+def rejection_message(e):
+    return f"{e.reason}. Please try again in {e.retry_after} seconds."
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Validate settings and open upstream connections in parallel before serving"""
+    started = time.perf_counter()
+    settings.validate_for_api()
+    # Opening the SQLite file may wait on another worker's lock, and tiktoken may download
+    # its encoding; keep both off the event loop
+    warm_up_results, embedding_cache, _ = await asyncio.gather(
+        warm_up(), asyncio.to_thread(get_embedding_cache), asyncio.to_thread(get_encoding),
+    )
+    app.state.startup = {
+        "import_seconds": round(IMPORT_SECONDS, 3),
+        "warm_up_seconds": round(time.perf_counter() - started, 3),
+        "services": warm_up_results,
+    }
+    print(f"[STARTUP] import {IMPORT_SECONDS:.2f}s, warm-up "
+          f"{app.state.startup['warm_up_seconds']:.2f}s, services: {warm_up_results}")
+    yield
+    # Hit times buffered for LRU eviction
+    await asyncio.to_thread(embedding_cache.flush)
 
 # FastAPI app
-app = FastAPI(title="RAG Chatbot API with General Question Handling")
+app = FastAPI(title="RAG Chatbot API with General Question Handling", lifespan=lifespan)
 
 # CORS middleware
-# In production, replace "*" with your frontend domain
-ALLOWED_ORIGINS = os.getenv(
-    "ALLOWED_ORIGINS",
-    "https://physical-ai-humanoid-robotics-beige.vercel.app"
-).split(",")
-
+# In production, set ALLOWED_ORIGINS to your frontend domain(s)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=ALLOWED_ORIGINS,
+    allow_origins=list(settings.allowed_origins),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the browser widget read the session id of /chat/stream responses
+    expose_headers=["X-Session-Id"],
 )
 
+class ChatScope(BaseModel):
+    """Restrict retrieval to one book and/or one of its sections"""
+    book_id: Optional[str] = None
+    section: Optional[str] = None
+
+    def cache_key(self):
+        return f"{self.book_id or ''}/{self.section or ''}"
+
 class ChatRequest(BaseModel):
     message: str
+    scope: Optional[ChatScope] = None
+    # Continue a conversation; omitted (or unknown/expired) starts a new session
+    session_id: Optional[str] = Field(default=None, max_length=128)
+
+    def context(self):
+        """Fresh per-request ChatContext carrying the scope's Qdrant filter"""
+        if self.scope is None:
+            return ChatContext()
+        return ChatContext(query_filter=scope_filter(self.scope.book_id, self.scope.section))
+
+    def scope_key(self):
+        return self.scope.cache_key() if self.scope is not None else ""
+
+class BatchChatItem(BaseModel):
+    message: str
+    id: Optional[str] = None
+    scope: Optional[ChatScope] = None
+
+class BatchChatRequest(BaseModel):
+    questions: list[BatchChatItem] = Field(min_length=1, max_length=settings.batch_max_questions)
+    # Answers generated at the same time (defaults to BATCH_CONCURRENCY)
+    concurrency: Optional[int] = Field(default=None, ge=1, le=64)
 
 class ChatResponse(BaseModel):
     response: str
     error: str = None
+    session_id: Optional[str] = None
 
 @app.get("/")
 async def root():
     return {"message": "RAG Chatbot API is running"}
 
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+@app.get("/health")
+async def health():
+    """Startup timings and the result of warming each upstream connection"""
+    return {"status": "ok", "startup": getattr(app.state, "startup", None)}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request/stage latency histograms, in-flight gauges, tokens, caches"""
+    # The stats collectors query the session and embedding stores
+    return Response(await asyncio.to_thread(generate_latest), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/upstreams")
+async def upstreams():
+    """Rate limit, retry and circuit breaker counters per upstream service"""
+    return {service: get_upstream(service).stats() for service in SERVICES}
+
+@app.get("/sessions/stats")
+async def session_stats():
+    return await asyncio.to_thread(sessions.stats)
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not await asyncio.to_thread(sessions.store.delete, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"deleted": session_id}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "answers": answer_cache.stats(),
+        "embeddings": get_embedding_cache().stats(),
+        "singleflight": {flights.name: flights.stats()
+                         for flights in (chat_flights, stream_flights, embedding_flights)},
+    }
 
-# Create a thread pool executor for running sync operations
-executor = ThreadPoolExecutor(max_workers=4)
+def error_message(e):
+    """Map an exception to the user-facing error string used by /chat and /chat/stream"""
+    circuit_open, status = upstream_error(e)
+    if circuit_open is not None:
+        return (f"The {circuit_open.service} service is temporarily unavailable. "
+                f"Please try again in {max(1, round(circuit_open.retry_in))} seconds.")
+    if status == 429:
+        return "API quota exceeded. Please try again later or check your API key."
+    return "Error: " + str(e)[:200]
+
+@dataclass
+class CacheLookup:
+    normalized: str
+    scope: str = ""
+    embedding: Optional[list] = None
+    answer: Optional[str] = None
+    status: str = "MISS"
+    similarity: Optional[float] = None
+
+    @property
+    def route(self):
+        return {"HIT-EXACT": "cache_exact", "HIT-SEMANTIC": "cache_semantic", "GENERAL": "general"}.get(self.status, "rag")
+
+    def headers(self):
+        headers = {"X-Cache": self.status}
+        if self.similarity is not None:
+            headers["X-Cache-Similarity"] = f"{self.similarity:.4f}"
+        return headers
+
+async def lookup_answer_cache(message, scope=""):
+    """Answer cache: exact normalized text first, then nearest cached question (within scope)"""
+    await refresh_index_version()
+    lookup = CacheLookup(normalized=normalize_question(message), scope=scope)
+    cached = answer_cache.get_exact(lookup.normalized, scope)
+    if cached is not None:
+        lookup.answer, lookup.status = cached, "HIT-EXACT"
+        return lookup
+
+    if answer_cache.enabled:
+        try:
+            lookup.embedding = await get_embedding(message)
+        except Exception as e:
+            print(f"[WARNING] Skipping semantic cache lookup: {str(e)[:200]}")
+        hit = answer_cache.get_semantic(lookup.embedding, scope)
+        if hit is not None:
+            lookup.answer, lookup.similarity = hit
+            lookup.status = "HIT-SEMANTIC"
+            return lookup
+    answer_cache.record_miss()
+    return lookup
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, response: Response, http_request: Request, background_tasks: BackgroundTasks):
+    with request_trace("chat") as trace:
+        session = await sessions.load(request.session_id)
+        response.headers["X-Session-Id"] = session.session_id
+        try:
+            # Check if it's a general question and handle it without using the agent
+            with span("intent"):
+                intent = classify_intent(request.message)
+            if intent is not None:
+                trace.route = "general"
+                response.headers.update(intent_headers(intent))
+                return ChatResponse(response=intent.response, session_id=session.session_id)
+
+            # Follow-ups are answered, cached and coalesced as standalone questions (the
+            # history only feeds the rewrite); it is an LLM call, so it is admitted like an agent run
+            slot = await admit(http_request) if session.has_history else None
+            try:
+                query = await sessions.standalone_query(session, request.message)
+                with span("cache_lookup"):
+                    lookup = await lookup_answer_cache(query, request.scope_key())
+            except BaseException:
+                if slot is not None:
+                    slot.release(ran=False)
+                raise
+            trace.route = lookup.route
+            response.headers.update(lookup.headers())
+            if lookup.answer is not None:
+                if slot is not None:
+                    slot.release(ran=False)
+                await remember(session, request.message, lookup.answer, background_tasks)
+                return ChatResponse(response=lookup.answer, session_id=session.session_id)
+
+            # For non-general questions, use the RAG agent
+            async def run_agent_once():
+                context = request.context()
+                run_agent, run_input = await prepare_run(query, context, lookup.embedding)
+                result = await Runner.run(run_agent, input=run_input, context=context, hooks=TracingHooks())
+                trace.add_usage(result.context_wrapper.usage)
+                answer_cache.put(lookup.normalized, lookup.embedding, result.final_output, lookup.scope)
+                return result.final_output
+
+            # Joining an identical run in flight needs no slot
+            key = (lookup.scope, lookup.normalized)
+            if chat_flights.in_flight(key):
+                if slot is not None:
+                    slot.release(ran=False)
+                slot = None
+            elif slot is None:
+                slot = await admit(http_request)
+            try:
+                answer, shared = await chat_flights.do(key, run_agent_once)
+            finally:
+                if slot is not None:
+                    slot.release()
+            if shared:
+                trace.route = "coalesced"
+                response.headers["X-Coalesced"] = "true"
+            await remember(session, request.message, answer, background_tasks)
+            return ChatResponse(response=answer, session_id=session.session_id)
+        except AdmissionRejected as e:
+            trace.route = "shed"
+            response.status_code = e.status_code
+            response.headers.update(e.headers())
+            return ChatResponse(response="", error=rejection_message(e), session_id=session.session_id)
+        except Exception as e:
+            trace.route = "error"
+            return ChatResponse(response="", error=error_message(e), session_id=session.session_id)
+
+async def remember(session, question, answer, background_tasks):
+    """Store the answered turn now; summarize overflowing history after the response is sent"""
+    if await sessions.remember(session, question, answer):
+        background_tasks.add_task(sessions.compact, session.session_id)
+
+async def admit_batch_run(client):
+    """
+    A slot for one batch generation. Batch runs queue with everyone else's, as
+    one client; when shed they wait the Retry-After and queue again, so a
+    batch slows down under load instead of failing.
+    """
+    while True:
+        try:
+            return await admission.acquire(client, settings.chat_queue_timeout)
+        except AdmissionRejected as e:
+            await asyncio.sleep(e.retry_after)
+
+async def batch_chat_lines(request, client, trace):
+    """
+    NDJSON lines for /chat/batch: one result per question as it completes
+    (general and cached answers first), then {"summary": {...}} with totals
+    and throughput.
+    """
+    trace.activate()
+    report = BatchReport(len(request.questions))
+    try:
+        pending = []
+        for index, item in enumerate(request.questions):
+            question = BatchQuestion(index, item.id if item.id is not None else str(index), item.message)
+            intent = classify_intent(item.message)
+            if intent is not None:
+                result = batch_result(question, response=intent.response, cache="GENERAL")
+                report.add(result)
+                yield json.dumps(result) + "\n"
+            else:
+                pending.append((question, item))
+
+        embeddings = []
+        if pending:
+            await refresh_index_version()
+            try:
+                embeddings = await get_embeddings([question.message for question, _ in pending])
+            except Exception as e:
+                print(f"[WARNING] Skipping batch cache lookup: {str(e)[:200]}")
+                embeddings = [None] * len(pending)
+
+        misses = {}
+        for (question, item), embedding in zip(pending, embeddings):
+            scope = item.scope.cache_key() if item.scope is not None else ""
+            normalized = normalize_question(question.message)
+            answer, status = answer_cache.get_exact(normalized, scope), "HIT-EXACT"
+            if answer is None:
+                hit = answer_cache.get_semantic(embedding, scope)
+                answer, status = (hit[0], "HIT-SEMANTIC") if hit is not None else (None, "MISS")
+            if answer is not None:
+                result = batch_result(question, response=answer, cache=status)
+                report.add(result)
+                yield json.dumps(result) + "\n"
+                continue
+            answer_cache.record_miss()
+            question.embedding = embedding
+            if item.scope is not None:
+                question.query_filter = scope_filter(item.scope.book_id, item.scope.section)
+            misses[question.index] = (question, normalized, scope)
+
+        questions = [question for question, _, _ in misses.values()]
+        async for result in answer_batch(questions, request.concurrency or settings.batch_concurrency,
+                                         acquire=lambda: admit_batch_run(client), format_error=error_message):
+            question, normalized, scope = misses[result["index"]]
+            if not result["error"]:
+                answer_cache.put(normalized, question.embedding, result["response"], scope)
+            report.add(result)
+            yield json.dumps(result) + "\n"
+
+        yield json.dumps({"summary": report.summary()}) + "\n"
+    finally:
+        trace.finish()
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def agent_event_stream(request, lookup, trace, query):
+    """The SSE events of one streamed agent run, as an async generator function for SingleFlight"""
+    async def run_agent_streamed():
+        try:
+            context = request.context()
+            run_agent, run_input = await prepare_run(query, context, lookup.embedding if lookup else None)
+            if context.sources:
+                yield sse_event("sources", {"sources": context.sources})
+            result = Runner.run_streamed(run_agent, input=run_input, context=context, hooks=TracingHooks())
+            async for event in result.stream_events():
+                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                    if event.data.delta:
+                        yield sse_event("delta", {"text": event.data.delta})
+                elif event.type == "run_item_stream_event" and event.name == "tool_called":
+                    yield sse_event("status", {"stage": "retrieving"})
+                elif event.type == "run_item_stream_event" and event.name == "tool_output":
+                    yield sse_event("sources", {"sources": context.sources})
+
+            trace.add_usage(result.context_wrapper.usage)
+            answer = result.final_output or ""
+            if lookup is not None:
+                answer_cache.put(lookup.normalized, lookup.embedding, answer, lookup.scope)
+            yield sse_event("done", {"response": answer, "cache": lookup.status if lookup else None})
+        except Exception as e:
+            yield sse_event("error", {"error": error_message(e)})
+
+    return run_agent_streamed
+
+async def stream_chat_events(request, lookup, trace, slot=None, session=None, events=None):
+    """
+    Server-Sent Events for one chat: "status" when the agent calls a tool,
+    "sources" with the retrieved passages, "delta" text increments, then a
+    terminal "done" (full response and session id) or "error" event.
+    events are the (event, shared) pairs of the agent run this request leads
+    or joined (identical questions streamed at the same time share one run).
+    """
+    # The response body is iterated in its own task; record spans into this request's trace
+    trace.activate()
     try:
-        # Check if it's a general question and handle it without using the agent
-        if is_general_question(request.message):
-            response = handle_general_question(request.message)
-            return ChatResponse(response=response)
-
-        # For non-general questions, use the RAG agent
-        # Run the synchronous operation in a thread pool to avoid blocking the event loop
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            executor,
-            lambda: Runner.run_sync(agent, input=request.message)
-        )
-        return ChatResponse(response=result.final_output)
+        if lookup is not None and lookup.answer is not None:
+            if lookup.status != "GENERAL":
+                await sessions.remember(session, request.message, lookup.answer)
+            yield sse_event("delta", {"text": lookup.answer})
+            yield sse_event("done", {"response": lookup.answer, "cache": lookup.status,
+                                     "session_id": session.session_id})
+            return
+
+        async for event, shared in events:
+            if shared:
+                trace.route = "coalesced"
+            if event.startswith("event: error"):
+                trace.route = "error"
+            elif event.startswith("event: done"):
+                # The shared event carries no session; add this subscriber's
+                done = json.loads(event.split("data: ", 1)[1])
+                await sessions.remember(session, request.message, done["response"])
+                event = sse_event("done", {**done, "session_id": session.session_id})
+            yield event
     except Exception as e:
-        error_msg = str(e)
-        if "429" in error_msg or "RateLimitError" in error_msg or "quota" in error_msg.lower():
-            return ChatResponse(
-                response="",
-                error="API quota exceeded. Please try again later or check your API key."
-            )
+        trace.route = "error"
+        yield sse_event("error", {"error": error_message(e)})
+    finally:
+        if slot is not None:
+            slot.release()
+        trace.finish()
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    session = await sessions.load(request.session_id)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-Id": session.session_id}
+    # Finished by stream_chat_events once the last event is sent
+    trace = RequestTrace("chat_stream").activate()
+
+    def shed(e):
+        trace.route = "shed"
+        trace.finish()
+        return JSONResponse({"error": rejection_message(e), "session_id": session.session_id},
+                            status_code=e.status_code, headers={**e.headers(), "X-Session-Id": session.session_id})
+
+    query = request.message
+    # Agent runs need a slot, taken before the response starts so a rejection can
+    # still be a 429/503; cached/general answers and coalesced streams skip it
+    slot = None
+    with span("intent"):
+        intent = classify_intent(request.message)
+    if intent is not None:
+        headers.update(intent_headers(intent))
+        lookup = CacheLookup(normalized="", answer=intent.response, status="GENERAL")
+    else:
+        # The follow-up rewrite is an LLM call, so it is admitted like an agent run
+        if session.has_history:
+            try:
+                slot = await admit(http_request)
+            except AdmissionRejected as e:
+                return shed(e)
+        try:
+            query = await sessions.standalone_query(session, request.message)
+            try:
+                with span("cache_lookup"):
+                    lookup = await lookup_answer_cache(query, request.scope_key())
+                headers.update(lookup.headers())
+            except Exception as e:
+                print(f"[WARNING] Answer cache lookup failed: {str(e)[:200]}")
+                lookup = None
+        except BaseException:
+            # Cancelled (client gone) while rewriting
+            if slot is not None:
+                slot.release(ran=False)
+            raise
+    trace.route = lookup.route if lookup is not None else "rag"
+
+    events = None
+    if lookup is not None and lookup.answer is not None and slot is not None:
+        slot.release(ran=False)
+        slot = None
+    if lookup is None or lookup.answer is None:
+        produce = agent_event_stream(request, lookup, trace, query)
+        key = (lookup.scope, lookup.normalized) if lookup is not None else None
+        try:
+            if slot is None and (key is None or not stream_flights.in_flight(key)):
+                slot = await admit(http_request)
+        except AdmissionRejected as e:
+            return shed(e)
+        if key is None:
+            events = ((event, False) async for event in produce())
         else:
-            return ChatResponse(
-                response="",
-                error="Error: " + error_msg[:200]
-            )
+            # Joined or started right after the admission decision (no await in
+            # between), so a stream never leads an agent run without a slot
+            events, shared = stream_flights.join_stream(key, produce)
+            if shared and slot is not None:
+                slot.release(ran=False)
+                slot = None
+
+    return StreamingResponse(
+        stream_chat_events(request, lookup, trace, slot, session, events),
+        media_type="text/event-stream",
+        headers=headers,
+        # Both are idempotent; this covers streams closed before their first event
+        background=BackgroundTask(finish_stream, trace, slot, session),
+    )
+
+async def finish_stream(trace, slot, session):
+    if slot is not None:
+        slot.release()
+    trace.finish()
+    # Summarize history that no longer fits, now that the client has the answer
+    await sessions.compact(session.session_id)
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest, http_request: Request):
+    """Answer many questions in one request, streamed back as NDJSON in completion order"""
+    trace = RequestTrace("chat_batch").activate()
+    trace.route = "batch"
+    return StreamingResponse(
+        batch_chat_lines(request, client_key(http_request), trace),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(trace.finish),
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,127 @@
+"""
+Answer a JSONL file of questions in one batch and report throughput.
+
+Each input line is {"message": "...", "id": "...", "scope": {"book_id": ..., "section": ...}}
+("question" is accepted for "message"; id and scope are optional). Answers
+are written as JSON lines in completion order, each with the question's id.
+
+By default the batch runs in-process (rag_core.batch: batched embeddings,
+one Qdrant query_batch_points request, bounded concurrent generation), which
+makes it usable as an offline evaluation runner. --url sends the file to a
+running server's /chat/batch instead, so its answer cache and admission
+control apply.
+
+Usage: python batch_chat.py questions.jsonl [-o answers.jsonl] [--concurrency 8] [--url http://localhost:8000]
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+import requests
+from agents import set_tracing_disabled
+
+from rag_core import get_settings
+from rag_core.batch import BatchQuestion, BatchReport, answer_batch
+from rag_core.retrieval import scope_filter
+from tokens import get_encoding
+
+
+def load_questions(path):
+    """The input lines as /chat/batch question objects"""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            message = item.get("message") or item.get("question")
+            if not message:
+                raise ValueError(f"{path}:{line_number}: no 'message' field")
+            question = {"message": message, "id": str(item.get("id", line_number))}
+            if item.get("scope"):
+                question["scope"] = item["scope"]
+            questions.append(question)
+    return questions
+
+
+async def run_local(questions, concurrency, out):
+    get_settings().validate_for_api()
+    set_tracing_disabled(disabled=True)
+    await asyncio.to_thread(get_encoding)
+    report = BatchReport(len(questions))
+    batch = [
+        BatchQuestion(index, item["id"], item["message"],
+                      scope_filter(item.get("scope", {}).get("book_id"), item.get("scope", {}).get("section")))
+        for index, item in enumerate(questions)
+    ]
+    async for result in answer_batch(batch, concurrency):
+        report.add(result)
+        out.write(json.dumps(result) + "\n")
+    return report.summary()
+
+
+def run_remote(url, questions, concurrency, out):
+    """Stream the answers of a running server's /chat/batch; returns its summary line"""
+    summary = {}
+    max_questions = get_settings().batch_max_questions
+    for start in range(0, len(questions), max_questions):
+        response = requests.post(
+            url.rstrip("/") + "/chat/batch",
+            json={"questions": questions[start:start + max_questions], "concurrency": concurrency},
+            stream=True,
+            timeout=(10, None),
+        )
+        response.raise_for_status()
+        response.encoding = "utf-8"
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            result = json.loads(line)
+            if "summary" in result:
+                summary = merge_summaries(summary, result["summary"])
+            else:
+                result["index"] += start
+                out.write(json.dumps(result) + "\n")
+    return summary
+
+
+def merge_summaries(total, part):
+    if not total:
+        return part
+    merged = {key: total[key] + part[key] for key in ("questions", "answered", "failed", "cached", "seconds")}
+    merged["seconds"] = round(merged["seconds"], 3)
+    merged["questions_per_second"] = round((merged["answered"] + merged["failed"]) / merged["seconds"], 2)
+    merged["tokens"] = {kind: total["tokens"][kind] + part["tokens"][kind] for kind in total["tokens"]}
+    return merged
+
+
+def print_summary(summary):
+    print(f"\n[SUMMARY] {summary['questions']} questions in {summary['seconds']:.1f}s "
+          f"({summary['questions_per_second']:.2f} questions/s)", file=sys.stderr)
+    print(f"  answered: {summary['answered']}, failed: {summary['failed']}, cached: {summary['cached']}", file=sys.stderr)
+    print(f"  tokens: {summary['tokens']['input']} input, {summary['tokens']['output']} output", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions in one batch")
+    parser.add_argument("questions", help="JSONL file, one {\"message\": ...} object per line")
+    parser.add_argument("-o", "--output", help="write answers here instead of stdout")
+    parser.add_argument("--concurrency", type=int, default=get_settings().batch_concurrency,
+                        help="answers generated at the same time")
+    parser.add_argument("--url", help="use a running server's /chat/batch instead of answering in-process")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    print(f"[INFO] {len(questions)} questions from {args.questions}", file=sys.stderr)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.url:
+            summary = run_remote(args.url, questions, args.concurrency, out)
+        else:
+            summary = asyncio.run(run_local(questions, args.concurrency, out))
+    finally:
+        if args.output:
+            out.close()
+    if summary:
+        print_summary(summary)
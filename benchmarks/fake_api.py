@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Run api_server.py against local stand-ins instead of Cohere, Qdrant and OpenAI.
+
+A generated book (benchmarks.fakes.FixtureSite) is ingested with main.py
+into a local-mode Qdrant in a temporary directory, then the API is served
+with that collection, the deterministic async Cohere fake and OpenAI calls
+going to OPENAI_BASE_URL (start the mock with `python -m benchmarks.fakes
+openai`). benchmarks/load_test.py starts both processes itself.
+
+Local-mode Qdrant runs queries in-process and blocks the event loop while
+it searches, so absolute numbers are lower than against a Qdrant server;
+they are meant for comparing changes to the backend, not for capacity plans.
+
+Usage: OPENAI_BASE_URL=http://127.0.0.1:8766/v1 python -m benchmarks.fake_api
+       [--port 8000] [--pages 50] [--embed-latency 0.05]
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+
+from benchmarks.fakes import FakeAsyncCohere, FakeCohere, FixtureSite
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--embed-latency", type=float, default=0.05,
+                        help="seconds added to every query embedding request")
+    args = parser.parse_args()
+
+    site = FixtureSite(pages=args.pages).start()
+    os.environ["SITEMAPS"] = f"bench={site.sitemap_url}"
+    os.environ.setdefault("COLLECTION_NAME", "benchmark_book")
+    os.environ.setdefault("COHERE_API_KEY", "benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1:8766/v1")
+    os.environ["EMBED_CACHE_PATH"] = ""
+    qdrant_path = tempfile.mkdtemp(prefix="rag-benchmark-qdrant-")
+
+    import uvicorn
+    from qdrant_client import AsyncQdrantClient, QdrantClient
+    from rag_core import override_client
+
+    try:
+        import main as ingestion
+        qdrant = QdrantClient(path=qdrant_path)
+        override_client("qdrant", qdrant)
+        override_client("cohere", FakeCohere())
+        with contextlib.redirect_stdout(io.StringIO()):
+            ingestion.ingest_book(full=True)
+        points = qdrant.count(ingestion.COLLECTION_NAME).count
+        qdrant.close()  # local mode allows one client per directory
+        site.stop()
+        print(f"[BENCHMARK] Ingested {args.pages} fixture pages ({points} chunks) into {qdrant_path}")
+
+        override_client("async_qdrant", AsyncQdrantClient(path=qdrant_path))
+        override_client("async_cohere", FakeAsyncCohere(latency=args.embed_latency))
+        from api_server import app
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+    finally:
+        shutil.rmtree(qdrant_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the services the backend talks to, for offline benchmarks.
+
+- FakeCohere / FakeAsyncCohere: deterministic embedder. A text's vector is
+  the normalized sum of fixed random vectors of its terms, so texts sharing
+  words land close together and retrieval behaves plausibly.
+- OpenAI mock: an OpenAI-compatible /v1/chat/completions server (tool calls,
+  streaming, usage) with configurable latency.
+- Sitemap fixture: a generated book (sitemap.xml + HTML pages with headings,
+  lists and code blocks) served over HTTP.
+
+Usage: python -m benchmarks.fakes openai [--port 8766] [--latency 0.05]
+       python -m benchmarks.fakes site [--port 8765] [--pages 50]
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+
+from rag_core.vectors import EMBED_DIMENSION
+from sparse import tokenize
+
+VOCABULARY = (
+    "actuator balance control zmp embodied physical torque ros joint robot topic learning "
+    "planning perception gait policy sensor humanoid locomotion kinematics dynamics gazebo "
+    "isaac simulation lidar camera imu slam navigation grasping manipulation reinforcement "
+    "transformer vision language action urdf node publisher subscriber service controller"
+).split()
+
+QUESTIONS = [
+    f"How does {a} relate to {b} in humanoid robots?"
+    for a in VOCABULARY[:12] for b in VOCABULARY[12:24]
+]
+GENERAL_MESSAGES = ["Hi", "Hello!", "Who are you?", "How are you?", "What can you do?", "Good morning"]
+
+
+# -------------------------------------
+# Cohere
+# -------------------------------------
+@lru_cache(maxsize=None)
+def _term_vector(term):
+    rng = np.random.default_rng(zlib.crc32(term.encode("utf-8")))
+    return rng.standard_normal(EMBED_DIMENSION).astype(np.float32)
+
+
+def fake_embedding(text):
+    terms = tokenize(text) or [text]
+    vector = np.sum([_term_vector(term) for term in terms], axis=0)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class FakeCohere:
+    """Deterministic stand-in for cohere.Client.embed (float and uint8 embedding types)"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+
+    def _response(self, texts, embedding_types):
+        self.calls += 1
+        self.texts += len(texts)
+        vectors = [fake_embedding(text) for text in texts]
+        if not embedding_types:
+            return SimpleNamespace(embeddings=[vector.tolist() for vector in vectors])
+        uint8 = [np.clip(np.rint((vector + 0.25) * 510), 0, 255).astype(int).tolist() for vector in vectors]
+        return SimpleNamespace(embeddings=SimpleNamespace(uint8=uint8))
+
+    def embed(self, model=None, input_type=None, texts=(), embedding_types=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._response(list(texts), embedding_types)
+
+    def check_api_key(self):
+        return {"valid": True}
+
+
+class FakeAsyncCohere(FakeCohere):
+    """Same as FakeCohere for the async client"""
+
+    async def embed(self, model=None, input_type=None, texts=(), embedding_types=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._response(list(texts), embedding_types)
+
+    async def check_api_key(self):
+        return {"valid": True}
+
+
+# -------------------------------------
+# OpenAI
+# -------------------------------------
+def create_openai_mock(latency=0.05, token_delay=0.002):
+    """
+    FastAPI app answering /v1/chat/completions like OpenAI. When tools are
+    offered and no tool result is in the conversation yet, the first tool is
+    called with the last user message as its query; otherwise a short answer
+    quoting the question is returned (streamed word by word when stream=true).
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    app.state.calls = 0
+    usage = {"prompt_tokens": 300, "completion_tokens": 60, "total_tokens": 360}
+
+    def reply(body):
+        messages = body["messages"]
+        question = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        if isinstance(question, list):
+            question = " ".join(part.get("text", "") for part in question)
+        tools = body.get("tools") or []
+        if tools and not any(m.get("role") == "tool" for m in messages):
+            return None, {"name": tools[0]["function"]["name"], "arguments": json.dumps({"query": question})}
+        return f"Based on the textbook: {question[-120:]}", None
+
+    @app.get("/v1/models/{model}")
+    async def model(model: str):
+        return {"id": model, "object": "model", "created": 0, "owned_by": "mock"}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        await asyncio.sleep(latency)
+        text, tool_call = reply(body)
+        base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": body["model"]}
+        call = {"id": "call_mock", "type": "function", "function": tool_call} if tool_call else None
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": text, "tool_calls": [call] if call else None}
+            return JSONResponse({**base, "object": "chat.completion", "usage": usage, "choices": [{
+                "index": 0, "message": message, "finish_reason": "tool_calls" if call else "stop",
+            }]})
+
+        async def events():
+            def chunk(delta, finish_reason=None, **extra):
+                data = {**base, "object": "chat.completion.chunk", **extra,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                return f"data: {json.dumps(data)}\n\n"
+
+            if call:
+                yield chunk({"role": "assistant", "tool_calls": [{"index": 0, **call}]})
+                yield chunk({}, "tool_calls", usage=usage)
+            else:
+                for word in text.split(" "):
+                    yield chunk({"content": word + " "})
+                    await asyncio.sleep(token_delay)
+                yield chunk({}, "stop", usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+# -------------------------------------
+# Sitemap fixture
+# -------------------------------------
+def fixture_page(index, seed=0):
+    """HTML for page `index`: chapter heading, sections with prose, a list and a code block"""
+    rng = random.Random(f"{seed}-{index}")
+
+    def sentence():
+        words = rng.choices(VOCABULARY, k=rng.randint(10, 18))
+        return " ".join(words).capitalize() + "."
+
+    parts = [f"<h1>Chapter {index}</h1>"]
+    for section in range(3):
+        parts.append(f"<h2>Section {index}.{section}</h2>")
+        for _ in range(3):
+            parts.append("<p>" + " ".join(sentence() for _ in range(rng.randint(4, 8))) + "</p>")
+        parts.append("<ul>" + "".join(f"<li>{sentence()}</li>" for _ in range(3)) + "</ul>")
+        code = "\n".join(f"{rng.choice(VOCABULARY)}_{i} = node.get_parameter('{rng.choice(VOCABULARY)}')"
+                         for i in range(6))
+        parts.append(f"<pre><code>{code}</code></pre>")
+    return f"<html><head><title>Chapter {index}</title></head><body><article>{''.join(parts)}</article></body></html>"
+
+
+class FixtureSite:
+    """Threaded HTTP server for a generated book; revise() edits pages (new content and lastmod)"""
+
+    def __init__(self, pages=50, port=0):
+        self.pages = pages
+        self.revisions = [0] * pages
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = site.render(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/xml" if self.path.endswith(".xml") else "text/html")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def sitemap_url(self):
+        return f"{self.base_url}/sitemap.xml"
+
+    def render(self, path):
+        if path == "/sitemap.xml":
+            urls = "".join(
+                f"<url><loc>{self.base_url}/docs/part-{i % 5}/page-{i}</loc>"
+                f"<lastmod>2026-01-{1 + self.revisions[i] % 28:02d}</lastmod></url>"
+                for i in range(self.pages)
+            )
+            return f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+        name = path.rsplit("/", 1)[-1]
+        if name.startswith("page-") and name[5:].isdigit() and int(name[5:]) < self.pages:
+            index = int(name[5:])
+            return fixture_page(index, seed=self.revisions[index])
+        return None
+
+    def revise(self, fraction):
+        """Edit the first `fraction` of the pages; returns how many changed"""
+        changed = round(self.pages * fraction)
+        for index in range(changed):
+            self.revisions[index] += 1
+        return changed
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="service", required=True)
+    openai = sub.add_parser("openai", help="OpenAI-compatible mock")
+    openai.add_argument("--port", type=int, default=8766)
+    openai.add_argument("--latency", type=float, default=0.05, help="seconds per completion")
+    openai.add_argument("--token-delay", type=float, default=0.002, help="seconds per streamed word")
+    site = sub.add_parser("site", help="sitemap fixture")
+    site.add_argument("--port", type=int, default=8765)
+    site.add_argument("--pages", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.service == "openai":
+        import uvicorn
+        uvicorn.run(create_openai_mock(args.latency, args.token_delay),
+                    host="127.0.0.1", port=args.port, log_level="warning")
+    else:
+        fixture = FixtureSite(pages=args.pages, port=args.port)
+        print(f"Serving {args.pages} pages at {fixture.sitemap_url}")
+        fixture.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Ingestion throughput of main.py against local stand-ins.
+
+Serves a generated book (benchmarks.fakes.FixtureSite), embeds with the
+deterministic FakeCohere (optionally with per-request latency to mimic the
+API), stores into a local-mode Qdrant and runs three ingestions: a full
+build, an incremental run with nothing changed, and an incremental run after
+--revise of the pages were edited. Reports pages/s, chunks/s and embed
+requests for each.
+
+Usage: python -m benchmarks.ingestion [--pages 200] [--embed-latency 0.2]
+       [--revise 0.1] [--qdrant-path DIR] [--verbose]
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+from benchmarks.fakes import FakeCohere, FixtureSite
+
+
+def configure_environment(sitemap_url, embed_cache):
+    """Settings are read on import, so this runs before main / rag_core are imported"""
+    os.environ["SITEMAPS"] = f"bench={sitemap_url}"
+    os.environ.setdefault("COHERE_API_KEY", "benchmark")
+    os.environ.setdefault("COLLECTION_NAME", "benchmark_book")
+    if not embed_cache:
+        os.environ["EMBED_CACHE_PATH"] = ""
+
+
+def run_ingestion(main, fake_cohere, full, verbose):
+    calls, texts = fake_cohere.calls, fake_cohere.texts
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(output):
+        main.ingest_book(full=full)
+    elapsed = time.perf_counter() - start
+    if "[FATAL ERROR]" in output.getvalue():
+        raise RuntimeError(output.getvalue()[-2000:])
+    return {
+        "elapsed": elapsed,
+        "embed_requests": fake_cohere.calls - calls,
+        "embedded_chunks": fake_cohere.texts - texts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--embed-latency", type=float, default=0.0,
+                        help="seconds added to every embed request")
+    parser.add_argument("--revise", type=float, default=0.1,
+                        help="fraction of pages edited before the last run")
+    parser.add_argument("--qdrant-path", default=None,
+                        help="local Qdrant directory (default: in memory)")
+    parser.add_argument("--embed-cache", action="store_true",
+                        help="keep the SQLite embedding cache enabled")
+    parser.add_argument("--verbose", action="store_true", help="show main.py output")
+    args = parser.parse_args()
+
+    site = FixtureSite(pages=args.pages).start()
+    configure_environment(site.sitemap_url, args.embed_cache)
+
+    import main as ingestion
+    from qdrant_client import QdrantClient
+    from rag_core import override_client
+
+    qdrant = QdrantClient(path=args.qdrant_path) if args.qdrant_path else QdrantClient(location=":memory:")
+    fake_cohere = FakeCohere(latency=args.embed_latency)
+    override_client("qdrant", qdrant)
+    override_client("cohere", fake_cohere)
+
+    print(f"Fixture: {args.pages} pages at {site.sitemap_url}, embed latency {args.embed_latency * 1000:.0f} ms")
+    try:
+        runs = [("full build", True, None), ("incremental, unchanged", False, None),
+                ("incremental, revised", False, args.revise)]
+        rows = []
+        for name, full, revise in runs:
+            changed = site.revise(revise) if revise else None
+            result = run_ingestion(ingestion, fake_cohere, full, args.verbose)
+            result["points"] = qdrant.count(ingestion.COLLECTION_NAME).count
+            result["name"] = name if changed is None else f"{name} ({changed} pages)"
+            rows.append(result)
+    finally:
+        site.stop()
+
+    print(f"\n{'run':34} {'seconds':>8} {'pages/s':>8} {'chunks/s':>9} {'embedded':>9} {'requests':>9} {'points':>7}")
+    for row in rows:
+        print(f"{row['name']:34} {row['elapsed']:8.2f} {args.pages / row['elapsed']:8.1f} "
+              f"{row['embedded_chunks'] / row['elapsed']:9.1f} {row['embedded_chunks']:9} "
+              f"{row['embed_requests']:9} {row['points']:7}")
+
+
+if __name__ == "__main__":
+    main()
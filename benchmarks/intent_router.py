@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark the general-question intent router against the previous regex loop.
+
+Reports per-message classification cost and the false-positive rate on
+textbook questions (routed to a canned answer instead of RAG) and the miss
+rate on general messages.
+
+Usage: python -m benchmarks.intent_router [--repeat 2000]
+"""
+import argparse
+import re
+import time
+
+from intent import classify
+
+# Questions students ask about the book; none of them should get a canned answer
+BOOK_QUESTIONS = [
+    "What is Physical AI and how is it different from traditional AI?",
+    "Explain the zero moment point (ZMP) criterion for biped balance",
+    "How does this architecture handle sensor fusion?",
+    "What is hierarchical control in humanoid robots?",
+    "How are humanoid robots built to withstand falls?",
+    "What sensors are made for tactile feedback?",
+    "Which actuators were developed for legged locomotion?",
+    "This chapter mentions ROS 2 topics, how do publishers and subscribers work?",
+    "What is the purpose of a URDF file?",
+    "How is the robot's center of mass created in simulation?",
+    "What are the main challenges of sim-to-real transfer?",
+    "Describe the architecture of a vision-language-action model",
+    "How do reinforcement learning policies get deployed on real hardware?",
+    "What is the difference between Gazebo and Isaac Sim?",
+    "Explain inverse kinematics for a 7-DoF arm",
+    "How does whole-body control coordinate arms and legs?",
+    "What is a digital twin and why is it useful for robotics?",
+    "How are LiDAR point clouds processed for navigation?",
+    "What is SLAM and which algorithms are commonly used?",
+    "Why are series elastic actuators used in humanoids?",
+    "How does the robot hear and process voice commands with Whisper?",
+    "What is the role of the /cmd_vel topic in ROS 2 navigation?",
+    "How do they model contact dynamics in MuJoCo?",
+    "What hardware is recommended for the edge computing kit?",
+    "How does Nav2 plan a path through this environment?",
+    "Which thesis says embodiment is necessary for intelligence?",
+    "What does high-level task planning with LLMs look like?",
+    "How is grasping with multi-fingered hands achieved?",
+    "What is the history of humanoid robots built by Honda?",
+    "What changes when the robot's gait is made faster?",
+]
+
+GENERAL_MESSAGES = [
+    "Hi",
+    "hello!",
+    "Hey there",
+    "Good morning",
+    "Who are you?",
+    "What are you?",
+    "Tell me about yourself",
+    "Introduce yourself please",
+    "How are you?",
+    "How's it going?",
+    "What can you do?",
+    "What is your purpose?",
+    "What's your name?",
+    "Are you human?",
+    "Who made you?",
+    "What's up",
+    "How does this work?",
+    "greetings",
+]
+
+LEGACY_PATTERNS = [
+    r'who are you', r'what are you', r'how are you', r'tell me about yourself',
+    r'introduce yourself', r'what can you do', r'what do you do', r'what is your purpose',
+    r'what is your job', r'how does this work', r'what is this', r'hello', r'hi', r'hey',
+    r'good morning', r'good afternoon', r'good evening', r'greetings', r'what is your name',
+    r'your name', r'are you human', r'are you real', r'what are you made of',
+    r'what language are you', r'created', r'developed', r'built', r'made',
+    r'what\'?s up', r'how\'?s it going', r'how have you been',
+]
+
+
+def legacy_is_general_question(message):
+    """The previous implementation: one re.search per pattern, every message"""
+    message_lower = message.lower().strip()
+    for pattern in LEGACY_PATTERNS:
+        if re.search(pattern, message_lower):
+            return True
+    return False
+
+
+def router_is_general_question(message):
+    return classify(message) is not None
+
+
+def measure(name, is_general, repeat):
+    corpus = BOOK_QUESTIONS + GENERAL_MESSAGES
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in corpus:
+            is_general(message)
+    per_message_us = (time.perf_counter() - start) / (repeat * len(corpus)) * 1e6
+
+    false_positives = [q for q in BOOK_QUESTIONS if is_general(q)]
+    misses = [m for m in GENERAL_MESSAGES if not is_general(m)]
+    print(f"\n{name}")
+    print(f"  per message:         {per_message_us:.2f} µs")
+    print(f"  false-positive rate: {len(false_positives)}/{len(BOOK_QUESTIONS)} "
+          f"({len(false_positives) / len(BOOK_QUESTIONS):.0%})")
+    print(f"  miss rate:           {len(misses)}/{len(GENERAL_MESSAGES)} "
+          f"({len(misses) / len(GENERAL_MESSAGES):.0%})")
+    for question in false_positives:
+        print(f"    FP: {question}")
+    for message in misses:
+        print(f"    MISS: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"Corpus: {len(BOOK_QUESTIONS)} book questions, {len(GENERAL_MESSAGES)} general messages")
+    measure("legacy regex loop", legacy_is_general_question, args.repeat)
+    measure("compiled intent router", router_is_general_question, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
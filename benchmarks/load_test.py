@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Load test for /chat and /chat/stream.
+
+By default the OpenAI mock (benchmarks.fakes) and the API on local
+stand-ins (benchmarks.fake_api) are started as subprocesses, so the whole
+run is offline and repeatable; --url points the same load at an already
+running deployment instead. For every endpoint and concurrency level,
+`--requests` requests are sent by that many concurrent workers, mixing
+textbook questions from a pool of --unique-questions (repeats exercise the
+answer cache) with --general-ratio greeting-style messages. Every level
+sends the same sequence and the answer cache is kept between levels, so
+after the first level most answers are cache hits; --no-answer-cache
+measures the full retrieval + generation path at every level.
+
+Reports requests, error rate, throughput and p50/p95/p99 latency per
+endpoint; for /chat/stream also the p50 time to the first streamed byte.
+A request is an error when the status is not 200, the JSON body has an
+error, or the stream sends an `error` event.
+
+Usage: python -m benchmarks.load_test [--concurrency 1,8,32] [--requests 200]
+       [--endpoints chat,chat_stream] [--llm-latency 0.3] [--embed-latency 0.05]
+       [--no-answer-cache] [--url http://localhost:8000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.fakes import GENERAL_MESSAGES, QUESTIONS
+
+ENDPOINTS = {"chat": "/chat", "chat_stream": "/chat/stream"}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_healthy(url, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} not healthy after {timeout:.0f}s")
+
+
+def start_local_stack(args):
+    """OpenAI mock + API on fakes as subprocesses; returns (api url, processes)"""
+    openai_port, api_port = free_port(), free_port()
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "COHERE_API_KEY": "benchmark",
+        "TRACE_LOG": "false",
+    }
+    if args.no_answer_cache:
+        env["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+    output = None if args.verbose else subprocess.DEVNULL
+    processes = [
+        subprocess.Popen([sys.executable, "-m", "benchmarks.fakes", "openai", "--port", str(openai_port),
+                          "--latency", str(args.llm_latency)], env=env, stdout=output, stderr=output),
+        subprocess.Popen([sys.executable, "-m", "benchmarks.fake_api", "--port", str(api_port),
+                          "--pages", str(args.pages), "--embed-latency", str(args.embed_latency)],
+                         env=env, stdout=output, stderr=output),
+    ]
+    wait_until_healthy(f"http://127.0.0.1:{openai_port}/v1/models/mock", processes[0], 30)
+    wait_until_healthy(f"http://127.0.0.1:{api_port}/health", processes[1], args.startup_timeout)
+    return f"http://127.0.0.1:{api_port}", processes
+
+
+def build_messages(count, unique_questions, general_ratio, seed):
+    rng = random.Random(seed)
+    pool = QUESTIONS[:unique_questions]
+    return [rng.choice(GENERAL_MESSAGES) if rng.random() < general_ratio else rng.choice(pool)
+            for _ in range(count)]
+
+
+async def send_chat(client, path, message):
+    response = await client.post(path, json={"message": message})
+    return response.status_code == 200 and not response.json().get("error"), None
+
+
+async def send_chat_stream(client, path, message):
+    first_byte, ok = None, False
+    started = time.perf_counter()
+    async with client.stream("POST", path, json={"message": message}) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return False, None
+        async for line in response.aiter_lines():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            if line == "event: error":
+                return False, first_byte
+            if line == "event: done":
+                ok = True
+    return ok, first_byte
+
+
+async def run_level(url, endpoint, concurrency, messages, timeout):
+    send = send_chat_stream if endpoint == "chat_stream" else send_chat
+    path = ENDPOINTS[endpoint]
+    queue = list(reversed(messages))
+    latencies, first_bytes, errors = [], [], 0
+
+    async def worker(client):
+        nonlocal errors
+        while queue:
+            message = queue.pop()
+            started = time.perf_counter()
+            try:
+                ok, first_byte = await send(client, path, message)
+            except (httpx.HTTPError, ValueError):
+                ok, first_byte = False, None
+            latencies.append(time.perf_counter() - started)
+            if first_byte is not None:
+                first_bytes.append(first_byte)
+            errors += not ok
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    def ms(values, q):
+        return float(np.percentile(values, q)) * 1000 if values else float("nan")
+
+    return {
+        "endpoint": endpoint, "concurrency": concurrency, "requests": len(latencies),
+        "error_rate": errors / max(1, len(latencies)), "rps": len(latencies) / elapsed,
+        "p50": ms(latencies, 50), "p95": ms(latencies, 95), "p99": ms(latencies, 99),
+        "ttfb_p50": ms(first_bytes, 50),
+    }
+
+
+async def run(args, url):
+    rows = []
+    for endpoint in args.endpoints:
+        for concurrency in args.concurrency:
+            # Same message sequence per level so levels and endpoints are comparable
+            messages = build_messages(args.requests, args.unique_questions, args.general_ratio, args.seed)
+            row = await run_level(url, endpoint, concurrency, messages, args.timeout)
+            rows.append(row)
+            print(f"  done: {endpoint} x{concurrency}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default=None, help="load an already running API instead of local fakes")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated worker counts")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument("--endpoints", default="chat,chat_stream", help="comma-separated: chat, chat_stream")
+    parser.add_argument("--unique-questions", type=int, default=100)
+    parser.add_argument("--general-ratio", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="mock OpenAI seconds per completion")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="fake Cohere seconds per request")
+    parser.add_argument("--pages", type=int, default=50, help="fixture pages ingested for the local API")
+    parser.add_argument("--no-answer-cache", action="store_true", help="start the local API with the answer cache off")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="show the output of the local services")
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(",")]
+    args.endpoints = [value.strip() for value in args.endpoints.split(",")]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    processes = []
+    try:
+        if args.url:
+            url = args.url.rstrip("/")
+        else:
+            print("Starting OpenAI mock and API on local fakes...")
+            url, processes = start_local_stack(args)
+        print(f"Target: {url}, {args.requests} requests per level")
+        rows = asyncio.run(run(args, url))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    print(f"\n{'endpoint':12} {'conc':>5} {'reqs':>6} {'errors':>7} {'RPS':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'TTFB p50':>9}")
+    for row in rows:
+        ttfb = f"{row['ttfb_p50']:9.1f}" if row["endpoint"] == "chat_stream" else f"{'-':>9}"
+        print(f"{row['endpoint']:12} {row['concurrency']:5} {row['requests']:6} {row['error_rate']:7.1%} "
+              f"{row['rps']:8.1f} {row['p50']:8.1f} {row['p95']:8.1f} {row['p99']:8.1f} {ttfb}")
+
+
+if __name__ == "__main__":
+    main()
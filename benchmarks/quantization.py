@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Benchmark dense-vector storage options: recall@k vs. latency vs. memory.
+
+Builds one collection per configuration (quantization, on-disk originals,
+HNSW parameters, uint8 vectors) with the same rag_core.vectors helpers the
+ingestion uses, then runs held-out queries against each and compares the
+results with exact float32 cosine search done in numpy.
+
+Vectors are synthetic clustered 1024-d embeddings, or real ones copied from
+an existing collection with --from-collection. uint8 vectors are produced
+by linear calibration of the float vectors, similar to Cohere's uint8
+embeddings. RAM is estimated from the configuration (vectors kept in RAM,
+quantized copies and HNSW links); Qdrant does not report it per collection.
+
+Run it against a Qdrant server (e.g. docker run -p 6333:6333 qdrant/qdrant).
+--url :memory: runs the same code paths in qdrant-client's local mode, which
+ignores HNSW and quantization, so it is only a dry run.
+
+Usage: python -m benchmarks.quantization [--url http://localhost:6333] [--points 20000]
+       [--queries 200] [--k 5] [--from-collection physical_ai_book]
+"""
+import argparse
+import dataclasses
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from rag_core.settings import get_settings
+from rag_core.vectors import (
+    EMBED_DIMENSION, dense_vector_params, hnsw_config, quantization_config, search_params,
+)
+
+BASELINE = dict(
+    embed_type="float", quantization="none", quantization_rescore=True,
+    quantization_oversampling=2.0, vectors_on_disk=False,
+    hnsw_m=16, hnsw_ef_construct=100, search_hnsw_ef=0,
+)
+
+CONFIGS = [
+    ("float32 (current)", {}),
+    ("float32, search ef=128", dict(search_hnsw_ef=128)),
+    ("float32, m=32 ef_construct=200", dict(hnsw_m=32, hnsw_ef_construct=200)),
+    ("uint8 vectors", dict(embed_type="uint8")),
+    ("scalar int8, no rescore", dict(quantization="scalar", quantization_rescore=False)),
+    ("scalar int8 + rescore", dict(quantization="scalar")),
+    ("scalar int8 + rescore, on disk", dict(quantization="scalar", vectors_on_disk=True)),
+    ("binary + rescore x2", dict(quantization="binary")),
+    ("binary + rescore x4", dict(quantization="binary", quantization_oversampling=4.0)),
+    ("binary + rescore x4, on disk", dict(quantization="binary", quantization_oversampling=4.0,
+                                          vectors_on_disk=True)),
+]
+
+UPLOAD_BATCH = 256
+
+
+def synthetic_vectors(count, clusters, seed):
+    """Unit vectors grouped around topic centers, like chunks of a book"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, EMBED_DIMENSION))
+    vectors = centers[rng.integers(clusters, size=count)] + rng.normal(scale=1.2, size=(count, EMBED_DIMENSION))
+    return normalize(vectors.astype(np.float32))
+
+
+def collection_vectors(client, collection_name):
+    vectors, offset = [], None
+    while True:
+        points, offset = client.scroll(collection_name, limit=1000, offset=offset,
+                                       with_payload=False, with_vectors=True)
+        for point in points:
+            vector = point.vector.get("") if isinstance(point.vector, dict) else point.vector
+            vectors.append(vector)
+        if offset is None:
+            break
+    return normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def to_uint8(vectors, low, high):
+    return np.clip(np.rint((vectors - low) / (high - low) * 255), 0, 255).astype(np.uint8)
+
+
+def estimated_ram_mb(settings, count):
+    bytes_per_value = 1 if settings.embed_type == "uint8" else 4
+    originals = 0 if settings.vectors_on_disk else count * EMBED_DIMENSION * bytes_per_value
+    quantized = {"scalar": count * EMBED_DIMENSION, "binary": count * EMBED_DIMENSION // 8}.get(settings.quantization, 0)
+    links = count * settings.hnsw_m * 2 * 4  # level-0 graph links (4-byte ids)
+    return (originals + quantized + links) / 2**20
+
+
+def wait_until_indexed(client, collection_name, count, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = client.get_collection(collection_name)
+        if info.status == "green" and (info.indexed_vectors_count or 0) >= count:
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def run_config(client, name, settings, corpus, queries, truth, k, index_timeout):
+    collection_name = f"bench_quantization_{abs(hash(name)) % 10**8}"
+    client.recreate_collection(
+        collection_name=collection_name,
+        vectors_config=dense_vector_params(settings),
+        hnsw_config=hnsw_config(settings),
+        quantization_config=quantization_config(settings),
+    )
+    try:
+        start = time.perf_counter()
+        for offset in range(0, len(corpus), UPLOAD_BATCH):
+            batch = corpus[offset:offset + UPLOAD_BATCH]
+            client.upsert(collection_name, points=[
+                PointStruct(id=offset + i, vector=vector.tolist())
+                for i, vector in enumerate(batch)
+            ], wait=False)
+        indexed = wait_until_indexed(client, collection_name, len(corpus), index_timeout)
+        build_seconds = time.perf_counter() - start
+
+        params = search_params(settings)
+        for query in queries[:10]:
+            client.query_points(collection_name, query=query.tolist(), search_params=params, limit=k)
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            result = client.query_points(collection_name, query=query.tolist(), search_params=params, limit=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len({point.id for point in result.points} & set(expected.tolist()))
+    finally:
+        client.delete_collection(collection_name)
+
+    return {
+        "name": name,
+        "recall": hits / (len(queries) * k),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "ram_mb": estimated_ram_mb(settings, len(corpus)),
+        "build_s": build_seconds,
+        "indexed": indexed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--from-collection", default=None,
+                        help="use the vectors stored in this collection instead of synthetic ones")
+    parser.add_argument("--index-timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    client = QdrantClient(location=":memory:") if args.url == ":memory:" else QdrantClient(url=args.url, api_key=args.api_key)
+
+    if args.from_collection:
+        vectors = collection_vectors(client, args.from_collection)
+    else:
+        vectors = synthetic_vectors(args.points + args.queries, args.clusters, args.seed)
+    np.random.default_rng(args.seed).shuffle(vectors)
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    # Exact float32 cosine top-k is the ground truth for every configuration
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.k]
+
+    low, high = np.percentile(corpus, [0.5, 99.5])
+    print(f"Corpus: {len(corpus)} vectors x {EMBED_DIMENSION}d, {len(queries)} held-out queries, recall@{args.k}")
+    index_timeout = args.index_timeout
+    if args.url == ":memory:":
+        print("[WARNING] local mode ignores HNSW and quantization; numbers are a dry run only")
+        index_timeout = 0
+
+    base = dataclasses.replace(get_settings(), **BASELINE)
+    rows = []
+    for name, overrides in CONFIGS:
+        settings = dataclasses.replace(base, **overrides)
+        uint8 = settings.embed_type == "uint8"
+        row = run_config(
+            client, name, settings,
+            to_uint8(corpus, low, high) if uint8 else corpus,
+            to_uint8(queries, low, high) if uint8 else queries,
+            truth, args.k, index_timeout,
+        )
+        rows.append(row)
+        print(f"  done: {name}")
+
+    print(f"\n{'configuration':34} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'RAM MB':>8} {'build s':>8}")
+    for row in rows:
+        note = "" if row["indexed"] else "  (index not finished)"
+        print(f"{row['name']:34} {row['recall']:7.3f} {row['p50']:8.2f} {row['p95']:8.2f} "
+              f"{row['ram_mb']:8.1f} {row['build_s']:8.1f}{note}")
+
+
+if __name__ == "__main__":
+    main()
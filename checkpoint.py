@@ -0,0 +1,105 @@
+"""
+Checkpoint and manifest of an ingestion run (main.py), so interrupted runs resume.
+
+The file holds JSON lines: a "run" header (full or incremental, the
+collection alias and the collection written to, the pages the run set out
+to fetch), one "page" line per page once all of
+its chunks are stored in Qdrant (lastmod, page hash, its point ids by chunk
+index and the stale point ids still to delete), and a "done" line when the
+run completes. A run that finds an unfinished checkpoint for its collection
+resumes it: finished pages are neither fetched nor embedded again, a full
+rebuild continues filling its new collection version, and the stale
+points of finished pages are still deleted at the end. After a complete run
+the file stays behind as the manifest of that run.
+"""
+import json
+import os
+import time
+
+from rag_core.settings import get_settings
+
+
+class IngestCheckpoint:
+    """
+    Append-only JSON-lines record of the pages an ingestion run has finished;
+    an empty INGEST_CHECKPOINT_PATH disables it (an interrupted run starts over)
+    """
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else get_settings().ingest_checkpoint_path
+        self.run = None
+        self.pages = {}  # url -> {"lastmod", "page_hash", "points", "stale"}
+        self.finished = False
+        self._file = None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def load(self):
+        """Read the previous run's checkpoint (a line cut off by a crash is ignored)"""
+        if not self.enabled or not os.path.exists(self.path):
+            return self
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                kind = entry.pop("type", None)
+                if kind == "run":
+                    self.run, self.pages, self.finished = entry, {}, False
+                elif kind == "page":
+                    self.pages[entry.pop("url")] = entry
+                elif kind == "done":
+                    self.finished = True
+        return self
+
+    def resumable(self, collection, full):
+        """Whether the loaded run was interrupted and can be continued by this one"""
+        return (
+            self.run is not None
+            and not self.finished
+            and self.run.get("collection") == collection
+            # A full rebuild request does not continue an incremental run
+            and (self.run.get("full") or not full)
+        )
+
+    def start(self, collection, full, to_fetch, target=None):
+        """Begin a new run writing to target (default: collection), replacing any previous checkpoint"""
+        self.run = {
+            "collection": collection,
+            "target": target or collection,
+            "full": full,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "to_fetch": list(to_fetch),
+        }
+        self.pages, self.finished = {}, False
+        if self.enabled:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._write({"type": "run", **self.run})
+
+    def resume(self):
+        if self.enabled:
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def add_page(self, url, lastmod, page_hash, points, stale):
+        """Record a page whose chunks are all stored (points: {point_id: chunk_index})"""
+        self.pages[url] = {"lastmod": lastmod, "page_hash": page_hash, "points": points, "stale": stale}
+        self._write({"type": "page", "url": url, **self.pages[url]})
+
+    def finish(self, **stats):
+        self.finished = True
+        self._write({"type": "done", "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), **stats})
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, entry):
+        if self._file is not None:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
@@ -0,0 +1,204 @@
+"""
+Structure-preserving, token-sized chunking of extracted pages.
+
+Pages arrive as markdown (see crawler.extract_text), which is parsed in a
+single pass into blocks: headings, paragraphs, lists and fenced code. Blocks
+are packed into chunks of at most CHUNK_MAX_TOKENS tokens without cutting
+through them; only a block that is larger than a chunk on its own is split
+(prose on sentence boundaries, code on line boundaries with each part kept
+in its own fence). A heading starts a new chunk once the current one holds
+CHUNK_MIN_TOKENS, and consecutive chunks of the same section share up to
+CHUNK_OVERLAP_TOKENS of trailing sentences. Every chunk carries the heading
+path of the section it starts in.
+"""
+import re
+from dataclasses import dataclass
+
+from rag_core.settings import get_settings
+from tokens import count_tokens
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass(frozen=True)
+class Block:
+    kind: str  # "heading", "paragraph", "list" or "code"
+    text: str
+    headings: tuple
+
+
+@dataclass(frozen=True)
+class Chunk:
+    text: str
+    headings: tuple
+    tokens: int
+
+    @property
+    def heading(self):
+        """Heading path as a breadcrumb, e.g. "Chapter 1 > Nodes" """
+        return " > ".join(self.headings)
+
+
+def parse_blocks(text):
+    """Yield the markdown blocks of text in order, each with its heading path"""
+    stack = []  # (level, title) of the enclosing headings
+    lines = []
+    kind = None
+    fence = None
+
+    def block():
+        return Block(kind, "\n".join(lines).strip("\n"), tuple(title for _, title in stack))
+
+    for line in text.splitlines():
+        if fence is not None:
+            lines.append(line)
+            if line.strip().startswith(fence):
+                yield block()
+                lines, kind, fence = [], None, None
+            continue
+
+        fence_match = _FENCE.match(line)
+        heading_match = None if fence_match else _HEADING.match(line)
+        starts_list = bool(_LIST_ITEM.match(line))
+        breaks_block = (
+            fence_match or heading_match or not line.strip()
+            or (kind == "list" and not starts_list and not line[:1].isspace())
+            or (kind == "paragraph" and starts_list)
+        )
+        if lines and breaks_block:
+            yield block()
+            lines, kind = [], None
+
+        if fence_match:
+            lines, kind, fence = [line], "code", fence_match.group(1)
+        elif heading_match:
+            level = len(heading_match.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, heading_match.group(2)))
+            yield Block("heading", line.strip(), tuple(title for _, title in stack))
+        elif line.strip():
+            if kind is None:
+                kind = "list" if starts_list else "paragraph"
+            lines.append(line)
+
+    if lines:
+        if fence is not None:
+            lines.append(fence)  # close an unterminated fence
+        yield block()
+
+
+def _split_block(block, max_tokens):
+    """
+    Yield (text, tokens, joiner) pieces of a block that each fit max_tokens.
+    joiner is how the piece attaches to the previous piece of the same block.
+    """
+    tokens = count_tokens(block.text)
+    if tokens <= max_tokens:
+        yield block.text, tokens, "\n\n"
+        return
+
+    if block.kind == "code":
+        body = block.text.split("\n")
+        opening, closing = body[0], body[-1]
+        group, size = [], count_tokens(opening + "\n" + closing)
+        for line in body[1:-1]:
+            line_tokens = count_tokens(line) + 1
+            if group and size + line_tokens > max_tokens:
+                text = "\n".join([opening, *group, closing])
+                yield text, size, "\n\n"
+                group, size = [], count_tokens(opening + "\n" + closing)
+            group.append(line)
+            size += line_tokens
+        if group:
+            yield "\n".join([opening, *group, closing]), size, "\n\n"
+        return
+
+    joiner = "\n\n"
+    for sentence in _SENTENCE_END.split(block.text):
+        sentence_tokens = count_tokens(sentence)
+        if sentence_tokens <= max_tokens:
+            yield sentence, sentence_tokens, joiner
+        else:
+            # A single run-on "sentence" (e.g. a table flattened to one line)
+            words = sentence.split()
+            step = max(1, len(words) * max_tokens // sentence_tokens)
+            for start in range(0, len(words), step):
+                part = " ".join(words[start:start + step])
+                yield part, count_tokens(part), joiner
+                joiner = " "
+        joiner = " "
+
+
+def _overlap(pieces, budget):
+    """Trailing prose sentences of a finished chunk that fit in budget tokens"""
+    tail, size = [], 0
+    for piece, _, _, kind, _ in reversed(pieces):
+        if kind in ("heading", "code"):
+            break
+        for sentence in reversed(_SENTENCE_END.split(piece)):
+            tokens = count_tokens(sentence)
+            if size + tokens > budget:
+                break
+            tail.append(sentence)
+            size += tokens
+        else:
+            continue
+        break
+    else:
+        return []  # the whole chunk would be repeated
+    if not tail:
+        return []
+    return [(" ".join(reversed(tail)), size, "\n\n", "paragraph", pieces[-1][4])]
+
+
+def chunk_document(text, max_tokens=None, overlap_tokens=None, min_tokens=None):
+    """
+    Split a markdown page into Chunks of at most max_tokens tokens (linear in
+    len(text)); limits not given come from the CHUNK_* settings
+    """
+    if not text:
+        return []
+    settings = get_settings()
+    max_tokens = max_tokens or settings.chunk_max_tokens
+    overlap_tokens = overlap_tokens if overlap_tokens is not None else settings.chunk_overlap_tokens
+    min_tokens = min_tokens if min_tokens is not None else settings.chunk_min_tokens
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    chunks = []
+    pieces = []  # (text, tokens, joiner, kind, headings) of the chunk being built
+    size = 0
+
+    def emit():
+        content = [p for p in pieces if p[3] != "heading"]
+        if content:
+            body = pieces[0][0] + "".join(p[2] + p[0] for p in pieces[1:])
+            chunks.append(Chunk(text=body, headings=content[0][4], tokens=sum(p[1] for p in pieces)))
+
+    for block in parse_blocks(text):
+        if block.kind == "heading" and size >= min_tokens:
+            emit()
+            pieces, size = [], 0
+
+        for piece, tokens, joiner in _split_block(block, max_tokens):
+            if pieces and size + tokens > max_tokens:
+                # A trailing heading moves with the content it introduces
+                carried = []
+                while pieces and pieces[-1][3] == "heading":
+                    carried.insert(0, pieces.pop())
+                if pieces:
+                    emit()
+                    carried = _overlap(pieces, overlap_tokens) + carried
+                    if sum(p[1] for p in carried) + tokens > max_tokens:
+                        carried = [p for p in carried if p[3] == "heading"]
+                pieces = carried
+                size = sum(p[1] for p in pieces)
+            if not pieces:
+                joiner = "\n\n"
+            pieces.append((piece, tokens, joiner, block.kind, block.headings))
+            size += tokens
+
+    emit()
+    return chunks
@@ -0,0 +1,184 @@
+"""
+Blue/green versions of the Qdrant collection behind the COLLECTION_NAME alias.
+
+The API and incremental ingestion runs address COLLECTION_NAME, which is a
+Qdrant alias. A full (re)build goes into a new collection
+"<COLLECTION_NAME>_v<UTC timestamp>" while the live one keeps serving:
+- the build is created with HNSW indexing deferred (indexing_threshold=0),
+  so the bulk upload does not pay for graph construction point by point;
+- afterwards indexing is switched back on (QDRANT_INDEXING_THRESHOLD) and
+  the build waits until Qdrant reports the collection green;
+- it is validated: point count against what the run stored and against the
+  live version (at least REINDEX_MIN_POINTS_RATIO of it), plus a smoke query
+  that must find a stored chunk by its own vector;
+- the alias is moved to it in one atomic update_collection_aliases call.
+
+The version the alias pointed to before is kept (KEEP_COLLECTION_VERSIONS
+previous versions), so `python main.py --rollback` points the alias back
+instantly; older versions are deleted after each swap.
+
+A collection created before versioning, named COLLECTION_NAME itself, is
+replaced by the alias on the first swap: deleting it and creating the alias
+are two calls, so that one swap has a sub-second gap and no rollback target.
+"""
+import time
+
+from qdrant_client.models import (
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation, OptimizersConfigDiff,
+)
+
+from rag_core import get_qdrant_client, get_settings
+
+SMOKE_QUERY_LIMIT = 10
+
+
+def new_version_name(alias):
+    """A name for the next version that sorts after the existing ones"""
+    while True:
+        name = f"{alias}_v{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+        if not get_qdrant_client().collection_exists(name):
+            return name
+        time.sleep(1)
+
+
+def bulk_load_optimizers():
+    """optimizers_config for a new build: no HNSW indexing until enable_indexing()"""
+    return OptimizersConfigDiff(indexing_threshold=0)
+
+
+def alias_target(alias):
+    """The collection the alias points to, or None"""
+    for description in get_qdrant_client().get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+def live_collection(alias):
+    """Where writes for the alias go: its target, or the legacy collection of that name"""
+    return alias_target(alias) or alias
+
+
+def list_versions(alias):
+    """The alias's versioned collections, oldest first"""
+    prefix = f"{alias}_v"
+    names = [collection.name for collection in get_qdrant_client().get_collections().collections]
+    return sorted(name for name in names if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+
+def enable_indexing(collection, timeout=None):
+    """
+    Turn HNSW indexing back on and wait (up to INDEX_BUILD_TIMEOUT seconds) for
+    the collection to be green; returns whether it got there
+    """
+    settings = get_settings()
+    timeout = settings.index_build_timeout if timeout is None else timeout
+    client = get_qdrant_client()
+    client.update_collection(
+        collection_name=collection,
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=settings.qdrant_indexing_threshold),
+    )
+    print(f"Building the HNSW index of {collection}...")
+    deadline = time.monotonic() + timeout
+    while True:
+        info = client.get_collection(collection)
+        if info.status == "green":
+            return True
+        if time.monotonic() >= deadline:
+            print(f"[WARNING] {collection} is still {info.status} after {timeout:.0f}s")
+            return False
+        time.sleep(1)
+
+
+def validate_version(collection, expected_points, search_params=None, alias=None):
+    """
+    Problems that should stop the swap (an empty list means the build is good).
+    The smoke query searches with a stored chunk's own dense vector and must return that chunk.
+    """
+    client = get_qdrant_client()
+    problems = []
+    points = client.count(collection, exact=True).count
+    if points < expected_points:
+        problems.append(f"{points} points stored, expected {expected_points}")
+    live = alias_target(alias) if alias else None
+    if live and live != collection:
+        live_points = client.count(live, exact=True).count
+        if points < live_points * get_settings().reindex_min_points_ratio:
+            problems.append(f"{points} points against {live_points} in the live version {live}")
+    sample, _ = client.scroll(collection, limit=1, with_payload=False, with_vectors=True)
+    if not sample:
+        problems.append("no points to run the smoke query with")
+    else:
+        vector = sample[0].vector
+        if isinstance(vector, dict):
+            vector = vector[""]  # the unnamed dense vector next to the sparse one
+        hits = client.query_points(collection, query=vector, search_params=search_params,
+                                   limit=SMOKE_QUERY_LIMIT, with_payload=["text"]).points
+        if sample[0].id not in {hit.id for hit in hits} or not all((hit.payload or {}).get("text") for hit in hits):
+            problems.append("the smoke query did not return the chunk it was made from")
+    print(f"Validated {collection}: {points} points" + (f"; problems: {'; '.join(problems)}" if problems else ", OK"))
+    return problems
+
+
+def swap_alias(alias, collection):
+    """Point the alias at collection atomically; returns the collection it pointed to before"""
+    client = get_qdrant_client()
+    previous = alias_target(alias)
+    if previous is None and client.collection_exists(alias):
+        print(f"[WARNING] Replacing the unversioned collection {alias} with an alias to {collection}")
+        client.delete_collection(alias)
+    operations = []
+    if previous is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection, alias_name=alias)))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"Alias {alias} -> {collection}" + (f" (was {previous})" if previous else ""))
+    return previous
+
+
+def publish_version(alias, collection):
+    """Swap the alias to a validated build, remember what it replaced and prune old versions"""
+    live = alias_target(alias)
+    if live is not None:
+        # Recorded before the swap, so --rollback knows where to go as soon as it is live
+        get_qdrant_client().update_collection(collection_name=collection, metadata={"previous_version": live})
+    previous = swap_alias(alias, collection)
+    prune_versions(alias, previous)
+    return previous
+
+
+def prune_versions(alias, previous=None, keep=None):
+    """
+    Delete the versions older than the live one except the `keep` most recent
+    (the one just replaced first); versions newer than the live one (a build
+    in progress, or one rolled back from) are left alone. Returns the deleted names.
+    """
+    keep = get_settings().keep_collection_versions if keep is None else keep
+    live = alias_target(alias)
+    older = [name for name in list_versions(alias) if name < live]
+    candidates = [previous] if previous in older else []
+    candidates += [name for name in reversed(older) if name != previous]
+    deleted = candidates[keep:]
+    for name in deleted:
+        get_qdrant_client().delete_collection(name)
+        print(f"Deleted old version {name}")
+    return deleted
+
+
+def rollback(alias):
+    """
+    Point the alias back at the version the live one replaced (or the newest
+    older version); returns it, or None when there is none to go back to
+    """
+    client = get_qdrant_client()
+    live = alias_target(alias)
+    if live is None:
+        return None
+    versions = list_versions(alias)
+    target = (client.get_collection(live).config.metadata or {}).get("previous_version")
+    if target not in versions:
+        older = [name for name in versions if name < live]
+        target = older[-1] if older else None
+    if target is not None:
+        swap_alias(alias, target)
+    return target
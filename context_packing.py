@@ -0,0 +1,202 @@
+"""
+Context assembly: turns the reranked Qdrant hits into the passages sent to the LLM.
+
+- Hits from the same page with consecutive chunk_index values are merged
+  into one passage, with the sentences the chunker repeats across chunk
+  boundaries (CHUNK_OVERLAP_TOKENS) kept only once.
+- Near-duplicates are dropped: a passage whose word shingles are at least
+  CONTEXT_DEDUP_THRESHOLD contained in a better-ranked passage adds nothing
+  (the same text indexed under two URLs, or a chunk inside a merged one).
+- Passages are kept in rank order until CONTEXT_TOKEN_BUDGET tokens; the
+  first passage that does not fit is trimmed on a sentence boundary when at
+  least CONTEXT_MIN_PASSAGE_TOKENS of budget remain.
+
+Each passage carries a compact citation (section heading and URL path) so
+the model, and the user, can tell where it came from.
+"""
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+from rag_core.settings import get_settings
+from tokens import CHARS_PER_TOKEN, count_tokens
+
+SHINGLE_WORDS = 5
+
+_WORD = re.compile(r"\w+")
+# Sentence ends and line breaks: where passages are trimmed and overlaps are found
+_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+@dataclass
+class Passage:
+    url: Optional[str]
+    heading: str
+    text: str
+    book_id: Optional[str] = None
+    chunk_indexes: tuple = ()
+
+    def citation(self):
+        """Compact source, e.g. "Nodes, /docs/module-1/nodes" """
+        title = self.heading.split(" > ")[-1] if self.heading else ""
+        path = urlparse(self.url).path or self.url if self.url else ""
+        return ", ".join(part for part in (title, path) if part)
+
+    def cited(self, number):
+        return f"[{number}] ({self.citation()})\n{self.text}"
+
+
+def shingles(text):
+    """Hashes of the overlapping SHINGLE_WORDS-word windows of text"""
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {_hash(" ".join(words))} if words else set()
+    return {_hash(" ".join(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+
+def strip_overlap(previous, following):
+    """following without the leading sentences that already end previous"""
+    previous = previous.rstrip()
+    cut = 0
+    for match in _BOUNDARY.finditer(following):
+        if match.start() > len(previous):
+            break
+        head = following[:match.start()].strip()
+        if head and previous.endswith(head):
+            cut = match.end()
+    return following[cut:]
+
+
+def trim_to_tokens(text, max_tokens):
+    """The longest prefix of whole sentences/lines within max_tokens (cut on a word when none fits)"""
+    kept = 0
+    used = 0
+    position = 0
+    for match in [*_BOUNDARY.finditer(text), None]:
+        end = match.start() if match else len(text)
+        used += count_tokens(text[position:end])
+        if used > max_tokens:
+            break
+        kept = end
+        position = match.end() if match else len(text)
+    if kept:
+        return text[:kept].rstrip()
+    return text[:max_tokens * CHARS_PER_TOKEN].rsplit(" ", 1)[0] + " ..."
+
+
+class ContextPacker:
+    """Merges, deduplicates and budgets retrieved chunks; counts what it saved"""
+
+    def __init__(self, token_budget=None, min_passage_tokens=None, dedup_threshold=None):
+        settings = get_settings()
+        self.token_budget = token_budget or settings.context_token_budget
+        self.min_passage_tokens = min_passage_tokens or settings.context_min_passage_tokens
+        self.dedup_threshold = dedup_threshold if dedup_threshold is not None else settings.context_dedup_threshold
+        self.packed = 0
+        self.merged = 0
+        self.deduplicated = 0
+        self.trimmed = 0
+        self.dropped = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def pack(self, points):
+        """Passages for Qdrant points given in rank order (best first)"""
+        self.packed += 1
+        self.tokens_in += sum(count_tokens(point.payload["text"]) for point in points)
+        passages = self._dedupe(self._merge(points))
+        passages = self._fit_budget(passages)
+        self.tokens_out += sum(count_tokens(passage.text) for passage in passages)
+        return passages
+
+    def _merge(self, points):
+        """One passage per run of consecutive chunks of a page, ordered by its best hit"""
+        pages = {}
+        for rank, point in enumerate(points):
+            pages.setdefault(point.payload.get("url") or str(point.id), []).append((rank, point))
+
+        ranked = []
+        for hits in pages.values():
+            hits.sort(key=lambda hit: (_chunk_index(hit[1]) is None, _chunk_index(hit[1]) or 0, hit[0]))
+            run = [hits[0]]
+            for hit in hits[1:]:
+                index, last = _chunk_index(hit[1]), _chunk_index(run[-1][1])
+                if index is not None and index == last:
+                    continue  # the same chunk twice
+                if index is not None and last is not None and index == last + 1:
+                    run.append(hit)
+                else:
+                    ranked.append(self._passage(run))
+                    run = [hit]
+            ranked.append(self._passage(run))
+        ranked.sort(key=lambda item: item[0])
+        return [passage for _, passage in ranked]
+
+    def _passage(self, run):
+        first = run[0][1].payload
+        text = first["text"]
+        for _, point in run[1:]:
+            text = text.rstrip() + "\n\n" + strip_overlap(text, point.payload["text"]).lstrip()
+        self.merged += len(run) - 1
+        passage = Passage(
+            url=first.get("url"),
+            heading=first.get("heading") or "",
+            text=text,
+            book_id=first.get("book_id"),
+            chunk_indexes=tuple(point.payload.get("chunk_index") for _, point in run),
+        )
+        return min(rank for rank, _ in run), passage
+
+    def _dedupe(self, passages):
+        kept, kept_shingles = [], []
+        for passage in passages:
+            current = shingles(passage.text)
+            if current and any(len(current & other) / len(current) >= self.dedup_threshold for other in kept_shingles):
+                self.deduplicated += 1
+                continue
+            kept.append(passage)
+            kept_shingles.append(current)
+        return kept
+
+    def _fit_budget(self, passages):
+        selected = []
+        used = 0
+        for passage in passages:
+            tokens = count_tokens(passage.text)
+            remaining = self.token_budget - used
+            if tokens <= remaining:
+                selected.append(passage)
+                used += tokens
+                continue
+            # Always keep (part of) the best passage
+            if remaining >= self.min_passage_tokens or not selected:
+                passage.text = trim_to_tokens(passage.text, max(remaining, self.min_passage_tokens))
+                selected.append(passage)
+                self.trimmed += 1
+            self.dropped += len(passages) - len(selected)
+            break
+        return selected
+
+    def stats(self):
+        return {
+            "token_budget": self.token_budget,
+            "packed": self.packed,
+            "merged_chunks": self.merged,
+            "deduplicated": self.deduplicated,
+            "trimmed": self.trimmed,
+            "dropped": self.dropped,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+        }
+
+
+def _chunk_index(point):
+    """The chunk's position in its page, or None for points indexed without one"""
+    index = point.payload.get("chunk_index")
+    return index if isinstance(index, int) else None
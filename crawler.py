@@ -0,0 +1,193 @@
+"""
+Sitemap expansion and concurrent page fetching and text extraction for crawls.
+
+Sitemaps may be sitemap indexes (expanded recursively, up to
+SITEMAP_MAX_DEPTH levels) and may be gzip-compressed (.xml.gz). Pages are downloaded by a bounded thread pool over one pooled requests.Session
+(FETCH_WORKERS, with a PER_HOST_CONCURRENCY cap per host), HTML is handed to a process pool of EXTRACT_WORKERS for
+trafilatura extraction (markdown output; 0 extracts in the fetch loop), and extracted pages are yielded as soon as they are
+ready so chunking/embedding can run while the rest of the crawl is in flight.
+"""
+import gzip
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+import trafilatura
+from requests.adapters import HTTPAdapter
+
+from rag_core.settings import get_settings
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared requests.Session with a connection pool sized to FETCH_WORKERS"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            workers = get_settings().fetch_workers
+            adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+class HostLimiter:
+    """Caps the number of simultaneous requests made to any single host"""
+
+    def __init__(self, limit=None):
+        self.limit = limit or get_settings().per_host_concurrency
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.limit))
+        with semaphore:
+            yield
+
+
+def fetch_html(url, session=None, limiter=None):
+    """Download a page and return its HTML (raises on HTTP errors and timeouts)"""
+    session = session or get_session()
+    timeout = get_settings().fetch_timeout
+    if limiter is None:
+        response = session.get(url, timeout=timeout)
+    else:
+        with limiter.slot(url):
+            response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+
+def fetch_sitemap(url, session=None):
+    """Parsed XML root of a sitemap, decompressing gzip sitemaps (.xml.gz)"""
+    session = session or get_session()
+    response = session.get(url, timeout=get_settings().fetch_timeout)
+    response.raise_for_status()
+    content = response.content
+    # requests already undoes Content-Encoding: gzip; a .gz file arrives still compressed
+    if content[:2] == GZIP_MAGIC:
+        content = gzip.decompress(content)
+    return ET.fromstring(content)
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(element, name):
+    for child in element:
+        if _local_name(child.tag) == name and child.text:
+            return child.text.strip()
+    return None
+
+
+def iter_sitemap_entries(sitemap_url, session=None, max_depth=None, failed=None):
+    """
+    Yield (url, lastmod) for every page of a sitemap, expanding sitemap
+    indexes recursively. A nested sitemap that cannot be fetched or parsed
+    (or is nested too deep) is reported, appended to `failed` when given and
+    skipped, so the caller knows the page list is incomplete; the top-level
+    sitemap failing raises.
+    """
+    session = session or get_session()
+    if max_depth is None:
+        max_depth = get_settings().sitemap_max_depth
+    seen = set()
+
+    def expand(url, depth):
+        if url in seen:
+            return
+        seen.add(url)
+        root = fetch_sitemap(url, session)
+        if _local_name(root.tag) != "sitemapindex":
+            for child in root:
+                loc = _child_text(child, "loc")
+                if loc:
+                    yield loc, _child_text(child, "lastmod")
+            return
+        for child in root:
+            loc = _child_text(child, "loc")
+            if not loc:
+                continue
+            if depth >= max_depth:
+                print(f"[WARNING] Sitemap nesting deeper than {max_depth} levels; skipping {loc}")
+                if failed is not None:
+                    failed.append(loc)
+                continue
+            try:
+                yield from expand(loc, depth + 1)
+            except (requests.RequestException, ET.ParseError, OSError, EOFError) as e:
+                print(f"[ERROR] Failed to read sitemap {loc}: {str(e)}")
+                if failed is not None:
+                    failed.append(loc)
+
+    yield from expand(sitemap_url, 0)
+
+
+def extract_text(html):
+    """Main page content as markdown, so chunking can follow headings, lists and code blocks"""
+    return trafilatura.extract(html, output_format="markdown")
+
+
+def iter_page_texts(urls, fetch_workers=None, extract_workers=None, max_in_flight=None):
+    """
+    Fetch and extract every URL concurrently, yielding (url, text, error) tuples
+    in completion order. At most max_in_flight pages are being fetched or
+    extracted at once, which bounds memory when the consumer is slower.
+    """
+    settings = get_settings()
+    fetch_workers = fetch_workers or settings.fetch_workers
+    extract_workers = extract_workers if extract_workers is not None else settings.extract_workers
+    session = get_session()
+    limiter = HostLimiter()
+    max_in_flight = max_in_flight or fetch_workers * 2
+    url_iter = iter(urls)
+    in_flight = {}  # future -> (stage, url)
+
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetch")
+    extract_pool = ProcessPoolExecutor(max_workers=extract_workers) if extract_workers else None
+
+    def top_up():
+        while len(in_flight) < max_in_flight:
+            url = next(url_iter, None)
+            if url is None:
+                return
+            in_flight[fetch_pool.submit(fetch_html, url, session, limiter)] = ("fetch", url)
+
+    try:
+        top_up()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, url = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield url, None, e
+                    continue
+
+                if stage == "fetch" and extract_pool is not None:
+                    in_flight[extract_pool.submit(extract_text, result)] = ("extract", url)
+                elif stage == "fetch":
+                    yield url, extract_text(result), None
+                else:
+                    yield url, result, None
+            top_up()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        if extract_pool is not None:
+            extract_pool.shutdown(wait=False, cancel_futures=True)
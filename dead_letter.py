@@ -0,0 +1,70 @@
+"""
+Dead-letter file for chunks that ingestion (main.py) could not embed or store.
+
+When a Cohere embed or Qdrant upsert still fails after the upstream retries
+(rag_core.resilience), the chunks are appended here as JSON lines (point id,
+full payload, failed step, error, time) instead of being dropped.
+`python main.py --retry-failed` embeds and stores them again and keeps only
+the ones that fail again; a full rebuild starts a new file, and an incremental
+run drops the entries of pages it re-ingested without failures.
+"""
+import json
+import os
+import time
+
+from rag_core.settings import get_settings
+
+
+class DeadLetterFile:
+    """Append-only JSON-lines list of failed chunks; an empty DEAD_LETTER_PATH disables it (failures are only logged)"""
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else get_settings().dead_letter_path
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def add(self, chunks, action, error):
+        """Record (point_id, payload) pairs that failed at `action` ("embed" or "upsert")"""
+        if not self.enabled or not chunks:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        failed_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with open(self.path, "a", encoding="utf-8") as f:
+            for point_id, payload in chunks:
+                f.write(json.dumps({
+                    "point_id": str(point_id),
+                    "payload": payload,
+                    "action": action,
+                    "error": str(error)[:500],
+                    "failed_at": failed_at,
+                }) + "\n")
+
+    def load(self):
+        if not self.enabled or not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def replace(self, entries):
+        """Rewrite the file with `entries` (atomically; an empty list removes it)"""
+        if not self.enabled:
+            return
+        if not entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def discard_urls(self, urls):
+        """Drop the entries of pages that have since been ingested without failures"""
+        entries = self.load()
+        kept = [entry for entry in entries if entry["payload"].get("url") not in urls]
+        if len(kept) != len(entries):
+            self.replace(kept)
+        return len(entries) - len(kept)
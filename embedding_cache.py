@@ -0,0 +1,233 @@
+"""
+Persistent, content-addressed embedding cache shared by ingestion (main.py)
+and the query path (api_server.py / agent.py).
+
+Vectors are stored as float32 blobs in a SQLite file keyed by
+sha256(model, input_type, text) plus the embedding type when it is not
+"float" (e.g. Cohere uint8 vectors), so re-ingesting unchanged text or asking a
+repeated question never reaches the Cohere API. The store is bounded to
+EMBED_CACHE_MAX_ENTRIES rows with least-recently-used eviction.
+
+Hits only update their last_used time in memory; the times are written in
+one batch every TOUCH_FLUSH_SIZE hits or TOUCH_FLUSH_SECONDS (and before
+evicting). The row count is tracked as rows are inserted and recounted now
+and then, since other workers write to the same file. aembed() runs the
+SQLite work in a thread, so waiting for another worker's write lock never
+blocks the event loop.
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from rag_core.settings import get_settings
+
+# SQLite caps the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+TOUCH_FLUSH_SIZE = 256
+TOUCH_FLUSH_SECONDS = 30.0
+# Writes between exact row counts (other processes add rows too)
+RECOUNT_EVERY = 100
+
+
+def cache_key(model, input_type, text, embedding_type="float"):
+    digest = hashlib.sha256()
+    parts = (model, input_type, text) if embedding_type == "float" else (model, input_type, embedding_type, text)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of embedding vectors with hit/miss counters"""
+
+    def __init__(self, path=None, max_entries=None):
+        settings = get_settings()
+        # Empty EMBED_CACHE_PATH disables the cache (every lookup is a miss)
+        self.path = settings.embed_cache_path if path is None else path
+        self.max_entries = max_entries or settings.embed_cache_max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.upstream_calls = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._entries = 0
+        self._touched = {}  # key -> last hit time not written yet
+        self._touched_flushed_at = time.monotonic()
+        self._writes = 0
+        if self.path:
+            self._open()
+
+    @property
+    def enabled(self):
+        return self._conn is not None
+
+    def _open(self):
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        conn.commit()
+        self._conn = conn
+        self._entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model, input_type, texts, embedding_type="float"):
+        """Return a list aligned with texts holding cached vectors or None"""
+        keys = [cache_key(model, input_type, text, embedding_type) for text in texts]
+        found = {}
+        if self.enabled and keys:
+            with self._lock:
+                for start in range(0, len(keys), _LOOKUP_CHUNK):
+                    chunk = keys[start:start + _LOOKUP_CHUNK]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                    found.update(rows)
+                if found:
+                    now = time.time()
+                    self._touched.update((key, now) for key in found)
+                    if (len(self._touched) >= TOUCH_FLUSH_SIZE
+                            or time.monotonic() - self._touched_flushed_at >= TOUCH_FLUSH_SECONDS):
+                        self._flush_touched()
+                        self._conn.commit()
+
+        vectors = [None if found.get(key) is None else array("f", found[key]).tolist() for key in keys]
+        with self._lock:  # lookups run in worker threads
+            self.hits += len(keys) - vectors.count(None)
+            self.misses += vectors.count(None)
+        return vectors
+
+    def put_many(self, model, input_type, texts, vectors, embedding_type="float"):
+        if not self.enabled:
+            return
+        now = time.time()
+        rows = [
+            (cache_key(model, input_type, text, embedding_type), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            # Keys are content hashes: an existing row already holds the same vector
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            ).rowcount
+            self._entries += max(inserted, 0)
+            self._writes += 1
+            if self._entries > self.max_entries or self._writes % RECOUNT_EVERY == 0:
+                self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            excess = self._entries - self.max_entries
+            if excess > 0:
+                # Recent hits must count before choosing what to evict
+                self._flush_touched()
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+                self._entries -= excess
+            self._conn.commit()
+
+    def _flush_touched(self):
+        """Write the buffered hit times (caller holds the lock and commits)"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched = {}
+        self._touched_flushed_at = time.monotonic()
+
+    def flush(self):
+        if self.enabled:
+            with self._lock:
+                self._flush_touched()
+                self._conn.commit()
+
+    def embed(self, texts, model, input_type, embed_fn, embedding_type="float"):
+        """
+        Return embeddings for texts, calling embed_fn(list_of_texts) once with
+        only the texts that are not cached yet.
+        """
+        key = (model, input_type, embedding_type)
+        texts, vectors, unique = self._lookup(texts, key)
+        if unique:
+            self.upstream_calls += 1
+            self._fill(texts, vectors, key, unique, embed_fn(unique))
+        return vectors
+
+    async def aembed(self, texts, model, input_type, embed_fn, embedding_type="float"):
+        """
+        Same as embed() for an async embed_fn (used by the async API path);
+        the SQLite reads and writes run in a worker thread
+        """
+        key = (model, input_type, embedding_type)
+        if not self.enabled:
+            texts, vectors, unique = self._lookup(texts, key)
+        else:
+            texts, vectors, unique = await asyncio.to_thread(self._lookup, texts, key)
+        if unique:
+            self.upstream_calls += 1
+            fresh = await embed_fn(unique)
+            if self.enabled:
+                await asyncio.to_thread(self.put_many, model, input_type, unique, fresh, embedding_type)
+            self._fill(texts, vectors, key, unique, fresh, store=False)
+        return vectors
+
+    def _lookup(self, texts, key):
+        model, input_type, embedding_type = key
+        texts = list(texts)
+        vectors = self.get_many(model, input_type, texts, embedding_type)
+        # Identical texts in one request are only sent upstream once
+        unique = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        return texts, vectors, unique
+
+    def _fill(self, texts, vectors, key, unique, fresh_vectors, store=True):
+        model, input_type, embedding_type = key
+        fresh = dict(zip(unique, fresh_vectors))
+        if store:
+            self.put_many(model, input_type, unique, [fresh[text] for text in unique], embedding_type)
+        for i, text in enumerate(texts):
+            if vectors[i] is None:
+                vectors[i] = fresh[text]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": self._entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "upstream_calls": self.upstream_calls,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide cache instance (opened on first use)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+    return _cache
@@ -0,0 +1,111 @@
+"""
+Intent router for general (non-textbook) messages.
+
+All phrases are compiled once into a single word-bounded alternation with
+one named group per intent, so a message is classified in one regex pass
+and mapped straight to its canned response. Confidence is the share of the
+message's words covered by matched phrases (plus filler words such as
+"there" or "please"); messages below INTENT_MIN_CONFIDENCE, e.g. a greeting
+followed by a real question, go to the RAG pipeline instead.
+"""
+import re
+from dataclasses import dataclass
+
+from rag_core.settings import get_settings
+
+IDENTITY_RESPONSE = "I'm an AI tutor specializing in Physical AI and Humanoid Robotics. I can help you understand concepts from the textbook. What would you like to learn about Physical AI or Humanoid Robotics?"
+WELLBEING_RESPONSE = "I'm functioning well, thank you! I'm here to help you learn about Physical AI and Humanoid Robotics. Would you like to explore a concept from the textbook?"
+CAPABILITIES_RESPONSE = "I can explain concepts about Physical AI and Humanoid Robotics based on the textbook. Ask me anything about these topics!"
+GREETING_RESPONSE = "Hello! I'm an AI tutor for Physical AI and Humanoid Robotics. I can help you understand concepts from the textbook. What would you like to learn?"
+GENERAL_RESPONSE = "I'm an AI assistant specialized in Physical AI and Humanoid Robotics. I can only provide information from the textbook content. What would you like to know about Physical AI or Humanoid Robotics?"
+
+# Intent name -> (response, phrases). Earlier intents win when several match.
+INTENTS = {
+    "identity": (IDENTITY_RESPONSE, [
+        r"who are you",
+        r"what are you",
+        r"tell me about yourself",
+        r"introduce yourself",
+    ]),
+    "wellbeing": (WELLBEING_RESPONSE, [
+        r"how are you(?: doing)?",
+        r"how'?s it going",
+        r"how have you been",
+    ]),
+    "capabilities": (CAPABILITIES_RESPONSE, [
+        r"what can you do",
+        r"what do you do",
+        r"what is your (?:purpose|job)",
+    ]),
+    "greeting": (GREETING_RESPONSE, [
+        r"hello",
+        r"hi",
+        r"hey",
+        r"good (?:morning|afternoon|evening)",
+        r"greetings",
+        r"what'?s up",
+    ]),
+    "about": (GENERAL_RESPONSE, [
+        r"how does this work",
+        r"what is this(?! \w)",
+        r"(?:what(?: i|')s )?your name",
+        r"are you (?:a )?(?:human|real|bot|robot)",
+        r"what are you made of",
+        r"what language are you(?: written in)?",
+        r"who (?:created|developed|built|made) you",
+        r"(?:were|are) you (?:created|developed|built|made)(?: by)?",
+    ]),
+}
+
+# Words that do not change a general message into a textbook question
+FILLER_WORDS = frozenset(
+    "there please again bot chatbot assistant tutor ok okay so well oh and buddy friend thanks thank".split()
+)
+
+_ROUTER = re.compile(
+    "|".join(
+        rf"(?P<{name}>\b(?:{'|'.join(phrases)})\b)"
+        for name, (_, phrases) in INTENTS.items()
+    )
+)
+_PRIORITY = {name: rank for rank, name in enumerate(INTENTS)}
+_NON_WORD = re.compile(r"[^\w\s']+")
+_WORD = re.compile(r"[\w']+")
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    confidence: float
+    response: str
+
+
+def normalize_message(message):
+    """Lowercase and replace punctuation (except apostrophes) with spaces"""
+    return " ".join(_NON_WORD.sub(" ", message.lower()).split())
+
+
+def classify(message, min_confidence=None):
+    """Return the general-question Intent for message, or None if it should go to RAG"""
+    if min_confidence is None:
+        min_confidence = get_settings().intent_min_confidence
+    text = normalize_message(message)
+    if not text:
+        return None
+
+    best = None
+    covered = 0
+    for match in _ROUTER.finditer(text):
+        name = match.lastgroup
+        covered += len(_WORD.findall(match.group()))
+        if best is None or _PRIORITY[name] < _PRIORITY[best]:
+            best = name
+    if best is None:
+        return None
+
+    words = _WORD.findall(text)
+    covered += sum(1 for word in words if word in FILLER_WORDS)
+    confidence = min(1.0, covered / len(words))
+    if confidence < min_confidence:
+        return None
+    return Intent(name=best, confidence=confidence, response=INTENTS[best][0])
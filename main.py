@@ -1,57 +1,110 @@
-import requests
-import xml.etree.ElementTree as ET
-import trafilatura
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
-import cohere
-import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+import argparse
+import hashlib
+import uuid
+from qdrant_client.models import (
+    PointStruct, PointIdsList,
+    Filter, FieldCondition, MatchValue, SparseVectorParams, Modifier, PayloadSchemaType,
+)
+from urllib.parse import urlparse
+import time
+from collections import Counter
+from rag_core import get_settings, get_cohere_client, get_qdrant_client
+from rag_core.settings import COHERE_MAX_BATCH
+from rag_core.vectors import (
+    collection_config_diff, dense_vector_params, embed_request_options, hnsw_config,
+    quantization_config, response_embeddings, search_params, stored_embed_type,
+)
+from embedding_cache import get_embedding_cache
+from dead_letter import DeadLetterFile
+from checkpoint import IngestCheckpoint
+from collection_versions import (
+    bulk_load_optimizers, enable_indexing, live_collection, new_version_name, publish_version, rollback,
+    validate_version,
+)
+from sparse import SPARSE_VECTOR_NAME, document_sparse_vector
+from crawler import extract_text, fetch_html, iter_page_texts, iter_sitemap_entries
+from chunking import chunk_document
 
 # -------------------------------------
-# CONFIG
+# CONFIG (loaded from .env by rag_core.settings)
 # -------------------------------------
+settings = get_settings()
 # Your Deployment Link:
-SITEMAP_URL = os.getenv("SITEMAP_URL", "https://physical-ai-humanoid-robotics-beige.vercel.app/sitemap.xml")
-COLLECTION_NAME = os.getenv("COLLECTION_NAME", "physical_ai_book")
+SITEMAP_URL = settings.sitemap_url
+# Every configured sitemap (SITEMAPS), each tagged with a book_id
+BOOKS = settings.books
+COLLECTION_NAME = settings.collection_name
+EMBED_MODEL = settings.embed_model
+# At most COHERE_MAX_BATCH texts per embed request
+EMBED_BATCH_SIZE = settings.embed_batch_size
+UPSERT_BATCH_SIZE = settings.upsert_batch_size
 
-cohere_client = cohere.Client(os.getenv("COHERE_API_KEY"))
-EMBED_MODEL = os.getenv("EMBED_MODEL", "embed-english-v3.0")
+# The dense Cohere vector stays the collection's unnamed (default) vector
+DENSE_VECTOR_NAME = ""
 
-# Connect to Qdrant Cloud
-qdrant_client = QdrantClient(
-    url=os.getenv("QDRANT_URL"), 
-    api_key=os.getenv("QDRANT_API_KEY"),
-)
+# Keyword-indexed payload fields: url for incremental updates, book_id/section for scoped chat
+PAYLOAD_INDEX_FIELDS = ("url", "book_id", "section")
+
+SCROLL_PAGE_SIZE = 1000
 
 # -------------------------------------
 # Step 1 — Extract URLs from sitemap
 # -------------------------------------
-def get_all_urls(sitemap_url):
-    xml = requests.get(sitemap_url).text
-    root = ET.fromstring(xml)
-
-    urls = []
-    for child in root:
-        loc_tag = child.find("{http://www.sitemaps.org/schemas/sitemap/0.9}loc")
-        if loc_tag is not None:
-            urls.append(loc_tag.text)
+def get_sitemap_entries(sitemap_url, failed_sitemaps=None):
+    """
+    Return (url, lastmod) pairs from the sitemap, following sitemap indexes and
+    reading gzip sitemaps; lastmod is None when absent. Nested sitemaps that
+    could not be read are appended to failed_sitemaps.
+    """
+    entries = list(iter_sitemap_entries(sitemap_url, failed=failed_sitemaps))
 
     print("\nFOUND URLS:")
-    for u in urls:
+    for u, _ in entries:
         print(" -", u)
 
-    return urls
+    return entries
+
+
+def get_all_urls(sitemap_url):
+    return [url for url, _ in get_sitemap_entries(sitemap_url)]
+
+
+def url_section(url):
+    """First path segment below /docs/ (e.g. "module-1-ros2"), or "" for top-level pages"""
+    parts = [part for part in urlparse(url).path.split("/") if part]
+    if parts and parts[0] == "docs":
+        parts = parts[1:]
+    return parts[0] if len(parts) > 1 else ""
+
+
+def get_book_pages(books, failed_sitemaps=None):
+    """
+    Return {url: {"lastmod", "book_id", "section"}} for every configured sitemap.
+    A page listed by several books stays with the first one. Nested sitemaps
+    that could not be read are appended to failed_sitemaps (their pages are missing).
+    """
+    pages = {}
+    for book in books:
+        print(f"\nBook: {book.book_id} ({book.sitemap_url})")
+        for url, lastmod in get_sitemap_entries(book.sitemap_url, failed_sitemaps):
+            pages.setdefault(url, {
+                "lastmod": lastmod,
+                "book_id": book.book_id,
+                "section": book.section if book.section is not None else url_section(url),
+            })
+    return pages
+
+
+def page_tags(page):
+    return {"book_id": page["book_id"], "section": page["section"]}
 
 
 # -------------------------------------
 # Step 2 — Download page + extract text
 # -------------------------------------
 def extract_text_from_url(url):
-    html = requests.get(url).text
-    text = trafilatura.extract(html)
+    html = fetch_html(url)
+    text = extract_text(html)
 
     if not text:
         print("[WARNING] No text extracted from:", url)
@@ -62,119 +115,590 @@ def extract_text_from_url(url):
 # -------------------------------------
 # Step 3 — Chunk the text
 # -------------------------------------
-def chunk_text(text, max_chars=1200):
-    if not text:
-        return []
-    chunks = []
-    while len(text) > max_chars:
-        split_pos = text[:max_chars].rfind(". ")
-        if split_pos == -1:
-            split_pos = max_chars
-        chunks.append(text[:split_pos].strip())
-        # Skip the ". " delimiter (2 characters)
-        text = text[split_pos + 2:].strip() if split_pos + 2 < len(text) else text[split_pos:].strip()
-    if text.strip():
-        chunks.append(text.strip())
-    return chunks
+def chunk_text(text):
+    """Token-sized chunks that follow the page's headings, paragraphs and code blocks"""
+    return chunk_document(text)
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_point_id(url, chunk_hash):
+    """Deterministic point ID: the same chunk of the same page always maps to the same point"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{url}#{chunk_hash}"))
 
 
 # -------------------------------------
 # Step 4 — Create embedding
 # -------------------------------------
 def embed(text):
-    response = cohere_client.embed(
+    return embed_batch([text])[0]  # Return the first embedding
+
+
+def _embed_uncached(texts):
+    response = get_cohere_client().embed(
         model=EMBED_MODEL,
         input_type="search_document",  # Use search_document for indexing documents
-        texts=[text],
+        texts=texts,
+        **embed_request_options(settings),
+    )
+    return response_embeddings(response, settings)
+
+
+def embed_batch(texts):
+    """
+    Embed a list of chunks (max COHERE_MAX_BATCH texts). Cached vectors are
+    reused; the rest go to Cohere in a single request.
+    """
+    return get_embedding_cache().embed(
+        texts, EMBED_MODEL, "search_document", _embed_uncached, embedding_type=settings.embed_type,
     )
-    return response.embeddings[0]  # Return the first embedding
 
 
 # -------------------------------------
 # Step 5 — Store in Qdrant
 # -------------------------------------
-def create_collection():
-    print("\nCreating Qdrant collection...")
-    qdrant_client.recreate_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(
-        size=1024,        # Cohere embed-english-v3.0 dimension
-        distance=Distance.COSINE
-        )
+def create_collection(collection=COLLECTION_NAME, bulk_load=False):
+    """bulk_load=True defers HNSW indexing until collection_versions.enable_indexing()"""
+    print(f"\nCreating Qdrant collection {collection}...")
+    get_qdrant_client().recreate_collection(
+        collection_name=collection,
+        # Cohere embed-english-v3.0 (1024-d); datatype, on-disk storage,
+        # quantization and HNSW parameters come from settings
+        vectors_config=dense_vector_params(settings),
+        hnsw_config=hnsw_config(settings),
+        quantization_config=quantization_config(settings),
+        optimizers_config=bulk_load_optimizers() if bulk_load else None,
+        # BM25 term weights for hybrid search; Qdrant applies the IDF factor
+        sparse_vectors_config={
+            SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF),
+        },
     )
+    ensure_payload_indexes(collection=collection)
+
+
+def ensure_payload_indexes(info=None, collection=COLLECTION_NAME):
+    """Create the keyword payload indexes that filtered searches and updates rely on"""
+    existing = info.payload_schema if info is not None else {}
+    for field in PAYLOAD_INDEX_FIELDS:
+        if field not in existing:
+            get_qdrant_client().create_payload_index(
+                collection_name=collection,
+                field_name=field,
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
+
 
-def save_chunk_to_qdrant(chunk, chunk_id, url):
+def ensure_collection(collection):
+    """
+    Check the live collection before an incremental run. Returns False when
+    it does not exist yet, lacks the sparse vector or was built for another
+    EMBED_TYPE and therefore needs a full build. Changed quantization, HNSW
+    and on-disk settings are applied in place.
+    """
+    if not get_qdrant_client().collection_exists(collection):
+        print(f"[INFO] {collection} does not exist yet; building it")
+        return False
+    info = get_qdrant_client().get_collection(collection)
+    if SPARSE_VECTOR_NAME not in (info.config.params.sparse_vectors or {}):
+        print(f"[INFO] {collection} has no '{SPARSE_VECTOR_NAME}' sparse vector; rebuilding it")
+        return False
+    if stored_embed_type(info) != settings.embed_type:
+        print(f"[INFO] {collection} stores {stored_embed_type(info)} vectors, "
+              f"EMBED_TYPE is {settings.embed_type}; rebuilding it")
+        return False
+    diff = collection_config_diff(settings, info)
+    if diff:
+        print(f"[INFO] Updating {collection}: {', '.join(diff)}")
+        get_qdrant_client().update_collection(collection_name=collection, **diff)
+    ensure_payload_indexes(info, collection)
+    return True
+
+
+def load_index_state(collection=COLLECTION_NAME):
+    """
+    Scroll the collection payloads (no vectors) and return what is indexed per page:
+    {url: {"lastmod", "page_hash", "book_id", "section", "points": {point_id: chunk_index}}}
+    """
+    state = {}
+    offset = None
+    while True:
+        points, offset = get_qdrant_client().scroll(
+            collection_name=collection,
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=["url", "lastmod", "page_hash", "book_id", "section", "chunk_index"],
+            with_vectors=False,
+        )
+        for point in points:
+            payload = point.payload or {}
+            page = state.setdefault(payload.get("url"), {
+                "lastmod": payload.get("lastmod"),
+                "page_hash": payload.get("page_hash"),
+                "book_id": payload.get("book_id"),
+                "section": payload.get("section"),
+                "points": {},
+            })
+            page["points"][str(point.id)] = payload.get("chunk_index")
+        if offset is None:
+            return state
+
+
+def url_filter(url):
+    return Filter(must=[FieldCondition(key="url", match=MatchValue(value=url))])
+
+
+def bump_index_version(collection=COLLECTION_NAME):
+    """
+    Record a new index_version in the collection metadata; the API polls it
+    to invalidate cached answers after a re-ingest.
+    """
+    version = uuid.uuid4().hex
     try:
-        vector = embed(chunk)
-        qdrant_client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=[
-                PointStruct(
-                    id=chunk_id,
-                    vector=vector,
-                    payload={
-                        "url": url,
-                        "text": chunk,
-                        "chunk_id": chunk_id
-                    }
-                )
-            ]
+        get_qdrant_client().update_collection(
+            collection_name=collection,
+            metadata={"index_version": version},
         )
-        return True
+        print(f"Index version: {version}")
     except Exception as e:
-        print(f"[ERROR] Failed to save chunk {chunk_id}: {str(e)}")
-        return False
+        print(f"[WARNING] Could not update index version: {str(e)}")
+
+
+def delete_points(point_ids, collection=COLLECTION_NAME):
+    point_ids = list(point_ids)
+    for start in range(0, len(point_ids), UPSERT_BATCH_SIZE):
+        get_qdrant_client().delete(
+            collection_name=collection,
+            points_selector=PointIdsList(points=point_ids[start:start + UPSERT_BATCH_SIZE]),
+        )
+
+
+class ChunkBatcher:
+    """
+    Buffers chunks and writes them in bulk: one Cohere embed request per
+    EMBED_BATCH_SIZE chunks and one Qdrant upsert per UPSERT_BATCH_SIZE points.
+    Chunks that still fail after the upstream retries go to the dead-letter file.
+    A page handed to page_done() is written to the checkpoint once all of its
+    chunks are stored. Keeps counters so ingestion can report throughput and
+    requests issued.
+    """
+
+    def __init__(self, embed_batch_size=EMBED_BATCH_SIZE, upsert_batch_size=UPSERT_BATCH_SIZE, dead_letter=None,
+                 checkpoint=None, collection=COLLECTION_NAME):
+        self.collection = collection
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.dead_letter = dead_letter if dead_letter is not None else DeadLetterFile()
+        self.checkpoint = checkpoint
+        self.pending = []   # (point_id, payload) waiting for an embedding
+        self.points = []    # PointStruct waiting for an upsert
+        self.unsaved = Counter()  # url -> chunks not stored yet
+        self.done_pages = {}      # url -> checkpoint entry waiting for its chunks to be stored
+        self.failed_urls = set()
+        self.saved_chunks = 0
+        self.failed_chunks = 0
+        self.embed_requests = 0
+        self.upsert_requests = 0
+        self.started_at = time.perf_counter()
+
+    def add(self, point_id, payload):
+        """Queue a chunk; payload must contain the chunk "text" and its page "url" """
+        self.pending.append((point_id, payload))
+        self.unsaved[payload["url"]] += 1
+        if len(self.pending) >= self.embed_batch_size:
+            self._embed_pending()
+
+    def page_done(self, url, **entry):
+        """Every chunk of url has been added; checkpoint it once they are all stored"""
+        self.done_pages[url] = entry
+        self._checkpoint_pages([url])
+
+    def _checkpoint_pages(self, urls):
+        for url in urls:
+            if url in self.done_pages and not self.unsaved[url] and url not in self.failed_urls:
+                entry = self.done_pages.pop(url)
+                if self.checkpoint is not None:
+                    self.checkpoint.add_page(url, **entry)
+
+    def flush(self):
+        """Embed and upsert everything still buffered"""
+        self._embed_pending()
+        self._upsert_points(final=True)
+        get_embedding_cache().flush()
+
+    def _fail(self, chunks, action, error):
+        """chunks: (point_id, payload) pairs"""
+        print(f"[ERROR] Failed to {action} {len(chunks)} chunks: {str(error)}")
+        self.failed_chunks += len(chunks)
+        self.failed_urls.update(payload["url"] for _, payload in chunks)
+        self.dead_letter.add(chunks, action, error)
+
+    def _embed_pending(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        cache = get_embedding_cache()
+        calls_before = cache.upstream_calls
+        try:
+            vectors = embed_batch([payload["text"] for _, payload in batch])
+        except Exception as e:
+            self._fail(batch, "embed", e)
+            return
+        finally:
+            self.embed_requests += cache.upstream_calls - calls_before
+
+        for (point_id, payload), vector in zip(batch, vectors):
+            self.points.append(PointStruct(
+                id=point_id,
+                vector={
+                    DENSE_VECTOR_NAME: vector,
+                    SPARSE_VECTOR_NAME: document_sparse_vector(payload["text"]),
+                },
+                payload=payload,
+            ))
+        self._upsert_points()
+
+    def _upsert_points(self, final=False):
+        while len(self.points) >= self.upsert_batch_size or (final and self.points):
+            batch = self.points[:self.upsert_batch_size]
+            self.points = self.points[self.upsert_batch_size:]
+            try:
+                self.upsert_requests += 1
+                get_qdrant_client().upsert(collection_name=self.collection, points=batch)
+                self.saved_chunks += len(batch)
+                print(f"  ✓ Saved {len(batch)} chunks")
+                urls = [point.payload["url"] for point in batch]
+                self.unsaved.subtract(urls)
+                self._checkpoint_pages(set(urls))
+            except Exception as e:
+                self._fail([(point.id, point.payload) for point in batch], "upsert", e)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started_at
+        rate = self.saved_chunks / elapsed if elapsed > 0 else 0.0
+        print(f"Elapsed: {elapsed:.1f}s ({rate:.1f} chunks/sec)")
+        print(f"Embed requests: {self.embed_requests} (batch size {self.embed_batch_size})")
+        print(f"Upsert requests: {self.upsert_requests} (batch size {self.upsert_batch_size})")
+        stats = get_embedding_cache().stats()
+        if stats["enabled"]:
+            print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['entries']} entries")
 
 
 # -------------------------------------
 # MAIN INGESTION PIPELINE
 # -------------------------------------
-def ingest_book():
+def ingest_book(full=False, resume=True):
+    """
+    Index the sitemap into Qdrant.
+
+    By default the run is incremental: pages whose sitemap <lastmod> is unchanged
+    are not downloaded, only chunks whose content hash is new are embedded, and
+    points of removed pages/chunks are deleted; it updates the live collection
+    behind the COLLECTION_NAME alias in place. full=True re-embeds everything into
+    a new collection version and, once that is validated, swaps the alias to it
+    (collection_versions), so searches never see a partial index.
+
+    Finished pages are recorded in the checkpoint file; when the previous run
+    was interrupted, this one continues it (unless resume=False) and skips them.
+
+    When a nested sitemap cannot be read, its pages are unknown rather than
+    removed: an incremental run deletes no pages. A full build missing the
+    pages of a failed sitemap, or pages that could not be fetched or
+    processed, is not published (its checkpoint stays open, so the next run
+    resumes it and retries them).
+    """
     try:
-        urls = get_all_urls(SITEMAP_URL)
-        print(f"\nTotal URLs found: {len(urls)}")
+        settings.validate_vectors()
+        failed_sitemaps = []
+        pages = get_book_pages(BOOKS, failed_sitemaps)
+        print(f"\nTotal URLs found: {len(pages)} in {len(BOOKS)} sitemap(s)")
+        if failed_sitemaps:
+            print(f"[WARNING] {len(failed_sitemaps)} sitemap(s) could not be read; their pages are missing from this run")
 
-        create_collection()
+        dead_letter = DeadLetterFile()
+        checkpoint = IngestCheckpoint().load()
+        resuming = (resume and checkpoint.resumable(COLLECTION_NAME, full)
+                    and get_qdrant_client().collection_exists(checkpoint.run.get("target", COLLECTION_NAME)))
+        if resuming:
+            full = checkpoint.run["full"]
+            collection = checkpoint.run.get("target", COLLECTION_NAME)
+            print(f"[RESUME] Continuing the {'full' if full else 'incremental'} run into {collection} started "
+                  f"{checkpoint.run['started_at']}: {len(checkpoint.pages)} pages already done")
+            index = load_index_state(collection)
+        else:
+            collection = live_collection(COLLECTION_NAME)
+            if not full and not ensure_collection(collection):
+                full = True
+            if full:
+                # Built next to the live version, which keeps serving until the alias swap
+                collection = new_version_name(COLLECTION_NAME)
+                create_collection(collection, bulk_load=True)
+                index = {}
+                # Everything is re-embedded, so earlier failures no longer apply
+                dead_letter.replace([])
+            else:
+                index = load_index_state(collection)
+                print(f"Indexed pages: {len(index)}")
 
-        global_id = 1
-        total_chunks = 0
-        failed_chunks = 0
+        to_fetch = [
+            url for url, page in pages.items()
+            if not (page["lastmod"] and url in index and index[url]["lastmod"] == page["lastmod"])
+        ]
+        done_pages = 0
+        if resuming:
+            # Pages the interrupted run still had to do were maybe partly stored
+            # (with the new lastmod), so the plan is kept; finished pages are skipped
+            planned = set(checkpoint.run["to_fetch"]) | set(to_fetch)
+            to_fetch = [url for url in pages if url in planned and url not in checkpoint.pages]
+            done_pages = len(planned & set(pages)) - len(to_fetch)
+            checkpoint.resume()
+        else:
+            checkpoint.start(COLLECTION_NAME, full, to_fetch, target=collection)
+        skipped_pages = len(pages) - len(to_fetch) - done_pages
 
-        for url in urls:
+        # Unchanged pages only get their book/section tags updated (e.g. points indexed before book_id)
+        retagged_pages = 0
+        for url in set(pages) - set(to_fetch):
+            if url not in index:
+                continue  # finished earlier without any text
+            tags = page_tags(pages[url])
+            if any(index[url][key] != value for key, value in tags.items()):
+                get_qdrant_client().set_payload(
+                    collection_name=collection,
+                    payload=tags,
+                    points=url_filter(url),
+                )
+                retagged_pages += 1
+
+        # Points are only deleted after the new ones are written, so search never sees a gap
+        stale_ids = {}
+        if failed_sitemaps:
+            print("[WARNING] Not removing pages missing from the sitemaps, since some sitemaps failed")
+        else:
+            for url in set(index) - set(pages):
+                print(f"[REMOVED] {url}")
+                stale_ids[url] = set(index[url]["points"])
+        if resuming:
+            for url, entry in checkpoint.pages.items():
+                if entry["stale"]:
+                    stale_ids[url] = set(entry["stale"])
+
+        batcher = ChunkBatcher(dead_letter=dead_letter, checkpoint=checkpoint, collection=collection)
+        unchanged_chunks = 0
+        ingested_urls = set(checkpoint.pages) if resuming else set()
+        # Not checkpointed, so a resumed run tries them again
+        failed_pages = []
+
+        # Pages are fetched/extracted concurrently and arrive in completion order
+        for url, text, error in iter_page_texts(to_fetch):
             print("\nProcessing:", url)
+            if error is not None:
+                print(f"[ERROR] Failed to fetch URL {url}: {str(error)}")
+                failed_pages.append(url)
+                continue
             try:
-                text = extract_text_from_url(url)
-
                 if not text:
                     print(f"[SKIP] No text extracted from: {url}")
+                    batcher.page_done(url, lastmod=pages[url]["lastmod"], page_hash=None, points={}, stale=[])
                     continue
 
-                chunks = chunk_text(text)
-                print(f"  → Created {len(chunks)} chunks from this URL")
+                lastmod = pages[url]["lastmod"]
+                tags = page_tags(pages[url])
+                page_hash = content_hash(text)
+                known = index.get(url, {}).get("points", {})
+                current = {}
 
-                for ch in chunks:
-                    if not ch or len(ch.strip()) == 0:
+                for ch in chunk_text(text):
+                    if not ch.text.strip():
                         continue
-                    success = save_chunk_to_qdrant(ch, global_id, url)
-                    if success:
-                        print(f"  ✓ Saved chunk {global_id} (length: {len(ch)} chars)")
-                        total_chunks += 1
-                    else:
-                        failed_chunks += 1
-                    global_id += 1
+                    chunk_hash = content_hash(ch.text)
+                    point_id = chunk_point_id(url, chunk_hash)
+                    if point_id in current:
+                        continue
+                    chunk_index = len(current)
+                    current[point_id] = chunk_index
+                    if point_id in known:
+                        if known[point_id] != chunk_index:
+                            get_qdrant_client().set_payload(
+                                collection_name=collection,
+                                payload={"chunk_index": chunk_index, "heading": ch.heading, "headings": list(ch.headings)},
+                                points=[point_id],
+                            )
+                        continue
+                    batcher.add(point_id, {
+                        "url": url,
+                        **tags,
+                        "text": ch.text,
+                        "heading": ch.heading,
+                        "headings": list(ch.headings),
+                        "chunk_id": point_id,
+                        "chunk_index": chunk_index,
+                        "chunk_hash": chunk_hash,
+                        "page_hash": page_hash,
+                        "lastmod": lastmod,
+                    })
+
+                kept = set(known) & set(current)
+                unchanged_chunks += len(kept)
+                page_fields = {"lastmod": lastmod, "page_hash": page_hash, **tags}
+                if kept and any(index[url][key] != value for key, value in page_fields.items()):
+                    get_qdrant_client().set_payload(
+                        collection_name=collection,
+                        payload=page_fields,
+                        points=url_filter(url),
+                    )
+                if set(known) - set(current):
+                    stale_ids[url] = set(known) - set(current)
+                batcher.page_done(url, lastmod=lastmod, page_hash=page_hash, points=current,
+                                  stale=sorted(stale_ids.get(url, ())))
+                ingested_urls.add(url)
+                print(f"  → {len(current)} chunks ({len(current) - len(kept)} new, {len(kept)} unchanged)")
             except Exception as e:
                 print(f"[ERROR] Failed to process URL {url}: {str(e)}")
+                failed_pages.append(url)
                 continue
 
+        batcher.flush()
+
+        # Pages with failed chunks keep their old points and lose their lastmod,
+        # so the next incremental run fetches them again
+        for url in batcher.failed_urls:
+            stale_ids.pop(url, None)
+            get_qdrant_client().set_payload(
+                collection_name=collection,
+                payload={"lastmod": None},
+                points=url_filter(url),
+            )
+        deleted = sum(len(ids) for ids in stale_ids.values())
+        delete_points((point_id for ids in stale_ids.values() for point_id in ids), collection)
+        if full or batcher.saved_chunks or deleted or retagged_pages:
+            bump_index_version(collection)
+        dead_letter.discard_urls(ingested_urls - batcher.failed_urls)
+        if full and (failed_sitemaps or failed_pages):
+            # Left unfinished: the next run re-reads the sitemaps and resumes this build
+            checkpoint.close()
+            missing = []
+            if failed_sitemaps:
+                missing.append(f"the pages of these sitemaps: {', '.join(failed_sitemaps)}")
+            if failed_pages:
+                missing.append(f"{len(failed_pages)} page(s) that could not be fetched or processed")
+            print(f"\n[ERROR] Not publishing {collection}; it is missing {' and '.join(missing)}. "
+                  f"{COLLECTION_NAME} still serves {live_collection(COLLECTION_NAME)}; "
+                  f"run main.py again to resume the build.")
+            return
+        published = not full or publish_build(collection, sum(len(page["points"]) for page in checkpoint.pages.values()))
+        checkpoint.finish(saved_chunks=batcher.saved_chunks, failed_chunks=batcher.failed_chunks,
+                          deleted_chunks=deleted, collection=collection, published=published)
+        if not published:
+            return
+
         print("\n✔️ Ingestion completed!")
-        print(f"Total chunks stored: {total_chunks}")
-        print(f"Failed chunks: {failed_chunks}")
-        print(f"Total chunk IDs used: {global_id - 1}")
+        print(f"Pages skipped (unchanged lastmod): {skipped_pages}")
+        if resuming:
+            print(f"Pages already done before resuming: {done_pages}")
+        print(f"Pages retagged (book/section): {retagged_pages}")
+        print(f"Chunks embedded and stored: {batcher.saved_chunks}")
+        print(f"Chunks unchanged: {unchanged_chunks}")
+        print(f"Stale chunks deleted: {deleted}")
+        print(f"Failed chunks: {batcher.failed_chunks}")
+        if dead_letter.enabled and batcher.failed_chunks:
+            print(f"Failed chunks saved to {dead_letter.path}; retry with: python main.py --retry-failed")
+        batcher.report()
     except Exception as e:
         print(f"\n[FATAL ERROR] Ingestion failed: {str(e)}")
         import traceback
         traceback.print_exc()
 
 
+def publish_build(collection, expected_points):
+    """
+    Index, validate and swap the COLLECTION_NAME alias to a new full build.
+    A build that fails validation is left in place, unpublished, for inspection.
+    """
+    enable_indexing(collection)
+    problems = validate_version(collection, expected_points, search_params(settings), alias=COLLECTION_NAME)
+    if problems:
+        print(f"\n[ERROR] Not publishing {collection}; {COLLECTION_NAME} still serves "
+              f"{live_collection(COLLECTION_NAME)}. Fix the problems and run --full again.")
+        return False
+    publish_version(COLLECTION_NAME, collection)
+    return True
+
+
+def rollback_collection():
+    """Point the COLLECTION_NAME alias back at the previous collection version"""
+    try:
+        live = live_collection(COLLECTION_NAME)
+        previous = rollback(COLLECTION_NAME)
+        if previous is None:
+            print(f"[ERROR] No previous version of {COLLECTION_NAME} to roll back to (live: {live}).")
+            return
+        # The API clears its answer cache when the index_version it reads changes
+        bump_index_version(previous)
+        print(f"\n✔️ Rolled back {COLLECTION_NAME} from {live} to {previous}")
+    except Exception as e:
+        print(f"\n[FATAL ERROR] Rollback failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+def retry_failed_chunks():
+    """
+    Embed and store the chunks in the dead-letter file again; the ones that
+    fail again stay in it. Their pages keep lastmod=None, so the next
+    incremental run still reconciles them (stale chunks are only deleted there).
+    """
+    try:
+        dead_letter = DeadLetterFile()
+        entries = dead_letter.load()
+        if not entries:
+            print("No failed chunks to retry.")
+            return
+        collection = live_collection(COLLECTION_NAME)
+        if not get_qdrant_client().collection_exists(collection):
+            print(f"[ERROR] Collection {COLLECTION_NAME} does not exist; run a full ingestion instead.")
+            return
+
+        # Failures of this run are appended after the entries being retried
+        batcher = ChunkBatcher(dead_letter=dead_letter, collection=collection)
+        retried = set()
+        for entry in entries:
+            if entry["point_id"] not in retried:
+                retried.add(entry["point_id"])
+                # lastmod=None like the rest of the page's points: the next run re-checks the page
+                batcher.add(entry["point_id"], {**entry["payload"], "lastmod": None})
+        batcher.flush()
+        dead_letter.replace(dead_letter.load()[len(entries):])
+        if batcher.saved_chunks:
+            bump_index_version(collection)
+
+        print("\n✔️ Retry completed!")
+        print(f"Chunks retried: {len(retried)}")
+        print(f"Chunks embedded and stored: {batcher.saved_chunks}")
+        print(f"Chunks still failing: {batcher.failed_chunks}")
+        batcher.report()
+    except Exception as e:
+        print(f"\n[FATAL ERROR] Retry failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
 if __name__ == "__main__":
-    ingest_book()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Index the book sitemaps (SITEMAPS) into Qdrant")
+    parser.add_argument("--full", action="store_true",
+                        help="re-embed every page into a new collection version and swap the alias to it")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="only embed and store the chunks recorded in the dead-letter file")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore an interrupted run's checkpoint instead of resuming it")
+    parser.add_argument("--rollback", action="store_true",
+                        help="point the collection alias back at the previous collection version")
+    args = parser.parse_args()
+    if args.rollback:
+        rollback_collection()
+    elif args.retry_failed:
+        retry_failed_chunks()
+    else:
+        ingest_book(full=args.full, resume=not args.restart)
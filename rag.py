@@ -1,37 +1,10 @@
-import cohere
-from qdrant_client import QdrantClient
-import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Initialize Cohere client
-cohere_client = cohere.Client(os.getenv("COHERE_API_KEY"))
-
-# Connect to Qdrant
-qdrant_client = QdrantClient(
-    url=os.getenv("QDRANT_URL"), 
-    api_key=os.getenv("QDRANT_API_KEY"),
-)
-
-def get_embedding(text):
-    """Get embedding vector from Cohere Embed v3"""
-    response = cohere_client.embed(
-        model=os.getenv("EMBED_MODEL", "embed-english-v3.0"),
-        input_type="search_query",  # Use search_query for queries
-        texts=[text],
-    )
-    return response.embeddings[0]  # Return the first embedding
+import asyncio
+from rag_core.retrieval import search_passages
 
 def retrieve(query):
-    embedding = get_embedding(query)
-    result = qdrant_client.query_points(
-        collection_name=os.getenv("COLLECTION_NAME", "physical_ai_book"),
-        query=embedding,
-        limit=5
-    )
-    return [point.payload["text"] for point in result.points]
+    points = asyncio.run(search_passages(query))
+    return [point.payload["text"] for point in points]
 
-# Test
-print(retrieve("What data do you have?"))
\ No newline at end of file
+# Test (only when executing this file directly, never on import)
+if __name__ == "__main__":
+    print(retrieve("What data do you have?"))
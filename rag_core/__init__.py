@@ -0,0 +1,15 @@
+"""
+Shared core for ingestion and the API: settings, lazily created clients,
+retrieval and the agent definitions.
+"""
+from rag_core.settings import Book, Settings, get_settings
+from rag_core.clients import (
+    get_async_cohere_client,
+    get_async_qdrant_client,
+    get_cohere_client,
+    get_openai_client,
+    get_qdrant_client,
+    override_client,
+    reset_clients,
+    warm_up,
+)
@@ -0,0 +1,169 @@
+"""
+Admission control for agent runs: a bounded, per-client fair queue with deadlines.
+
+At most `concurrency` agent runs execute at once. Requests beyond that wait
+in one FIFO per client (API key or IP) and free slots go to the clients in
+round-robin order, so a client sending many requests only delays itself.
+A request is rejected up front instead of waiting when
+- the queue holds `max_queue` requests (503, server busy),
+- its client already has `max_per_client` requests queued (429, too many
+  requests; running requests do not count, so a busy NAT is only limited
+  when the server is saturated), or
+- its estimated wait (from the average run time and its round-robin
+  position) exceeds its deadline (503);
+and is dropped with 503 when its deadline passes while still queued.
+Every rejection carries a Retry-After estimate.
+
+Cached, general and coalesced answers need no agent run and bypass the
+queue, except that a follow-up in a session is admitted before its query
+rewrite (an LLM call of its own); that slot is released as soon as the
+answer turns out to be cached or coalesced, with release(ran=False) so the
+short hold does not count toward the average run time.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+
+
+class AdmissionRejected(Exception):
+    """The request was shed; status_code is 429 or 503"""
+
+    def __init__(self, status_code, reason, retry_after):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+    def headers(self):
+        return {"Retry-After": str(self.retry_after)}
+
+
+class Slot:
+    """
+    A running agent run's place; release() is idempotent. ran=False releases a
+    slot that never ran an agent without feeding its hold time into the
+    average run time the wait estimates are based on.
+    """
+
+    def __init__(self, queue, client):
+        self.queue = queue
+        self.client = client
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self, ran=True):
+        if not self.released:
+            self.released = True
+            self.queue._release(self, ran)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+class FairQueue:
+    def __init__(self, concurrency, max_queue, max_per_client, initial_run_seconds=5.0):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_per_client = max_per_client
+        self.running = 0
+        self._waiting = OrderedDict()  # client -> deque of futures, in round-robin order
+        self._queued = 0
+        # Exponentially weighted average run time, for wait estimates
+        self.avg_run_seconds = initial_run_seconds
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected_busy = 0
+        self.rejected_client = 0
+        self.shed_deadline = 0
+        self.expired = 0
+
+    def estimated_wait(self, client):
+        """Seconds until a request queued now for client would start"""
+        position = len(self._waiting.get(client, ()))
+        ahead = position + sum(min(len(waiters), position + 1)
+                               for other, waiters in self._waiting.items() if other != client)
+        return math.ceil((ahead + 1) / self.concurrency) * self.avg_run_seconds
+
+    async def acquire(self, client, timeout):
+        """Wait (at most timeout seconds) for a slot; raises AdmissionRejected"""
+        if self.running < self.concurrency and not self._queued:
+            return self._start(client)
+        if len(self._waiting.get(client, ())) >= self.max_per_client:
+            self.rejected_client += 1
+            raise AdmissionRejected(429, "Too many concurrent requests from this client", self.estimated_wait(client))
+        if self._queued >= self.max_queue:
+            self.rejected_busy += 1
+            raise AdmissionRejected(503, "Server busy", self.estimated_wait(client))
+        wait = self.estimated_wait(client)
+        if wait > timeout:
+            self.shed_deadline += 1
+            raise AdmissionRejected(503, "Server busy", wait)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(client, deque()).append(future)
+        self._queued += 1
+        self.queued_total += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if future.done():  # granted just as the deadline passed
+                return future.result()
+            self._remove(client, future)
+            future.cancel()
+            self.expired += 1
+            raise AdmissionRejected(503, "Request deadline exceeded while queued", self.estimated_wait(client))
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                future.result().release(ran=False)
+            else:
+                self._remove(client, future)
+                future.cancel()
+            raise
+
+    def _start(self, client):
+        self.running += 1
+        self.admitted += 1
+        return Slot(self, client)
+
+    def _remove(self, client, future):
+        waiters = self._waiting.get(client)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self._queued -= 1
+            if not waiters:
+                del self._waiting[client]
+
+    def _release(self, slot, ran):
+        self.running -= 1
+        if ran:
+            self.avg_run_seconds += 0.2 * (time.monotonic() - slot.started - self.avg_run_seconds)
+        self._grant_next()
+
+    def _grant_next(self):
+        while self.running < self.concurrency and self._waiting:
+            client, waiters = self._waiting.popitem(last=False)
+            future = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._waiting[client] = waiters  # back of the round-robin order
+            if not future.done():
+                future.set_result(self._start(client))
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "queued": self._queued,
+            "waiting_clients": len(self._waiting),
+            "avg_run_seconds": round(self.avg_run_seconds, 3),
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected_busy": self.rejected_busy,
+            "rejected_client": self.rejected_client,
+            "shed_deadline": self.shed_deadline,
+            "expired": self.expired,
+        }
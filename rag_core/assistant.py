@@ -0,0 +1,167 @@
+"""
+Agent definitions shared by the API and the command-line scripts.
+
+Agents are built on first use (so importing this module does not create an
+OpenAI client) and cached for the life of the process.
+"""
+from functools import lru_cache
+
+from agents import Agent, ModelSettings, OpenAIChatCompletionsModel, Runner
+
+from rag_core.clients import get_openai_client
+from rag_core.metrics import TracingHooks, record_usage, span
+from rag_core.retrieval import packer, retrieve, search_passages
+from rag_core.settings import get_settings
+
+AGENT_INSTRUCTIONS = """
+You are a concise AI tutor for Physical AI and Humanoid Robotics. Answer questions using ONLY retrieved textbook content.
+
+**CRITICAL: Be CONCISE to minimize API costs:**
+- Keep responses brief and direct - avoid unnecessary words
+- Use bullet points instead of long paragraphs when possible
+- Get straight to the answer without lengthy introductions
+- Avoid repetition and redundant explanations
+- Limit responses to 2-4 sentences for simple questions, max 1-2 paragraphs for complex ones
+
+**Process:**
+1. Always use `retrieve` tool first
+2. Base answers STRICTLY on retrieved content only
+3. Synthesize key points concisely
+4. If information unavailable, briefly say: "Not found in textbook. Try rephrasing."
+
+**Style:**
+- Direct and factual
+- No fluff or filler words
+- Essential information only
+- Professional but brief
+"""
+
+DIRECT_INSTRUCTIONS = """
+You are a concise AI tutor for Physical AI and Humanoid Robotics. Answer questions using ONLY the textbook excerpts included in the message.
+
+**CRITICAL: Be CONCISE to minimize API costs:**
+- Keep responses brief and direct - avoid unnecessary words
+- Use bullet points instead of long paragraphs when possible
+- Get straight to the answer without lengthy introductions
+- Avoid repetition and redundant explanations
+- Limit responses to 2-4 sentences for simple questions, max 1-2 paragraphs for complex ones
+
+**Process:**
+1. Read the numbered textbook excerpts
+2. Base answers STRICTLY on those excerpts only
+3. Synthesize key points concisely
+4. If information unavailable, briefly say: "Not found in textbook. Try rephrasing."
+
+**Style:**
+- Direct and factual
+- No fluff or filler words
+- Essential information only
+- Professional but brief
+"""
+
+REWRITE_INSTRUCTIONS = """
+Rewrite the user's latest message as one standalone question about the Physical AI and Humanoid Robotics textbook.
+Resolve pronouns and references ("it", "that", "the second one") using the conversation.
+If the message is already standalone, return it unchanged. Reply with the question only.
+"""
+
+SUMMARY_INSTRUCTIONS = """
+You maintain a running summary of a tutoring conversation about Physical AI and Humanoid Robotics.
+Merge the new turns into the existing summary: keep the topics discussed, what the user asked
+and the key facts they were told. Drop greetings and filler. Reply with the summary only, at most {words} words.
+"""
+
+
+@lru_cache(maxsize=1)
+def get_chat_model():
+    return OpenAIChatCompletionsModel(
+        model=get_settings().openai_model,
+        openai_client=get_openai_client()
+    )
+
+
+@lru_cache(maxsize=1)
+def get_agent():
+    """Tool-calling agent: the model decides to call `retrieve` (two LLM calls per question)"""
+    return Agent(
+        name="Assistant for Physical AI & Humanoid Robotics",
+        instructions=AGENT_INSTRUCTIONS,
+        model=get_chat_model(),
+        tools=[retrieve]
+    )
+
+
+@lru_cache(maxsize=1)
+def get_direct_agent():
+    """Tool-less agent answering from passages inlined in the input (one LLM call)"""
+    return Agent(
+        name="Assistant for Physical AI & Humanoid Robotics (direct)",
+        instructions=DIRECT_INSTRUCTIONS,
+        model=get_chat_model(),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_rewrite_agent():
+    """Turns a follow-up into a standalone retrieval query (short, deterministic output)"""
+    return Agent(
+        name="Query rewriter",
+        instructions=REWRITE_INSTRUCTIONS,
+        model=get_chat_model(),
+        model_settings=ModelSettings(temperature=0, max_tokens=80),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_summary_agent(max_tokens):
+    return Agent(
+        name="Conversation summarizer",
+        instructions=SUMMARY_INSTRUCTIONS.format(words=max(10, max_tokens * 3 // 4)),
+        model=get_chat_model(),
+        model_settings=ModelSettings(temperature=0, max_tokens=max_tokens),
+    )
+
+
+async def _complete(agent, prompt):
+    result = await Runner.run(agent, input=prompt, hooks=TracingHooks())
+    record_usage(result.context_wrapper.usage)
+    return (result.final_output or "").strip()
+
+
+async def rewrite_query(transcript, message):
+    """A standalone version of message, given the conversation transcript before it"""
+    with span("query_rewrite"):
+        return await _complete(get_rewrite_agent(), f"Conversation:\n{transcript}\n\nLatest message: {message}")
+
+
+async def summarize_history(summary, turns, max_tokens):
+    """The running summary extended with turns ([{"role", "content"}] dicts)"""
+    new_turns = "\n".join(f"{turn['role'].capitalize()}: {turn['content']}" for turn in turns)
+    with span("summarize"):
+        return await _complete(get_summary_agent(max_tokens),
+                               f"Existing summary: {summary or '(none)'}\n\nNew turns:\n{new_turns}")
+
+
+def build_direct_input(message, passages):
+    excerpts = "\n\n".join(passage.cited(i) for i, passage in enumerate(passages, start=1))
+    return f"Textbook excerpts:\n{excerpts}\n\nQuestion: {message}"
+
+
+async def prepare_run(message, context, embedding=None):
+    """
+    Return the (agent, input) pair for RAG_MODE. In direct mode the passages
+    are retrieved here (reusing the cache-lookup embedding when available)
+    and recorded on the context before the single completion call.
+
+    For a follow-up, message is the standalone (rewritten) question. The
+    conversation itself is not sent: the answer is cached and shared by
+    (scope, question), so it must not depend on whose session asked.
+    """
+    if get_settings().rag_mode == "direct":
+        points = await search_passages(message, embedding=embedding, query_filter=context.query_filter)
+        passages = packer.pack(points)
+        context.add_sources(passages)
+        agent, run_input = get_direct_agent(), build_direct_input(message, passages)
+    else:
+        agent, run_input = get_agent(), message
+    return agent, run_input
@@ -0,0 +1,127 @@
+"""
+Batch question answering for /chat/batch and batch_chat.py.
+
+All questions of a batch are retrieved together: their query embeddings in
+batched Cohere calls (cache misses only) and their searches in one Qdrant
+query_batch_points request. Answers are then generated with the direct
+(tool-less) agent, at most `concurrency` at a time, and yielded as they
+complete, so the caller can stream them back. BatchReport totals the run.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from agents import Runner
+from qdrant_client.models import Filter
+
+from rag_core.assistant import build_direct_input, get_direct_agent
+from rag_core.metrics import TracingHooks, record_usage
+from rag_core.retrieval import ChatContext, packer, search_passages_batch
+from rag_core.settings import get_settings
+
+
+@dataclass
+class BatchQuestion:
+    index: int
+    id: str
+    message: str
+    query_filter: Optional[Filter] = None
+    embedding: Optional[list] = None
+
+
+class BatchReport:
+    """Counts and throughput of one batch run"""
+
+    def __init__(self, questions):
+        self.questions = questions
+        self.answered = 0
+        self.failed = 0
+        self.cached = 0
+        self.tokens = {"input": 0, "output": 0}
+        self._started = time.perf_counter()
+
+    def add(self, result):
+        if result.get("error"):
+            self.failed += 1
+        else:
+            self.answered += 1
+        if (result.get("cache") or "").startswith("HIT"):
+            self.cached += 1
+        for kind in self.tokens:
+            self.tokens[kind] += result.get("tokens", {}).get(kind, 0)
+
+    def summary(self):
+        seconds = time.perf_counter() - self._started
+        return {
+            "questions": self.questions,
+            "answered": self.answered,
+            "failed": self.failed,
+            "cached": self.cached,
+            "seconds": round(seconds, 3),
+            "questions_per_second": round((self.answered + self.failed) / seconds, 2) if seconds else 0.0,
+            "tokens": self.tokens,
+        }
+
+
+def batch_result(question, response="", error=None, **fields):
+    return {"index": question.index, "id": question.id, "response": response, "error": error, **fields}
+
+
+async def answer_batch(questions, concurrency=None, acquire=None, format_error=str):
+    """
+    Answer BatchQuestions; yields one result dict per question in completion
+    order, at most `concurrency` (default BATCH_CONCURRENCY) at a time.
+    acquire(), when given, is awaited for a slot (with release())
+    before each generation; format_error turns exceptions into error strings.
+    """
+    concurrency = concurrency or get_settings().batch_concurrency
+    try:
+        passages = await search_passages_batch(
+            [question.message for question in questions],
+            embeddings=[question.embedding for question in questions]
+            if all(question.embedding is not None for question in questions) else None,
+            query_filters=[question.query_filter for question in questions],
+        )
+    except Exception as e:
+        error = format_error(e)
+        for question in questions:
+            yield batch_result(question, error=error)
+        return
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(question, points):
+        async with semaphore:
+            slot = await acquire() if acquire is not None else None
+            started = time.perf_counter()
+            try:
+                context = ChatContext()
+                passages = packer.pack(points)
+                context.add_sources(passages)
+                result = await Runner.run(get_direct_agent(), input=build_direct_input(question.message, passages),
+                                          context=context, hooks=TracingHooks())
+                usage = result.context_wrapper.usage
+                record_usage(usage)
+                return batch_result(
+                    question,
+                    response=result.final_output or "",
+                    cache="MISS",
+                    sources=list(dict.fromkeys(source["url"] for source in context.sources)),
+                    seconds=round(time.perf_counter() - started, 3),
+                    tokens={"input": usage.input_tokens, "output": usage.output_tokens},
+                )
+            except Exception as e:
+                return batch_result(question, error=format_error(e))
+            finally:
+                if slot is not None:
+                    slot.release()
+
+    tasks = [asyncio.ensure_future(answer(question, points)) for question, points in zip(questions, passages)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The consumer stopped early (e.g. the client disconnected)
+        for task in tasks:
+            task.cancel()
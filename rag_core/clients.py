@@ -0,0 +1,160 @@
+"""
+Lazily created, process-wide clients for Cohere, Qdrant and OpenAI.
+
+Nothing connects at import time: each client is built on first use with a
+pooled HTTP connection limit from Settings, and warm_up() opens the
+connections in parallel during API startup. override_client() swaps in a
+stand-in (local Qdrant, fake embedder) for benchmarks.
+
+Every client sends its requests through the service's rate limit, retry and
+circuit breaker policy (rag_core.resilience); the SDK retries are disabled.
+"""
+import asyncio
+import threading
+import time
+
+import httpx
+
+from rag_core.resilience import AsyncResilientTransport, ResilientTransport, get_upstream, httpx2
+from rag_core.settings import get_settings
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _get(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def override_client(name, client):
+    """Use client for name ("cohere", "async_cohere", "qdrant", "async_qdrant", "openai")"""
+    with _lock:
+        _clients[name] = client
+
+
+def reset_clients():
+    with _lock:
+        _clients.clear()
+
+
+def _limits(settings, http=httpx):
+    return http.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_connections,
+    )
+
+
+def _transport(service, settings):
+    return ResilientTransport(get_upstream(service), httpx.HTTPTransport(limits=_limits(settings)))
+
+
+def _async_transport(service, settings, http=httpx):
+    return AsyncResilientTransport(get_upstream(service), http.AsyncHTTPTransport(limits=_limits(settings, http)))
+
+
+def get_cohere_client():
+    def create():
+        import cohere
+        settings = get_settings()
+        return cohere.Client(
+            settings.cohere_api_key,
+            max_retries=0,
+            httpx_client=httpx.Client(transport=_transport("cohere", settings), timeout=settings.http_timeout),
+        )
+    return _get("cohere", create)
+
+
+def get_async_cohere_client():
+    def create():
+        import cohere
+        settings = get_settings()
+        return cohere.AsyncClient(
+            settings.cohere_api_key,
+            max_retries=0,
+            httpx_client=httpx.AsyncClient(transport=_async_transport("cohere", settings),
+                                           timeout=settings.http_timeout),
+        )
+    return _get("async_cohere", create)
+
+
+def get_qdrant_client():
+    def create():
+        from qdrant_client import QdrantClient
+        settings = get_settings()
+        return QdrantClient(
+            url=settings.qdrant_url,
+            api_key=settings.qdrant_api_key,
+            timeout=int(settings.http_timeout),
+            transport=_transport("qdrant", settings),
+        )
+    return _get("qdrant", create)
+
+
+def get_async_qdrant_client():
+    def create():
+        from qdrant_client import AsyncQdrantClient
+        settings = get_settings()
+        return AsyncQdrantClient(
+            url=settings.qdrant_url,
+            api_key=settings.qdrant_api_key,
+            timeout=int(settings.http_timeout),
+            transport=_async_transport("qdrant", settings),
+        )
+    return _get("async_qdrant", create)
+
+
+def get_openai_client():
+    def create():
+        from agents import AsyncOpenAI
+        from openai import DefaultAsyncHttpxClient
+        settings = get_settings()
+        # openai>=3 is built on httpx2 (a fork of httpx) and needs its transports
+        http = httpx2 if httpx2 is not None and issubclass(DefaultAsyncHttpxClient, httpx2.AsyncClient) else httpx
+        if not settings.openai_api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables.")
+        return AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(transport=_async_transport("openai", settings, http),
+                                                timeout=settings.http_timeout),
+        )
+    return _get("openai", create)
+
+
+async def warm_up():
+    """
+    Create the async clients and open their connections concurrently.
+    Returns {service: seconds or error string}; failures are reported, never raised,
+    so an unreachable service does not stop the API from booting.
+    """
+    settings = get_settings()
+
+    async def timed(name, check):
+        start = time.perf_counter()
+        try:
+            await check()
+            return name, round(time.perf_counter() - start, 3)
+        except Exception as e:
+            return name, f"error: {str(e)[:200]}"
+
+    async def qdrant():
+        await get_async_qdrant_client().collection_exists(settings.collection_name)
+
+    async def cohere():
+        await get_async_cohere_client().check_api_key()
+
+    async def openai():
+        await get_openai_client().models.retrieve(settings.openai_model)
+
+    results = await asyncio.gather(
+        timed("qdrant", qdrant),
+        timed("cohere", cohere),
+        timed("openai", openai),
+    )
+    return dict(results)
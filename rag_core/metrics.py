@@ -0,0 +1,161 @@
+"""
+Prometheus metrics and per-request stage timing for the chat pipeline.
+
+span(stage) times one stage (intent, cache_lookup, admission, query_rewrite,
+embedding, qdrant_query, rerank, llm_call, tool_call, summarize) into the
+rag_stage_duration_seconds histogram and, when a request trace is active,
+into that request's trace. A trace covers one /chat, /chat/stream or
+/chat/batch request: it tracks the in-flight gauge, the request duration by
+route (general, cache_exact, cache_semantic, rag, coalesced, shed, batch,
+error) and token usage, and is printed as one JSON line when it finishes
+(TRACE_LOG=false turns the line off; the metrics are always collected).
+"""
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from agents import RunHooks
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+from rag_core.settings import get_settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+
+REQUESTS = Counter("rag_requests_total", "Chat requests by endpoint and how they were answered",
+                   ["endpoint", "route"])
+REQUEST_DURATION = Histogram("rag_request_duration_seconds", "End-to-end chat request latency",
+                             ["endpoint", "route"], buckets=LATENCY_BUCKETS)
+STAGE_DURATION = Histogram("rag_stage_duration_seconds", "Latency of each chat pipeline stage",
+                           ["stage"], buckets=LATENCY_BUCKETS)
+IN_FLIGHT = Gauge("rag_requests_in_flight", "Chat requests currently being served", ["endpoint"])
+LLM_CALLS = Counter("rag_llm_calls_total", "Model calls made by agent runs")
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Model tokens used by agent runs", ["kind"])
+
+_current_trace = ContextVar("rag_request_trace", default=None)
+
+
+class RequestTrace:
+    """Stage timings and token usage of one chat request"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.route = "rag"
+        self.stages = {}
+        self.tokens = {"input": 0, "output": 0}
+        self._started = time.perf_counter()
+        self._finished = False
+        IN_FLIGHT.labels(endpoint).inc()
+
+    def activate(self):
+        """Make this the trace that span() records into for the current task"""
+        _current_trace.set(self)
+        return self
+
+    def record(self, stage, seconds):
+        self.stages.setdefault(stage, []).append(round(seconds * 1000, 2))
+
+    def add_usage(self, usage):
+        """Count the token usage of a finished agent run (result.context_wrapper.usage)"""
+        LLM_TOKENS.labels("input").inc(usage.input_tokens)
+        LLM_TOKENS.labels("output").inc(usage.output_tokens)
+        self.tokens["input"] += usage.input_tokens
+        self.tokens["output"] += usage.output_tokens
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        total = time.perf_counter() - self._started
+        IN_FLIGHT.labels(self.endpoint).dec()
+        REQUESTS.labels(self.endpoint, self.route).inc()
+        REQUEST_DURATION.labels(self.endpoint, self.route).observe(total)
+        if get_settings().trace_log:
+            print("[TRACE] " + json.dumps({
+                "endpoint": self.endpoint,
+                "route": self.route,
+                "total_ms": round(total * 1000, 2),
+                "stages_ms": self.stages,
+                "tokens": self.tokens,
+            }))
+
+
+def record_usage(usage):
+    """Count the token usage of an auxiliary agent run (e.g. a query rewrite) into the active trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_usage(usage)
+    else:
+        LLM_TOKENS.labels("input").inc(usage.input_tokens)
+        LLM_TOKENS.labels("output").inc(usage.output_tokens)
+
+
+@contextmanager
+def request_trace(endpoint):
+    trace = RequestTrace(endpoint).activate()
+    try:
+        yield trace
+    except Exception:
+        trace.route = "error"
+        raise
+    finally:
+        trace.finish()
+
+
+def observe_stage(stage, seconds):
+    STAGE_DURATION.labels(stage).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(stage, seconds)
+
+
+@contextmanager
+def span(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+class TracingHooks(RunHooks):
+    """Agent run hooks timing every model call and tool call (one instance per run)"""
+
+    def __init__(self):
+        self._llm_started = None
+        self._tool_started = {}
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items):
+        self._llm_started = time.perf_counter()
+
+    async def on_llm_end(self, context, agent, response):
+        LLM_CALLS.inc()
+        if self._llm_started is not None:
+            observe_stage("llm_call", time.perf_counter() - self._llm_started)
+            self._llm_started = None
+
+    async def on_tool_start(self, context, agent, tool):
+        self._tool_started[tool.name] = time.perf_counter()
+
+    async def on_tool_end(self, context, agent, tool, result):
+        started = self._tool_started.pop(tool.name, None)
+        if started is not None:
+            observe_stage("tool_call", time.perf_counter() - started)
+
+
+class StatsCollector:
+    """Exposes the numeric fields of a stats() dict as rag_<name>_<field> gauges"""
+
+    def __init__(self, name, stats_fn):
+        self.name = name
+        self.stats_fn = stats_fn
+
+    def collect(self):
+        for key, value in self.stats_fn().items():
+            if isinstance(value, (bool, int, float)):
+                yield GaugeMetricFamily(f"rag_{self.name}_{key}", f"{self.name} {key}", value=float(value))
+
+
+def register_stats(name, stats_fn):
+    REGISTRY.register(StatsCollector(name, stats_fn))
@@ -0,0 +1,332 @@
+"""
+Rate limiting, retries and circuit breaking for calls to Cohere, Qdrant and OpenAI.
+
+rag_core.clients builds every SDK client on a ResilientTransport (or the
+async variant), so each HTTP request to a service goes through that
+service's Upstream policy:
+- an adaptive token bucket sized to the plan (<SERVICE>_REQUESTS_PER_MINUTE,
+  0 = unlimited): a 429 halves the request rate, every success wins back a
+  twentieth of it, so throughput settles just under the provider's ceiling;
+- retries of 429, 5xx, timeouts and connection errors with full-jitter
+  exponential backoff, never sooner than the response's Retry-After (a
+  Retry-After longer than UPSTREAM_MAX_RETRY_AFTER is returned as is);
+- a circuit breaker: after CIRCUIT_FAILURE_THRESHOLD consecutive 5xx or
+  connection failures, requests fail fast with CircuitOpenError for
+  CIRCUIT_RESET_SECONDS, then a single trial request decides whether it closes.
+
+The SDKs' own retries are turned off, so a request is retried in one place.
+"""
+import asyncio
+import email.utils
+import random
+import threading
+import time
+
+import httpx
+
+from rag_core.settings import get_settings
+
+try:
+    import httpx2  # openai>=3 sends its requests with this fork of httpx
+    TRANSPORT_ERRORS = (httpx.TransportError, httpx2.TransportError)
+except ImportError:
+    httpx2 = None
+    TRANSPORT_ERRORS = (httpx.TransportError,)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+SERVICES = ("cohere", "qdrant", "openai")
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of calling a service whose circuit breaker is open"""
+
+    def __init__(self, service, retry_in):
+        super().__init__(f"{service} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.service = service
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """
+    Requests-per-minute limiter shared by threads and event loops: reserve()
+    takes a token (possibly one that only exists in the future) and returns
+    how long the caller must wait before sending.
+    """
+
+    def __init__(self, per_minute, burst=None):
+        self.max_rate = per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = burst or max(1.0, self.max_rate)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.max_rate / 10, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    @property
+    def per_minute(self):
+        return self.rate * 60
+
+
+class CircuitBreaker:
+    def __init__(self, service, failure_threshold, reset_seconds):
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.opens = 0
+        self._trial_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        if self.opened_at is None:
+            return
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            retry_in = self.opened_at + self.reset_seconds - now
+            # Half open: one trial request at a time (a lost trial expires after reset_seconds)
+            trial_pending = self._trial_at is not None and now - self._trial_at < self.reset_seconds
+            if retry_in > 0 or trial_pending:
+                raise CircuitOpenError(self.service, max(retry_in, 0.0))
+            self._trial_at = now
+
+    def succeeded(self):
+        if self.failures or self.opened_at is not None:
+            with self._lock:
+                if self.opened_at is not None:
+                    print(f"[CIRCUIT] {self.service} recovered; circuit closed")
+                self.failures, self.opened_at, self._trial_at = 0, None, None
+
+    def failed(self):
+        if not self.failure_threshold:
+            return
+        with self._lock:
+            self.failures += 1
+            if self._trial_at is not None or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.opens += 1
+                print(f"[CIRCUIT] {self.service} failing ({self.failures} consecutive errors); "
+                      f"failing fast for {self.reset_seconds:.0f}s")
+            self._trial_at = None
+
+
+def retry_after_seconds(headers):
+    """Seconds from a retry-after-ms / Retry-After (seconds or HTTP date) header, or None"""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Upstream:
+    """Rate limit, retry and circuit breaker policy of one service"""
+
+    def __init__(self, service, per_minute=0, max_retries=4, backoff_base=0.5, backoff_max=20.0,
+                 max_retry_after=60.0, failure_threshold=5, reset_seconds=30.0):
+        self.service = service
+        self.bucket = TokenBucket(per_minute) if per_minute > 0 else None
+        self.breaker = CircuitBreaker(service, failure_threshold, reset_seconds)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+
+    def before_request(self):
+        """Seconds to wait before sending (raises CircuitOpenError when failing fast)"""
+        self.breaker.check()
+        self.requests += 1
+        return self.bucket.reserve() if self.bucket else 0.0
+
+    def after_response(self, response, attempt):
+        """Seconds to wait before retrying the request, or None to return the response"""
+        status = response.status_code
+        if status == 429:
+            # Throttled, but the service is up
+            self.throttled += 1
+            self.breaker.succeeded()
+            if self.bucket:
+                self.bucket.throttled()
+        elif status in RETRY_STATUSES:
+            self.failures += 1
+            self.breaker.failed()
+        else:
+            self.breaker.succeeded()
+            if self.bucket:
+                self.bucket.succeeded()
+            return None
+        return self._retry_delay(attempt, retry_after_seconds(response.headers))
+
+    def after_error(self, error, attempt):
+        """Seconds to wait before retrying after a connection error/timeout, or None to raise"""
+        if isinstance(error, CircuitOpenError):
+            return None
+        self.failures += 1
+        self.breaker.failed()
+        return self._retry_delay(attempt, None)
+
+    def _retry_delay(self, attempt, retry_after):
+        if attempt >= self.max_retries:
+            return None
+        if retry_after is not None and retry_after > self.max_retry_after:
+            return None
+        self.retries += 1
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "failures": self.failures,
+            "rate_per_minute": round(self.bucket.per_minute, 1) if self.bucket else 0,
+            "circuit_open": self.breaker.state != "closed",
+            "circuit_opens": self.breaker.opens,
+        }
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """httpx (or httpx2) transport applying an Upstream policy around another transport"""
+
+    def __init__(self, upstream, transport):
+        self.upstream = upstream
+        self.transport = transport
+
+    def handle_request(self, request):
+        attempt = 0
+        while True:
+            wait = self.upstream.before_request()
+            if wait:
+                time.sleep(wait)
+            try:
+                response = self.transport.handle_request(request)
+            except TRANSPORT_ERRORS as e:
+                delay = self.upstream.after_error(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                delay = self.upstream.after_response(response, attempt)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncResilientTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of ResilientTransport"""
+
+    def __init__(self, upstream, transport):
+        self.upstream = upstream
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        attempt = 0
+        while True:
+            wait = self.upstream.before_request()
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except TRANSPORT_ERRORS as e:
+                delay = self.upstream.after_error(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                delay = self.upstream.after_response(response, attempt)
+                if delay is None:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+_upstreams = {}
+_lock = threading.Lock()
+
+
+def get_upstream(service):
+    """The process-wide policy for "cohere", "qdrant" or "openai" (shared by sync and async clients)"""
+    upstream = _upstreams.get(service)
+    if upstream is None:
+        with _lock:
+            upstream = _upstreams.get(service)
+            if upstream is None:
+                settings = get_settings()
+                upstream = _upstreams[service] = Upstream(
+                    service,
+                    per_minute=settings.requests_per_minute[service],
+                    max_retries=settings.upstream_max_retries,
+                    backoff_base=settings.upstream_backoff_base,
+                    backoff_max=settings.upstream_backoff_max,
+                    max_retry_after=settings.upstream_max_retry_after,
+                    failure_threshold=settings.circuit_failure_threshold,
+                    reset_seconds=settings.circuit_reset_seconds,
+                )
+    return upstream
+
+
+def upstream_error(error):
+    """
+    The CircuitOpenError or HTTP status error behind an SDK exception
+    (SDKs wrap transport errors), as (circuit_open_error, status_code).
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, CircuitOpenError):
+            return error, None
+        status = getattr(error, "status_code", None)
+        if isinstance(status, int):
+            return None, status
+        error = getattr(error, "source", None) or error.__cause__ or error.__context__
+    return None, None
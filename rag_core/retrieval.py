@@ -0,0 +1,193 @@
+"""
+Query-side retrieval shared by the API, agent.py and the test scripts:
+cached query embeddings, hybrid Qdrant search with reranking, context
+packing, and the `retrieve` tool given to the agent.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional
+
+from agents import RunContextWrapper, function_tool
+from qdrant_client.models import Prefetch, FusionQuery, Fusion, Filter, FieldCondition, MatchValue, QueryRequest
+
+from context_packing import ContextPacker
+from embedding_cache import get_embedding_cache
+from rag_core.clients import get_async_cohere_client, get_async_qdrant_client
+from rag_core.metrics import span
+from rag_core.settings import COHERE_MAX_BATCH, get_settings
+from rag_core.singleflight import SingleFlight
+from rag_core.vectors import embed_request_options, response_embeddings, search_params
+from rerank import Reranker
+from sparse import SPARSE_VECTOR_NAME, query_sparse_vector
+
+# Concurrency limits per upstream service (EMBED_CONCURRENCY, QDRANT_CONCURRENCY)
+embed_semaphore = asyncio.Semaphore(get_settings().embed_concurrency)
+qdrant_semaphore = asyncio.Semaphore(get_settings().qdrant_concurrency)
+
+# Over-fetch RERANK_CANDIDATES and keep the RERANK_TOP_N best; packer applies the token budget
+reranker = Reranker()
+
+# Merges adjacent chunks, drops near-duplicates and trims to CONTEXT_TOKEN_BUDGET
+packer = ContextPacker()
+
+# Identical query texts embedded concurrently share one cache lookup / Cohere call
+embedding_flights = SingleFlight("embedding")
+
+
+async def embed_queries(texts):
+    """Embed query texts with Cohere, bypassing the cache (one request per 96 texts)"""
+    settings = get_settings()
+
+    async def embed(batch):
+        async with embed_semaphore:
+            response = await get_async_cohere_client().embed(
+                model=settings.embed_model,
+                input_type="search_query",  # Use search_query for queries
+                texts=batch,
+                **embed_request_options(settings),
+            )
+        return response_embeddings(response, settings)
+
+    batches = [texts[i:i + COHERE_MAX_BATCH] for i in range(0, len(texts), COHERE_MAX_BATCH)]
+    results = await asyncio.gather(*(embed(batch) for batch in batches))
+    return [vector for result in results for vector in result]
+
+
+async def get_embedding(text):
+    """Get embedding vector from Cohere Embed v3 (served from the shared embedding cache when possible)"""
+    settings = get_settings()
+    model_name = settings.embed_model
+
+    async def embed_cached():
+        vectors = await get_embedding_cache().aembed(
+            [text], model_name, "search_query", embed_queries, embedding_type=settings.embed_type,
+        )
+        return vectors[0]
+
+    with span("embedding"):
+        vector, _ = await embedding_flights.do((model_name, settings.embed_type, text), embed_cached)
+    return vector
+
+
+async def get_embeddings(texts):
+    """Embeddings of many queries: cache hits first, then all misses in batched Cohere calls"""
+    settings = get_settings()
+    with span("embedding"):
+        return await get_embedding_cache().aembed(
+            texts, settings.embed_model, "search_query", embed_queries, embedding_type=settings.embed_type,
+        )
+
+
+def scope_filter(book_id=None, section=None):
+    """Qdrant filter on the keyword-indexed book_id/section payload fields (None when unscoped)"""
+    conditions = [
+        FieldCondition(key=key, match=MatchValue(value=value))
+        for key, value in (("book_id", book_id), ("section", section))
+        if value
+    ]
+    return Filter(must=conditions) if conditions else None
+
+
+@dataclass
+class ChatContext:
+    """Per-request state shared with the agent's tools"""
+    sources: list = field(default_factory=list)
+    # Restricts retrieval to one book/section (see scope_filter)
+    query_filter: Optional[Filter] = None
+
+    def add_sources(self, passages):
+        """Record packed passages (context_packing.Passage) as the answer's sources"""
+        self.sources.extend(
+            {
+                "url": passage.url,
+                "book_id": passage.book_id,
+                "heading": passage.heading,
+                "text": passage.text,
+            }
+            for passage in passages
+        )
+
+
+def query_request(query, embedding, query_filter=None, limit=None):
+    """
+    The Qdrant query for one question: dense, or (HYBRID_SEARCH) dense + BM25
+    sparse candidates fused with RRF in one request
+    """
+    settings = get_settings()
+    limit = limit or settings.rerank_top_n
+    sparse_query = query_sparse_vector(query) if settings.hybrid_search else None
+    if reranker.enabled:
+        limit = max(limit, settings.rerank_candidates)
+    prefetch_limit = max(limit, settings.hybrid_prefetch_limit)
+    dense_params = search_params(settings)
+    if sparse_query is None:
+        return QueryRequest(query=embedding, filter=query_filter, params=dense_params, limit=limit,
+                            with_payload=True)
+    return QueryRequest(
+        prefetch=[
+            Prefetch(query=embedding, filter=query_filter, params=dense_params, limit=prefetch_limit),
+            Prefetch(query=sparse_query, using=SPARSE_VECTOR_NAME, filter=query_filter,
+                     limit=prefetch_limit),
+        ],
+        query=FusionQuery(fusion=Fusion.RRF),
+        limit=limit,
+        with_payload=True,
+    )
+
+
+async def search_passages(query, embedding=None, limit=None, query_filter=None):
+    """
+    Embed the query (unless an embedding is given) and return the best `limit`
+    (default RERANK_TOP_N) Qdrant points, optionally restricted by query_filter.
+    """
+    limit = limit or get_settings().rerank_top_n
+    if embedding is None:
+        embedding = await get_embedding(query)
+    request = query_request(query, embedding, query_filter, limit)
+    qdrant_client = get_async_qdrant_client()
+    async with qdrant_semaphore:
+        with span("qdrant_query"):
+            result = await qdrant_client.query_points(
+                collection_name=get_settings().collection_name,
+                query=request.query,
+                prefetch=request.prefetch,
+                query_filter=request.filter,
+                search_params=request.params,
+                limit=request.limit,
+            )
+    with span("rerank"):
+        return reranker.select(query, result.points, top_n=limit)
+
+
+async def search_passages_batch(queries, embeddings=None, query_filters=None, limit=None):
+    """
+    search_passages() for many queries: the missing embeddings in batched
+    Cohere calls and every search in one Qdrant query_batch_points request.
+    Returns one list of points per query.
+    """
+    if not queries:
+        return []
+    limit = limit or get_settings().rerank_top_n
+    if embeddings is None:
+        embeddings = await get_embeddings(queries)
+    query_filters = query_filters or [None] * len(queries)
+    requests = [query_request(query, embedding, query_filter, limit)
+                for query, embedding, query_filter in zip(queries, embeddings, query_filters)]
+    qdrant_client = get_async_qdrant_client()
+    async with qdrant_semaphore:
+        with span("qdrant_query"):
+            results = await qdrant_client.query_batch_points(
+                collection_name=get_settings().collection_name, requests=requests,
+            )
+    with span("rerank"):
+        return [reranker.select(query, result.points, top_n=limit) for query, result in zip(queries, results)]
+
+
+@function_tool
+async def retrieve(ctx: RunContextWrapper[ChatContext], query: str) -> list[str]:
+    context = ctx.context if isinstance(ctx.context, ChatContext) else None
+    points = await search_passages(query, query_filter=context.query_filter if context else None)
+    passages = packer.pack(points)
+    if context is not None:
+        context.add_sources(passages)
+    return [passage.cited(i) for i, passage in enumerate(passages, start=1)]
@@ -0,0 +1,317 @@
+"""
+Server-side conversation sessions for multi-turn chat.
+
+A session keeps a rolling summary of the older conversation plus the most
+recent turns verbatim. The verbatim turns are bounded to
+SESSION_HISTORY_TOKENS: when an answer pushes them over the budget, the
+oldest turns are folded into the summary (one short LLM call, capped at
+SESSION_SUMMARY_TOKENS), so the history the query rewrite reads stays the
+same size however long the conversation runs. The history only feeds that
+rewrite: answers are generated for the standalone question, since they are
+cached and shared across sessions.
+
+Sessions live in memory (SESSION_STORE=memory, least recently used evicted
+beyond SESSION_MAX_ENTRIES) or in a SQLite file (SESSION_STORE=sqlite,
+SESSION_DB_PATH) that survives restarts and is shared by workers on one
+host. Either way a session expires SESSION_TTL seconds after its last turn.
+Store calls block (SQLite may wait on another worker's lock), so the
+SessionManager runs them in a worker thread, and every write is an atomic
+update() of the stored session, so concurrent requests of one session do
+not overwrite each other's turns.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from rag_core.assistant import rewrite_query, summarize_history
+from rag_core.settings import get_settings
+from tokens import count_tokens
+
+# Turns always kept verbatim, so a follow-up can refer to the last exchange
+MIN_RECENT_TURNS = 2
+
+
+@dataclass
+class Session:
+    session_id: str
+    summary: str = ""
+    turns: list = field(default_factory=list)  # [{"role": "user" | "assistant", "content": str}]
+    updated_at: float = 0.0
+
+    @classmethod
+    def new(cls):
+        return cls(session_id=uuid.uuid4().hex)
+
+    @property
+    def has_history(self):
+        return bool(self.summary or self.turns)
+
+    def add_turn(self, question, answer):
+        self.turns.append({"role": "user", "content": question})
+        self.turns.append({"role": "assistant", "content": answer})
+
+    def history_tokens(self):
+        return sum(count_tokens(turn["content"]) for turn in self.turns)
+
+    def transcript(self):
+        """The history as plain text, for the query-rewrite and summary prompts"""
+        lines = [f"Earlier conversation (summary): {self.summary}"] if self.summary else []
+        lines.extend(f"{turn['role'].capitalize()}: {turn['content']}" for turn in self.turns)
+        return "\n".join(lines)
+
+    def to_json(self):
+        return json.dumps({"summary": self.summary, "turns": self.turns})
+
+    @classmethod
+    def from_json(cls, session_id, data, updated_at):
+        data = json.loads(data)
+        return cls(session_id, data.get("summary", ""), data.get("turns", []), updated_at)
+
+
+class MemorySessionStore:
+    """Thread-safe TTL + LRU session store held in process memory"""
+
+    def __init__(self, ttl=None, max_entries=None):
+        settings = get_settings()
+        self.ttl = settings.session_ttl if ttl is None else ttl
+        self.max_entries = max_entries or settings.session_max_entries
+        self.evictions = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session.updated_at > self.ttl:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def update(self, session_id, change):
+        """
+        Apply change(session) to the stored session (a new one if none) and
+        save it, unless change returns False; returns the session
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or time.time() - session.updated_at > self.ttl:
+                session = Session(session_id)
+            if change(session) is not False:
+                session.updated_at = time.time()
+                self._sessions[session_id] = session
+                self._sessions.move_to_end(session_id)
+                while len(self._sessions) > self.max_entries:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+        return session
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """Session store in a local SQLite file; expired rows are purged as sessions are saved"""
+
+    PURGE_EVERY = 100
+
+    def __init__(self, path=None, ttl=None):
+        settings = get_settings()
+        path = path or settings.session_db_path
+        self.path = path
+        self.ttl = settings.session_ttl if ttl is None else ttl
+        self.evictions = 0
+        self._saves = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions(updated_at)")
+        self._conn.commit()
+
+    def get(self, session_id):
+        with self._lock:
+            return self._read(session_id)
+
+    def update(self, session_id, change):
+        """
+        Apply change(session) to the stored session (a new one if none) and
+        save it, unless change returns False, in one write transaction so
+        other workers' writes to the session in between are not lost; returns
+        the session
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                session = self._read(session_id) or Session(session_id)
+                if change(session) is not False:
+                    self._write(session)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return session
+
+    def _read(self, session_id):
+        row = self._conn.execute(
+            "SELECT data, updated_at FROM sessions WHERE session_id = ? AND updated_at >= ?",
+            (session_id, time.time() - self.ttl),
+        ).fetchone()
+        return Session.from_json(session_id, *row) if row else None
+
+    def _write(self, session):
+        session.updated_at = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+            (session.session_id, session.to_json(), session.updated_at),
+        )
+        self._saves += 1
+        if self._saves % self.PURGE_EVERY == 0:
+            purged = self._conn.execute("DELETE FROM sessions WHERE updated_at < ?",
+                                        (time.time() - self.ttl,))
+            self.evictions += purged.rowcount
+
+    def delete(self, session_id):
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+        return deleted.rowcount > 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SessionManager:
+    """
+    Loads and saves sessions for the chat endpoints: remember() stores a turn
+    as soon as it is answered, compact() (run after the response is sent)
+    summarizes whatever no longer fits the history budget. Store calls run
+    in a worker thread.
+    """
+
+    def __init__(self, store, history_tokens=None, summary_tokens=None):
+        settings = get_settings()
+        self.store = store
+        self.history_tokens = settings.session_history_tokens if history_tokens is None else history_tokens
+        self.summary_tokens = summary_tokens or settings.session_summary_tokens
+        self.created = 0
+        self.resumed = 0
+        self.rewrites = 0
+        self.rewrite_failures = 0
+        self.summaries = 0
+        self.summary_failures = 0
+        self._compacting = set()
+
+    async def load(self, session_id=None):
+        """The stored session, or a new (empty) one under session_id or a fresh id"""
+        session = await asyncio.to_thread(self.store.get, session_id) if session_id else None
+        if session is not None:
+            self.resumed += 1
+            return session
+        self.created += 1
+        return Session(session_id) if session_id else Session.new()
+
+    async def standalone_query(self, session, message):
+        """
+        Rewrite a follow-up into a question that makes sense without the
+        conversation, for retrieval and the answer cache. Returns message
+        unchanged for a new session or when the rewrite fails.
+        """
+        if not session.has_history:
+            return message
+        try:
+            query = await rewrite_query(session.transcript(), message)
+        except Exception as e:
+            self.rewrite_failures += 1
+            print(f"[WARNING] Query rewrite failed, retrieving with the raw message: {str(e)[:200]}")
+            return message
+        self.rewrites += 1
+        return query or message
+
+    async def remember(self, session, question, answer):
+        """Append a turn to the stored session; returns True when the history needs compact()"""
+        stored = await asyncio.to_thread(self.store.update, session.session_id,
+                                         lambda current: current.add_turn(question, answer))
+        return bool(self._overflow(stored))
+
+    async def compact(self, session_id):
+        """Fold the oldest turns into the summary until the history fits its budget, and save"""
+        if session_id in self._compacting:
+            return
+        self._compacting.add(session_id)
+        try:
+            session = await asyncio.to_thread(self.store.get, session_id)
+            folded = self._overflow(session) if session is not None else []
+            if not folded:
+                return
+            summary = session.summary
+            try:
+                summary = await summarize_history(session.summary, folded, self.summary_tokens)
+                self.summaries += 1
+            except Exception as e:
+                # The turns are dropped either way, so the history stays bounded
+                self.summary_failures += 1
+                print(f"[WARNING] Could not summarize session history: {str(e)[:200]}")
+
+            def fold(current):
+                # Re-read: turns saved while summarizing are at the end and stay; if
+                # another worker already folded these turns (or the session is gone), leave it
+                if current.turns[:len(folded)] != folded:
+                    return False
+                current.summary = summary
+                del current.turns[:len(folded)]
+
+            await asyncio.to_thread(self.store.update, session_id, fold)
+        finally:
+            self._compacting.discard(session_id)
+
+    def _overflow(self, session):
+        """The oldest turns (whole question/answer pairs) that push the history over budget"""
+        tokens = session.history_tokens()
+        folded = 0
+        while tokens > self.history_tokens and len(session.turns) - folded > MIN_RECENT_TURNS:
+            tokens -= sum(count_tokens(turn["content"]) for turn in session.turns[folded:folded + 2])
+            folded += 2
+        return session.turns[:folded]
+
+    def stats(self):
+        return {
+            "store": type(self.store).__name__,
+            "sessions": len(self.store),
+            "created": self.created,
+            "resumed": self.resumed,
+            "evictions": self.store.evictions,
+            "rewrites": self.rewrites,
+            "rewrite_failures": self.rewrite_failures,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+        }
+
+
+def create_session_store(kind=None):
+    kind = kind or get_settings().session_store
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    if kind != "memory":
+        print(f"[WARNING] Unknown SESSION_STORE {kind!r}; keeping sessions in memory")
+    return MemorySessionStore()
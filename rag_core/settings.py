@@ -0,0 +1,290 @@
+"""
+Typed settings shared by ingestion (main.py) and the API (api_server.py).
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# Cohere accepts at most 96 texts per embed request
+COHERE_MAX_BATCH = 96
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, str(default)))
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+def _env_list(name, default):
+    return tuple(item.strip() for item in os.getenv(name, default).split(",") if item.strip())
+
+
+@dataclass(frozen=True)
+class Book:
+    """One sitemap to ingest; section=None derives the section from each page URL"""
+    book_id: str
+    sitemap_url: str
+    section: Optional[str] = None
+
+
+def parse_books(value, default_sitemap_url, default_book_id):
+    """
+    Parse SITEMAPS: comma-separated "book_id=sitemap_url" or
+    "book_id/section=sitemap_url" entries. Empty means the single
+    SITEMAP_URL tagged with BOOK_ID.
+    """
+    if not value or not value.strip():
+        return (Book(default_book_id, default_sitemap_url),)
+    books = []
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        tag, sep, sitemap_url = entry.partition("=")
+        if not sep or not tag.strip() or not sitemap_url.strip():
+            raise ValueError(f"SITEMAPS entries must look like book_id[/section]=url, got {entry.strip()!r}")
+        book_id, _, section = tag.strip().partition("/")
+        books.append(Book(book_id, sitemap_url.strip(), section or None))
+    return tuple(books)
+
+
+@dataclass(frozen=True)
+class Settings:
+    openai_api_key: Optional[str]
+    openai_model: str
+    cohere_api_key: Optional[str]
+    embed_model: str
+    qdrant_url: Optional[str]
+    qdrant_api_key: Optional[str]
+    collection_name: str
+    sitemap_url: str
+    # Sitemaps ingested into the one collection, each tagged with a book_id
+    books: tuple
+    rag_mode: str
+    # Connection pool size and request timeout for the Cohere/OpenAI/Qdrant clients
+    http_max_connections: int
+    http_timeout: float
+    # Dense vector storage and search (see rag_core.vectors)
+    embed_type: str
+    quantization: str
+    quantization_rescore: bool
+    quantization_oversampling: float
+    vectors_on_disk: bool
+    hnsw_m: int
+    hnsw_ef_construct: int
+    search_hnsw_ef: int
+    # Upstream call policy (see rag_core.resilience): requests/minute per
+    # service (0 = unlimited), retries with backoff and the circuit breaker
+    requests_per_minute: dict
+    upstream_max_retries: int
+    upstream_backoff_base: float
+    upstream_backoff_max: float
+    upstream_max_retry_after: float
+    circuit_failure_threshold: int
+    circuit_reset_seconds: float
+    # Context packing (see context_packing): the one token budget for retrieved passages
+    context_token_budget: int
+    context_min_passage_tokens: int
+    context_dedup_threshold: float
+    # Print one [TRACE] JSON line per chat request (see rag_core.metrics)
+    trace_log: bool
+    # tiktoken encoding used for every token count (see tokens.py)
+    tokenizer_encoding: str
+    # Chunking (see chunking)
+    chunk_max_tokens: int
+    chunk_overlap_tokens: int
+    chunk_min_tokens: int
+    # BM25 sparse vectors (see sparse); the average chunk length in tokens normalizes lengths
+    bm25_k1: float
+    bm25_b: float
+    bm25_avg_doc_len: float
+    # Embedding cache (see embedding_cache); an empty path disables it
+    embed_cache_path: str
+    embed_cache_max_entries: int
+    # Ingestion batches (main.py); embed batches are capped at COHERE_MAX_BATCH
+    embed_batch_size: int
+    upsert_batch_size: int
+    # Crawling (see crawler): 0 extract workers runs trafilatura in the fetch loop,
+    # sitemap_max_depth is the nesting allowed below the configured sitemap
+    fetch_workers: int
+    per_host_concurrency: int
+    fetch_timeout: float
+    extract_workers: int
+    sitemap_max_depth: int
+    # Ingestion checkpoint and dead-letter files; an empty path disables either
+    ingest_checkpoint_path: str
+    dead_letter_path: str
+    # Blue/green collection versions (see collection_versions)
+    qdrant_indexing_threshold: int
+    index_build_timeout: float
+    reindex_min_points_ratio: float
+    keep_collection_versions: int
+    # Agent runs in flight and their per-client fair queue (see rag_core.admission);
+    # trust_proxy_headers identifies clients by the first X-Forwarded-For address
+    chat_concurrency: int
+    chat_queue_size: int
+    chat_queue_per_client: int
+    chat_queue_timeout: float
+    trust_proxy_headers: bool
+    allowed_origins: tuple
+    # Seconds between checks of the collection's index_version (answer cache invalidation)
+    index_version_check_interval: float
+    # Query-side retrieval (see rag_core.retrieval and rerank)
+    embed_concurrency: int
+    qdrant_concurrency: int
+    hybrid_search: bool
+    hybrid_prefetch_limit: int
+    rerank_enabled: bool
+    rerank_candidates: int
+    rerank_top_n: int
+    rerank_latency_budget_ms: float
+    rerank_batch_size: int
+    rerank_cooldown: float
+    # Weight of the retrieval rank relative to the (0..1) lexical score
+    rerank_rank_weight: float
+    # Answer cache (see answer_cache)
+    answer_cache_ttl: float
+    answer_cache_max_entries: int
+    answer_cache_similarity: float
+    # Chat sessions (see rag_core.sessions)
+    session_store: str
+    session_db_path: str
+    session_ttl: float
+    session_max_entries: int
+    session_history_tokens: int
+    session_summary_tokens: int
+    # /chat/batch and batch_chat.py (see rag_core.batch)
+    batch_concurrency: int
+    batch_max_questions: int
+    # Request coalescing (see rag_core.singleflight)
+    single_flight: bool
+    # General-question router (see intent)
+    intent_min_confidence: float
+    # Full agents SDK debug output in agent.py
+    agent_verbose_logging: bool
+
+    @classmethod
+    def from_env(cls):
+        load_dotenv()
+        sitemap_url = os.getenv("SITEMAP_URL", "https://physical-ai-humanoid-robotics-beige.vercel.app/sitemap.xml")
+        return cls(
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            openai_model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            cohere_api_key=os.getenv("COHERE_API_KEY"),
+            embed_model=os.getenv("EMBED_MODEL", "embed-english-v3.0"),
+            qdrant_url=os.getenv("QDRANT_URL"),
+            qdrant_api_key=os.getenv("QDRANT_API_KEY"),
+            collection_name=os.getenv("COLLECTION_NAME", "physical_ai_book"),
+            sitemap_url=sitemap_url,
+            books=parse_books(os.getenv("SITEMAPS"), sitemap_url, os.getenv("BOOK_ID", "physical-ai")),
+            rag_mode=os.getenv("RAG_MODE", "agent").lower(),
+            http_max_connections=_env_int("HTTP_MAX_CONNECTIONS", 100),
+            http_timeout=_env_float("HTTP_TIMEOUT", 60),
+            embed_type=os.getenv("EMBED_TYPE", "float").lower(),
+            quantization=os.getenv("QDRANT_QUANTIZATION", "none").lower(),
+            quantization_rescore=_env_bool("QDRANT_QUANTIZATION_RESCORE", True),
+            quantization_oversampling=_env_float("QDRANT_QUANTIZATION_OVERSAMPLING", 2.0),
+            vectors_on_disk=_env_bool("QDRANT_VECTORS_ON_DISK", False),
+            hnsw_m=_env_int("QDRANT_HNSW_M", 16),
+            hnsw_ef_construct=_env_int("QDRANT_HNSW_EF_CONSTRUCT", 100),
+            # 0 leaves the search-time ef to Qdrant (ef_construct)
+            search_hnsw_ef=_env_int("QDRANT_SEARCH_HNSW_EF", 0),
+            requests_per_minute={
+                "cohere": _env_float("COHERE_REQUESTS_PER_MINUTE", 2000),
+                "openai": _env_float("OPENAI_REQUESTS_PER_MINUTE", 500),
+                "qdrant": _env_float("QDRANT_REQUESTS_PER_MINUTE", 0),
+            },
+            upstream_max_retries=_env_int("UPSTREAM_MAX_RETRIES", 4),
+            upstream_backoff_base=_env_float("UPSTREAM_BACKOFF_BASE", 0.5),
+            upstream_backoff_max=_env_float("UPSTREAM_BACKOFF_MAX", 20),
+            upstream_max_retry_after=_env_float("UPSTREAM_MAX_RETRY_AFTER", 60),
+            # 0 disables the circuit breaker
+            circuit_failure_threshold=_env_int("CIRCUIT_FAILURE_THRESHOLD", 5),
+            circuit_reset_seconds=_env_float("CIRCUIT_RESET_SECONDS", 30),
+            context_token_budget=max(1, _env_int("CONTEXT_TOKEN_BUDGET", 1200)),
+            context_min_passage_tokens=max(1, _env_int("CONTEXT_MIN_PASSAGE_TOKENS", 40)),
+            context_dedup_threshold=_env_float("CONTEXT_DEDUP_THRESHOLD", 0.8),
+            trace_log=_env_bool("TRACE_LOG", True),
+            tokenizer_encoding=os.getenv("TOKENIZER_ENCODING", "cl100k_base"),
+            chunk_max_tokens=max(16, _env_int("CHUNK_MAX_TOKENS", 300)),
+            chunk_overlap_tokens=max(0, _env_int("CHUNK_OVERLAP_TOKENS", 40)),
+            chunk_min_tokens=max(0, _env_int("CHUNK_MIN_TOKENS", 60)),
+            bm25_k1=_env_float("BM25_K1", 1.2),
+            bm25_b=_env_float("BM25_B", 0.75),
+            bm25_avg_doc_len=_env_float("BM25_AVG_DOC_LEN", 180),
+            embed_cache_path=os.getenv("EMBED_CACHE_PATH", ".cache/embeddings.sqlite3"),
+            embed_cache_max_entries=max(1, _env_int("EMBED_CACHE_MAX_ENTRIES", 200000)),
+            embed_batch_size=max(1, min(_env_int("EMBED_BATCH_SIZE", COHERE_MAX_BATCH), COHERE_MAX_BATCH)),
+            upsert_batch_size=max(1, _env_int("UPSERT_BATCH_SIZE", 256)),
+            fetch_workers=max(1, _env_int("FETCH_WORKERS", 16)),
+            per_host_concurrency=max(1, _env_int("PER_HOST_CONCURRENCY", 8)),
+            fetch_timeout=_env_float("FETCH_TIMEOUT", 20),
+            extract_workers=max(0, _env_int("EXTRACT_WORKERS", os.cpu_count() or 1)),
+            sitemap_max_depth=max(0, _env_int("SITEMAP_MAX_DEPTH", 5)),
+            ingest_checkpoint_path=os.getenv("INGEST_CHECKPOINT_PATH", ".cache/ingest_checkpoint.jsonl"),
+            dead_letter_path=os.getenv("DEAD_LETTER_PATH", ".cache/failed_chunks.jsonl"),
+            # Qdrant's default: segments larger than this many KB of vectors get an HNSW index
+            qdrant_indexing_threshold=max(1, _env_int("QDRANT_INDEXING_THRESHOLD", 20000)),
+            index_build_timeout=_env_float("INDEX_BUILD_TIMEOUT", 600),
+            reindex_min_points_ratio=_env_float("REINDEX_MIN_POINTS_RATIO", 0.5),
+            keep_collection_versions=max(0, _env_int("KEEP_COLLECTION_VERSIONS", 1)),
+            chat_concurrency=max(1, _env_int("CHAT_CONCURRENCY", 200)),
+            chat_queue_size=max(0, _env_int("CHAT_QUEUE_SIZE", 500)),
+            chat_queue_per_client=max(1, _env_int("CHAT_QUEUE_PER_CLIENT", 20)),
+            chat_queue_timeout=_env_float("CHAT_QUEUE_TIMEOUT", 15),
+            trust_proxy_headers=_env_bool("TRUST_PROXY_HEADERS", False),
+            allowed_origins=_env_list("ALLOWED_ORIGINS", "https://physical-ai-humanoid-robotics-beige.vercel.app"),
+            index_version_check_interval=_env_float("INDEX_VERSION_CHECK_INTERVAL", 60),
+            embed_concurrency=max(1, _env_int("EMBED_CONCURRENCY", 32)),
+            qdrant_concurrency=max(1, _env_int("QDRANT_CONCURRENCY", 64)),
+            hybrid_search=_env_bool("HYBRID_SEARCH", True),
+            hybrid_prefetch_limit=max(1, _env_int("HYBRID_PREFETCH_LIMIT", 20)),
+            rerank_enabled=_env_bool("RERANK_ENABLED", True),
+            rerank_candidates=max(1, _env_int("RERANK_CANDIDATES", 30)),
+            rerank_top_n=max(1, _env_int("RERANK_TOP_N", 5)),
+            rerank_latency_budget_ms=_env_float("RERANK_LATENCY_BUDGET_MS", 20),
+            rerank_batch_size=max(1, _env_int("RERANK_BATCH_SIZE", 8)),
+            rerank_cooldown=_env_float("RERANK_COOLDOWN", 5),
+            rerank_rank_weight=_env_float("RERANK_RANK_WEIGHT", 0.3),
+            answer_cache_ttl=_env_float("ANSWER_CACHE_TTL", 3600),
+            answer_cache_max_entries=max(0, _env_int("ANSWER_CACHE_MAX_ENTRIES", 1000)),
+            answer_cache_similarity=_env_float("ANSWER_CACHE_SIMILARITY", 0.95),
+            session_store=os.getenv("SESSION_STORE", "memory").lower(),
+            session_db_path=os.getenv("SESSION_DB_PATH", ".cache/sessions.sqlite3"),
+            session_ttl=_env_float("SESSION_TTL", 3600),
+            session_max_entries=max(1, _env_int("SESSION_MAX_ENTRIES", 10000)),
+            session_history_tokens=max(0, _env_int("SESSION_HISTORY_TOKENS", 600)),
+            session_summary_tokens=max(1, _env_int("SESSION_SUMMARY_TOKENS", 200)),
+            batch_concurrency=max(1, _env_int("BATCH_CONCURRENCY", 8)),
+            batch_max_questions=max(1, _env_int("BATCH_MAX_QUESTIONS", 1000)),
+            single_flight=_env_bool("SINGLE_FLIGHT", True),
+            intent_min_confidence=_env_float("INTENT_MIN_CONFIDENCE", 0.5),
+            agent_verbose_logging=_env_bool("AGENT_VERBOSE_LOGGING", False),
+        )
+
+    def validate_for_api(self):
+        """Fail fast on configuration the API cannot run without"""
+        if not self.openai_api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables.")
+        if self.rag_mode not in ("agent", "direct"):
+            raise ValueError(f"RAG_MODE must be 'agent' or 'direct', got {self.rag_mode!r}")
+        self.validate_vectors()
+
+    def validate_vectors(self):
+        if self.embed_type not in ("float", "uint8"):
+            raise ValueError(f"EMBED_TYPE must be 'float' or 'uint8', got {self.embed_type!r}")
+        if self.quantization not in ("none", "scalar", "binary"):
+            raise ValueError(f"QDRANT_QUANTIZATION must be 'none', 'scalar' or 'binary', got {self.quantization!r}")
+
+
+@lru_cache(maxsize=1)
+def get_settings():
+    return Settings.from_env()
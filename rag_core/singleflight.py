@@ -0,0 +1,141 @@
+"""
+In-process request coalescing (single-flight).
+
+Concurrent callers asking for the same key share one upstream call: the
+first caller starts it as a task, later callers await that task instead of
+starting their own. The task is shielded, so a caller that disconnects
+does not cancel the work the others are waiting for. Results are not kept
+once the call finishes; caching is the answer/embedding caches' job.
+
+join_stream() does the same for a stream of events (the /chat/stream agent
+run): the producer runs as a task and every subscriber receives all events,
+including the ones published before it joined. It joins or starts the
+flight without awaiting, so the caller knows whether it leads at the moment
+it decides (e.g. whether it needs an admission slot).
+
+SINGLE_FLIGHT=false turns coalescing off (every caller runs its own call).
+"""
+import asyncio
+
+from rag_core.settings import get_settings
+
+
+class Broadcast:
+    """Events of one shared stream, replayed to every subscriber"""
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def publish(self, event):
+        self.events.append(event)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.closed:
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls; counts upstream calls made and saved"""
+
+    def __init__(self, name, enabled=None):
+        self.name = name
+        self.enabled = get_settings().single_flight if enabled is None else enabled
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _start(self, key, make_task):
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return flight, True
+        self.leaders += 1
+        flight = make_task()
+        self._flights[key] = flight
+        flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        return flight, False
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def in_flight(self, key):
+        """Whether a call for key is running now (a caller would join it)"""
+        return self.enabled and key in self._flights
+
+    async def do(self, key, fn):
+        """
+        Await fn() once for all concurrent callers with the same key.
+        Returns (result, shared); shared is True for callers that joined
+        another caller's call. Exceptions are shared the same way.
+        """
+        if not self.enabled:
+            return await fn(), False
+        flight, shared = self._start(key, lambda: _Flight(asyncio.ensure_future(fn())))
+        return await asyncio.shield(flight.task), shared
+
+    def join_stream(self, key, produce):
+        """
+        Join the stream for key, or start iterating the async generator
+        produce() as a task for all concurrent callers with the same key.
+        Returns (events, shared); events yields (event, shared) pairs.
+        """
+        if not self.enabled:
+            return _with_shared(produce(), False), False
+        flight, shared = self._start(key, lambda: _Flight.streaming(produce))
+        return _with_shared(flight.broadcast.subscribe(), shared), shared
+
+    async def stream(self, key, produce):
+        """Iterate produce() once for all concurrent callers with the same key; yields (event, shared) pairs"""
+        events, _ = self.join_stream(key, produce)
+        async for item in events:
+            yield item
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+async def _with_shared(events, shared):
+    async for event in events:
+        yield event, shared
+
+
+class _Flight:
+    def __init__(self, task, broadcast=None):
+        self.task = task
+        self.broadcast = broadcast
+
+    @classmethod
+    def streaming(cls, produce):
+        broadcast = Broadcast()
+
+        async def pump():
+            try:
+                async for event in produce():
+                    broadcast.publish(event)
+            finally:
+                broadcast.close()
+
+        return cls(asyncio.ensure_future(pump()), broadcast)
@@ -0,0 +1,106 @@
+"""
+Dense vector storage and search options for the Qdrant collection.
+
+Settings choose how the 1024-d Cohere vectors are stored and searched:
+- EMBED_TYPE=uint8 asks Cohere for uint8 embeddings and stores them with
+  Qdrant's uint8 datatype (1 byte per dimension instead of 4).
+- QDRANT_QUANTIZATION=scalar|binary keeps an int8 (4x smaller) or 1-bit
+  (32x smaller) copy of every vector in RAM for the HNSW search, with the
+  top QDRANT_QUANTIZATION_OVERSAMPLING x limit candidates rescored against
+  the original vectors.
+- QDRANT_VECTORS_ON_DISK=true leaves the original vectors on disk (memmap),
+  which is mostly useful together with quantization.
+- QDRANT_HNSW_M / QDRANT_HNSW_EF_CONSTRUCT / QDRANT_SEARCH_HNSW_EF tune the
+  graph and the search-time accuracy/latency trade-off.
+
+benchmarks/quantization.py measures recall, latency and memory for these.
+"""
+from qdrant_client.models import (
+    BinaryQuantization, BinaryQuantizationConfig, Datatype, Disabled, Distance,
+    HnswConfigDiff, QuantizationSearchParams, ScalarQuantization,
+    ScalarQuantizationConfig, ScalarType, SearchParams, VectorParams, VectorParamsDiff,
+)
+
+EMBED_DIMENSION = 1024  # Cohere embed-english-v3.0
+
+
+def dense_vector_params(settings):
+    return VectorParams(
+        size=EMBED_DIMENSION,
+        distance=Distance.COSINE,
+        on_disk=settings.vectors_on_disk,
+        datatype=Datatype.UINT8 if settings.embed_type == "uint8" else None,
+    )
+
+
+def quantization_config(settings):
+    """Quantization for create/update_collection (None means no quantization)"""
+    if settings.quantization == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=0.99, always_ram=True,
+        ))
+    if settings.quantization == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def hnsw_config(settings):
+    return HnswConfigDiff(m=settings.hnsw_m, ef_construct=settings.hnsw_ef_construct)
+
+
+def search_params(settings):
+    """Per-query search parameters for the dense vector (None keeps Qdrant's defaults)"""
+    quantization = None
+    if settings.quantization != "none":
+        quantization = QuantizationSearchParams(
+            rescore=settings.quantization_rescore,
+            oversampling=settings.quantization_oversampling,
+        )
+    if quantization is None and not settings.search_hnsw_ef:
+        return None
+    return SearchParams(hnsw_ef=settings.search_hnsw_ef or None, quantization=quantization)
+
+
+def collection_config_diff(settings, info):
+    """
+    update_collection() keyword arguments that bring an existing collection
+    in line with settings (empty when nothing differs). Quantization, HNSW
+    and on-disk storage can change in place; the vector datatype cannot.
+    """
+    diff = {}
+    if bool(_dense_params(info).on_disk) != settings.vectors_on_disk:
+        diff["vectors_config"] = {"": VectorParamsDiff(on_disk=settings.vectors_on_disk)}
+
+    hnsw = info.config.hnsw_config
+    if hnsw.m != settings.hnsw_m or hnsw.ef_construct != settings.hnsw_ef_construct:
+        diff["hnsw_config"] = hnsw_config(settings)
+
+    wanted = quantization_config(settings)
+    current = info.config.quantization_config
+    if type(wanted) is not type(current):
+        diff["quantization_config"] = wanted if wanted is not None else Disabled.DISABLED
+    return diff
+
+
+def _dense_params(info):
+    params = info.config.params.vectors
+    return params.get("") if isinstance(params, dict) else params
+
+
+def stored_embed_type(info):
+    """The EMBED_TYPE an existing collection was created for"""
+    return "uint8" if _dense_params(info).datatype == Datatype.UINT8 else "float"
+
+
+def embed_request_options(settings):
+    """Extra Cohere embed() arguments for the configured embedding type"""
+    if settings.embed_type == "float":
+        return {}
+    return {"embedding_types": [settings.embed_type]}
+
+
+def response_embeddings(response, settings):
+    """Vectors of the configured type from a Cohere embed() response"""
+    if settings.embed_type == "float":
+        return response.embeddings
+    return getattr(response.embeddings, settings.embed_type)
@@ -0,0 +1,96 @@
+"""
+Reranking of over-fetched Qdrant candidates before they reach the LLM.
+
+Candidates are rescored on CPU with a BM25 lexical-overlap score computed
+over the candidate set itself, blended with their retrieval rank, and only
+the best RERANK_TOP_N passages are kept. The token budget of the context is
+applied afterwards by context_packing, which can merge adjacent chunks first.
+Scoring runs in batches against a latency budget: when a rerank overruns
+it, the remaining work is abandoned and the retrieval order is used, and
+reranking is skipped for RERANK_COOLDOWN seconds so an overloaded
+instance degrades to plain ordering instead of queueing CPU work.
+"""
+import math
+import time
+from collections import Counter
+
+from rag_core.settings import get_settings
+from sparse import tokenize
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class Reranker:
+    """Lexical reranker with a per-call latency budget and overload cooldown"""
+
+    def __init__(self, top_n=None, latency_budget_ms=None, batch_size=None, cooldown=None, enabled=None,
+                 rank_weight=None):
+        settings = get_settings()
+        self.top_n = top_n or settings.rerank_top_n
+        self.latency_budget = (settings.rerank_latency_budget_ms if latency_budget_ms is None else latency_budget_ms) / 1000
+        self.batch_size = batch_size or settings.rerank_batch_size
+        self.cooldown = settings.rerank_cooldown if cooldown is None else cooldown
+        self.enabled = settings.rerank_enabled if enabled is None else enabled
+        # Weight of the retrieval rank relative to the (0..1) lexical score
+        self.rank_weight = settings.rerank_rank_weight if rank_weight is None else rank_weight
+        self.reranked = 0
+        self.degraded = 0
+        self._skip_until = 0.0
+
+    def select(self, query, candidates, top_n=None, text=lambda candidate: candidate.payload["text"]):
+        """Return the top_n best candidates (in retrieval order when degraded)"""
+        return self._rerank(query, candidates, text)[:top_n or self.top_n]
+
+    def _rerank(self, query, candidates, text):
+        now = time.monotonic()
+        if not self.enabled or len(candidates) <= 1:
+            return list(candidates)
+        if now < self._skip_until:
+            self.degraded += 1
+            return list(candidates)
+
+        deadline = now + self.latency_budget
+        query_terms = set(tokenize(query))
+        documents = [Counter(tokenize(text(candidate))) for candidate in candidates]
+        if not query_terms:
+            return list(candidates)
+
+        total = len(documents)
+        avg_len = sum(sum(doc.values()) for doc in documents) / total or 1.0
+        idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term in query_terms
+            for df in [sum(1 for doc in documents if term in doc)]
+        }
+
+        scores = []
+        for start in range(0, total, self.batch_size):
+            if time.monotonic() > deadline:
+                # Over budget: keep retrieval order and back off for a while
+                self.degraded += 1
+                self._skip_until = time.monotonic() + self.cooldown
+                return list(candidates)
+            for doc in documents[start:start + self.batch_size]:
+                length = sum(doc.values())
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len)
+                scores.append(sum(
+                    idf[term] * doc[term] * (BM25_K1 + 1) / (doc[term] + norm)
+                    for term in query_terms if term in doc
+                ))
+
+        best = max(scores) or 1.0
+        blended = [
+            score / best + self.rank_weight * (1 - rank / total)
+            for rank, score in enumerate(scores)
+        ]
+        self.reranked += 1
+        order = sorted(range(total), key=lambda i: blended[i], reverse=True)
+        return [candidates[i] for i in order]
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "reranked": self.reranked,
+            "degraded": self.degraded,
+        }
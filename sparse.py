@@ -0,0 +1,67 @@
+"""
+Local sparse lexical vectors for hybrid (dense + BM25) search.
+
+Documents get BM25-saturated term frequencies and queries get one weight per
+distinct term; Qdrant applies the IDF part server-side (Modifier.IDF on the
+sparse vector), so no external service or corpus statistics file is needed.
+Terms are mapped to sparse indices with a stable CRC32 hash.
+BM25_K1, BM25_B and BM25_AVG_DOC_LEN (the average chunk length in tokens)
+tune the document weights.
+"""
+import re
+import zlib
+from collections import Counter
+
+from qdrant_client.models import SparseVector
+
+from rag_core.settings import get_settings
+
+SPARSE_VECTOR_NAME = "bm25"
+
+# Keeps identifiers such as "ros2", "cmd_vel", "xl-430" and "2.5" as single terms
+_TOKEN = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+
+_STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my of on or so than that the their them then there these they this to was we were
+what when where which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercased lexical terms without stopwords"""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def term_index(term):
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def _sparse_vector(weights):
+    merged = {}
+    for term, weight in weights.items():
+        index = term_index(term)
+        merged[index] = merged.get(index, 0.0) + weight
+    indices = sorted(merged)
+    return SparseVector(indices=indices, values=[merged[i] for i in indices])
+
+
+def document_sparse_vector(text):
+    """BM25 term-frequency component for an indexed chunk"""
+    settings = get_settings()
+    k1, b = settings.bm25_k1, settings.bm25_b
+    counts = Counter(tokenize(text))
+    length = sum(counts.values())
+    norm = k1 * (1 - b + b * length / settings.bm25_avg_doc_len)
+    return _sparse_vector({
+        term: tf * (k1 + 1) / (tf + norm)
+        for term, tf in counts.items()
+    })
+
+
+def query_sparse_vector(text):
+    """One unit weight per distinct query term (None when the query has no terms)"""
+    terms = set(tokenize(text))
+    if not terms:
+        return None
+    return _sparse_vector({term: 1.0 for term in terms})
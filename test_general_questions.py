@@ -4,54 +4,12 @@ Test script to verify that the RAG chatbot properly handles general questions
 while maintaining focus on book content.
 """
 
-import os
-from dotenv import load_dotenv
-from agents import Agent, Runner, OpenAIChatCompletionsModel, AsyncOpenAI
-from agents import set_tracing_disabled, function_tool
-import cohere
-from qdrant_client import QdrantClient
+from agents import Agent, Runner, set_tracing_disabled
+from rag_core.assistant import get_chat_model
+from rag_core.retrieval import retrieve
 
-# Load environment variables
-load_dotenv()
 set_tracing_disabled(disabled=True)
 
-# Initialize OpenAI
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment variables.")
-
-provider = AsyncOpenAI(api_key=openai_api_key)
-model = OpenAIChatCompletionsModel(
-    model="gpt-4o-mini",
-    openai_client=provider
-)
-
-# Initialize Cohere and Qdrant
-cohere_client = cohere.Client(os.getenv("COHERE_API_KEY"))
-qdrant_client = QdrantClient(
-    url=os.getenv("QDRANT_URL"),
-    api_key=os.getenv("QDRANT_API_KEY"),
-)
-
-def get_embedding(text):
-    """Get embedding vector from Cohere Embed v3"""
-    response = cohere_client.embed(
-        model=os.getenv("EMBED_MODEL", "embed-english-v3.0"),
-        input_type="search_query",
-        texts=[text],
-    )
-    return response.embeddings[0]
-
-@function_tool
-def retrieve(query):
-    embedding = get_embedding(query)
-    result = qdrant_client.query_points(
-        collection_name=os.getenv("COLLECTION_NAME", "physical_ai_book"),
-        query=embedding,
-        limit=5
-    )
-    return [point.payload["text"] for point in result.points]
-
 # Create agent with updated instructions
 agent = Agent(
     name="Assistant for Physical AI & Humanoid Robotics",
@@ -88,7 +46,7 @@ You are a concise AI tutor for Physical AI and Humanoid Robotics. Your primary r
 - Professional but brief
 - Always redirect to book-related topics after brief general responses
 """,
-    model=model,
+    model=get_chat_model(),
     tools=[retrieve]
 )
 
@@ -0,0 +1,123 @@
+"""Tests for the per-client fair queue in rag_core.admission"""
+import asyncio
+import unittest
+
+from rag_core.admission import AdmissionRejected, FairQueue
+
+
+async def settle():
+    """Let queued tasks run up to their next await"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class FairQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def test_admits_immediately_below_concurrency(self):
+        queue = FairQueue(concurrency=2, max_queue=10, max_per_client=10)
+        first = await queue.acquire("a", 1)
+        second = await queue.acquire("b", 1)
+        self.assertEqual(queue.running, 2)
+        first.release()
+        first.release()  # idempotent
+        second.release()
+        self.assertEqual(queue.running, 0)
+        self.assertEqual(queue.admitted, 2)
+
+    async def test_deadline_expires_while_queued(self):
+        queue = FairQueue(concurrency=1, max_queue=10, max_per_client=10, initial_run_seconds=0.01)
+        holder = await queue.acquire("a", 1)
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await queue.acquire("b", 0.05)
+        self.assertEqual(rejected.exception.status_code, 503)
+        self.assertEqual(queue.expired, 1)
+        self.assertEqual(queue.stats()["queued"], 0)
+        holder.release()
+        self.assertEqual(queue.running, 0)
+
+    async def test_sheds_when_estimated_wait_exceeds_deadline(self):
+        queue = FairQueue(concurrency=1, max_queue=10, max_per_client=10, initial_run_seconds=5.0)
+        holder = await queue.acquire("a", 1)
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await queue.acquire("b", 1)
+        self.assertEqual(rejected.exception.status_code, 503)
+        self.assertGreaterEqual(rejected.exception.retry_after, 5)
+        self.assertEqual(queue.shed_deadline, 1)
+        self.assertEqual(queue.queued_total, 0)
+        holder.release()
+
+    async def test_rejects_full_client_and_full_queue(self):
+        queue = FairQueue(concurrency=1, max_queue=2, max_per_client=1, initial_run_seconds=0.01)
+        holder = await queue.acquire("a", 1)
+        waiters = [asyncio.create_task(queue.acquire("b", 5))]
+        await settle()
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await queue.acquire("b", 5)
+        self.assertEqual(rejected.exception.status_code, 429)
+        waiters.append(asyncio.create_task(queue.acquire("c", 5)))
+        await settle()
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await queue.acquire("d", 5)
+        self.assertEqual(rejected.exception.status_code, 503)
+        self.assertEqual((queue.rejected_client, queue.rejected_busy), (1, 1))
+        holder.release()
+        for waiter in waiters:
+            (await waiter).release()
+        self.assertEqual(queue.running, 0)
+
+    async def test_cancelled_while_queued_leaves_the_queue(self):
+        queue = FairQueue(concurrency=1, max_queue=10, max_per_client=10, initial_run_seconds=0.01)
+        holder = await queue.acquire("a", 1)
+        waiter = asyncio.create_task(queue.acquire("b", 5))
+        await settle()
+        self.assertEqual(queue.stats()["queued"], 1)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(queue.stats()["queued"], 0)
+        self.assertEqual(queue.stats()["waiting_clients"], 0)
+        holder.release()
+        self.assertEqual(queue.running, 0)
+
+    async def test_cancelled_after_grant_releases_the_slot(self):
+        queue = FairQueue(concurrency=1, max_queue=10, max_per_client=10, initial_run_seconds=0.01)
+        holder = await queue.acquire("a", 1)
+        waiter = asyncio.create_task(queue.acquire("b", 5))
+        await settle()
+        holder.release(ran=False)  # grants the slot to the waiter
+        self.assertEqual(queue.running, 1)
+        waiter.cancel()  # before the waiter resumed with its slot
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(queue.running, 0)
+        self.assertEqual(queue.avg_run_seconds, 0.01)
+
+    async def test_grants_slots_round_robin_across_clients(self):
+        queue = FairQueue(concurrency=1, max_queue=10, max_per_client=10, initial_run_seconds=0.001)
+        holder = await queue.acquire("holder", 1)
+        order = []
+
+        async def request(client, name):
+            slot = await queue.acquire(client, 5)
+            order.append(name)
+            slot.release()
+
+        tasks = []
+        for client, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("c", "c1")]:
+            tasks.append(asyncio.create_task(request(client, name)))
+            await settle()
+        holder.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["a1", "b1", "c1", "a2", "a3"])
+        self.assertEqual(queue.running, 0)
+
+    async def test_release_without_run_keeps_average(self):
+        queue = FairQueue(concurrency=1, max_queue=10, max_per_client=10, initial_run_seconds=5.0)
+        for _ in range(10):
+            (await queue.acquire("a", 1)).release(ran=False)
+        self.assertEqual(queue.avg_run_seconds, 5.0)
+        (await queue.acquire("a", 1)).release()
+        self.assertLess(queue.avg_run_seconds, 5.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Tests for request coalescing in rag_core.singleflight"""
+import asyncio
+import unittest
+
+from rag_core.singleflight import SingleFlight
+
+
+async def collect(events):
+    return [item async for item in events]
+
+
+class DoTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight("test", enabled=True)
+        calls = 0
+        gate = asyncio.Event()
+
+        async def fn():
+            nonlocal calls
+            calls += 1
+            await gate.wait()
+            return "answer"
+
+        callers = [asyncio.create_task(flights.do("key", fn)) for _ in range(3)]
+        await asyncio.sleep(0)
+        self.assertTrue(flights.in_flight("key"))
+        gate.set()
+        results = await asyncio.gather(*callers)
+        self.assertEqual(calls, 1)
+        self.assertEqual(results, [("answer", False), ("answer", True), ("answer", True)])
+        self.assertFalse(flights.in_flight("key"))
+        self.assertEqual((flights.leaders, flights.coalesced), (1, 2))
+
+    async def test_followers_receive_the_exception(self):
+        flights = SingleFlight("test", enabled=True)
+        gate = asyncio.Event()
+
+        async def fn():
+            await gate.wait()
+            raise ValueError("upstream failed")
+
+        callers = [asyncio.create_task(flights.do("key", fn)) for _ in range(2)]
+        await asyncio.sleep(0)
+        gate.set()
+        for result in await asyncio.gather(*callers, return_exceptions=True):
+            self.assertIsInstance(result, ValueError)
+        self.assertEqual(flights.leaders, 1)
+
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        flights = SingleFlight("test", enabled=True)
+        gate = asyncio.Event()
+
+        async def fn():
+            await gate.wait()
+            return "answer"
+
+        leader = asyncio.create_task(flights.do("key", fn))
+        follower = asyncio.create_task(flights.do("key", fn))
+        await asyncio.sleep(0)
+        leader.cancel()
+        gate.set()
+        self.assertEqual(await follower, ("answer", True))
+
+    async def test_disabled_runs_every_call(self):
+        flights = SingleFlight("test", enabled=False)
+        calls = 0
+
+        async def fn():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            return calls
+
+        await asyncio.gather(flights.do("key", fn), flights.do("key", fn))
+        self.assertEqual(calls, 2)
+        self.assertEqual(flights.coalesced, 0)
+
+
+class StreamTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.flights = SingleFlight("test", enabled=True)
+        self.gate = asyncio.Event()
+        self.runs = 0
+
+    async def produce(self):
+        self.runs += 1
+        yield "first"
+        await self.gate.wait()
+        yield "second"
+        yield "third"
+
+    async def test_follower_joining_mid_stream_gets_earlier_events(self):
+        leader, shared = self.flights.join_stream("key", self.produce)
+        self.assertFalse(shared)
+        self.assertEqual(await anext(leader), ("first", False))
+
+        follower, shared = self.flights.join_stream("key", self.produce)
+        self.assertTrue(shared)
+        self.gate.set()
+        self.assertEqual(await collect(follower), [("first", True), ("second", True), ("third", True)])
+        self.assertEqual(await collect(leader), [("second", False), ("third", False)])
+        self.assertEqual(self.runs, 1)
+
+    async def test_follower_reading_after_the_stream_finished_gets_a_replay(self):
+        leader, _ = self.flights.join_stream("key", self.produce)
+        follower, shared = self.flights.join_stream("key", self.produce)
+        self.assertTrue(shared)
+        self.gate.set()
+        self.assertEqual([event for event, _ in await collect(leader)], ["first", "second", "third"])
+        await asyncio.sleep(0)
+        self.assertFalse(self.flights.in_flight("key"))
+        self.assertEqual([event for event, _ in await collect(follower)], ["first", "second", "third"])
+        self.assertEqual(self.runs, 1)
+
+    async def test_finished_stream_is_not_joined_again(self):
+        self.gate.set()
+        events, _ = self.flights.join_stream("key", self.produce)
+        await collect(events)
+        await asyncio.sleep(0)
+        events, shared = self.flights.join_stream("key", self.produce)
+        self.assertFalse(shared)
+        await collect(events)
+        self.assertEqual(self.runs, 2)
+        self.assertEqual((self.flights.leaders, self.flights.coalesced), (2, 0))
+
+    async def test_leader_disconnect_does_not_stop_the_stream(self):
+        leader, _ = self.flights.join_stream("key", self.produce)
+        follower, _ = self.flights.join_stream("key", self.produce)
+        self.assertEqual(await anext(leader), ("first", False))
+        await leader.aclose()
+        self.gate.set()
+        self.assertEqual([event for event, _ in await collect(follower)], ["first", "second", "third"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Token counting helpers for prompt budgets and chunk sizing.
+
+count_tokens() uses tiktoken (TOKENIZER_ENCODING, cl100k_base by default).
+tiktoken downloads the encoding on first use (cached under
+TIKTOKEN_CACHE_DIR); the API loads it at startup with get_encoding() so the
+first request does not wait for it. If it cannot be loaded, counts fall back
+to an estimate from text length (about four characters per token for English
+prose).
+"""
+import threading
+
+from rag_core.settings import get_settings
+
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN) if text else 0
+
+
+def get_encoding():
+    """The tiktoken encoding, or None when it cannot be loaded"""
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            _encoding_loaded = True
+            name = get_settings().tokenizer_encoding
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(name)
+            except Exception as e:
+                print(f"[WARNING] tiktoken encoding {name} unavailable ({e}); estimating token counts from length")
+    return _encoding
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))